@@ -1,12 +1,14 @@
 from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import StreamingResponse
 from typing import List, Dict, Any, Optional
-from ..models.chat import ChatRequest, ChatResponse, ConversationHistory
+import time
+from ..models.chat import ChatRequest, ChatResponse, ConversationHistory, BatchChatRequest, BatchChatResponse
 from ..models.knowledge import SearchRequest, SearchResponse
 from ..services.agent_service import agent_service
 from ..services.memory_service import memory_service
 from ..services.language_service import language_service
 from ..services.rag_service import rag_service
-from ..utils.helpers import generate_session_id, create_error_response, create_success_response
+from ..utils.helpers import generate_session_id, create_error_response, create_success_response, format_sse_event
 from ..config import settings
 
 router = APIRouter(prefix="/api/v1", tags=["chat"])
@@ -24,7 +26,7 @@ async def chat(request: ChatRequest):
         user_language = request.language or detected_language
         
         # 添加用户消息到记忆
-        memory_service.add_message(
+        await memory_service.aadd_message(
             session_id=request.session_id,
             user_id=request.user_id,
             role="user",
@@ -33,10 +35,10 @@ async def chat(request: ChatRequest):
         )
         
         # 处理聊天请求
-        chat_response = agent_service.process_chat(request, detected_language)
+        chat_response = await agent_service.aprocess_chat(request, detected_language)
         
         # 添加助手回复到记忆
-        memory_service.add_message(
+        await memory_service.aadd_message(
             session_id=request.session_id,
             user_id=request.user_id,
             role="assistant",
@@ -49,11 +51,80 @@ async def chat(request: ChatRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"聊天处理失败: {str(e)}")
 
+@router.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """流式聊天接口（Server-Sent Events）"""
+    try:
+        # 生成会话ID（如果没有提供）
+        if not request.session_id:
+            request.session_id = generate_session_id()
+        
+        # 语言检测
+        detected_language = language_service.detect_language(request.message)
+        user_language = request.language or detected_language
+        
+        # 添加用户消息到记忆（助手回复在流结束后由agent_service写入）
+        await memory_service.aadd_message(
+            session_id=request.session_id,
+            user_id=request.user_id,
+            role="user",
+            content=request.message,
+            language=user_language
+        )
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"聊天处理失败: {str(e)}")
+    
+    async def event_stream():
+        async for event in agent_service.astream_chat(request, detected_language):
+            yield format_sse_event(event["event"], event["data"])
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/chat/batch", response_model=BatchChatResponse)
+async def chat_batch(batch_request: BatchChatRequest):
+    """批量聊天接口（结果与请求顺序一致）"""
+    if len(batch_request.requests) > settings.BATCH_MAX_SIZE:
+        raise HTTPException(status_code=400, detail=f"批量请求数量超过上限 {settings.BATCH_MAX_SIZE}")
+    
+    try:
+        start_time = time.time()
+        
+        for request in batch_request.requests:
+            # 生成会话ID（如果没有提供）
+            if not request.session_id:
+                request.session_id = generate_session_id()
+            
+            # 添加用户消息到记忆
+            await memory_service.aadd_message(
+                session_id=request.session_id,
+                user_id=request.user_id,
+                role="user",
+                content=request.message,
+                language=request.language or language_service.detect_language(request.message)
+            )
+        
+        # 批量处理（助手回复由agent_service写入记忆）
+        responses = await agent_service.aprocess_batch(batch_request.requests)
+        
+        return BatchChatResponse(
+            responses=responses,
+            total_count=len(responses),
+            processing_time=time.time() - start_time
+        )
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"批量聊天处理失败: {str(e)}")
+
 @router.get("/history/{session_id}")
 async def get_conversation_history(session_id: str, limit: Optional[int] = 10):
     """获取对话历史"""
     try:
-        messages = memory_service.get_conversation_history(session_id, limit=limit)
+        messages = await memory_service.aget_conversation_history(session_id, limit=limit)
         return create_success_response({
             "session_id": session_id,
             "messages": [
@@ -75,7 +146,7 @@ async def get_conversation_history(session_id: str, limit: Optional[int] = 10):
 async def get_conversation_summary(session_id: str):
     """获取对话内容总结"""
     try:
-        summary = memory_service.get_conversation_summary(session_id)
+        summary = await memory_service.aget_conversation_summary(session_id)
         return create_success_response(summary)
         
     except Exception as e:
@@ -85,7 +156,7 @@ async def get_conversation_summary(session_id: str):
 async def get_conversation_statistics(session_id: str):
     """获取对话统计信息"""
     try:
-        statistics = memory_service.get_conversation_statistics(session_id)
+        statistics = await memory_service.aget_conversation_statistics(session_id)
         return create_success_response(statistics)
         
     except Exception as e:
@@ -95,7 +166,7 @@ async def get_conversation_statistics(session_id: str):
 async def get_conversation_insights(session_id: str):
     """获取对话洞察（包含统计、总结和上下文）"""
     try:
-        insights = memory_service.get_conversation_insights(session_id)
+        insights = await memory_service.aget_conversation_insights(session_id)
         return create_success_response(insights)
         
     except Exception as e:
@@ -105,7 +176,7 @@ async def get_conversation_insights(session_id: str):
 async def clear_conversation_history(session_id: str):
     """清空对话历史"""
     try:
-        success = memory_service.clear_conversation(session_id)
+        success = await memory_service.aclear_conversation(session_id)
         if success:
             return create_success_response({"message": "对话历史已清空"})
         else:
@@ -118,7 +189,7 @@ async def clear_conversation_history(session_id: str):
 async def search_knowledge(search_request: SearchRequest):
     """搜索知识库"""
     try:
-        search_response = rag_service.search(search_request)
+        search_response = await rag_service.asearch(search_request)
         return create_success_response(search_response.dict())
         
     except Exception as e:
@@ -138,7 +209,7 @@ async def detect_language(text: str):
 async def get_memory_stats():
     """获取记忆统计信息"""
     try:
-        stats = memory_service.get_memory_stats()
+        stats = await memory_service.aget_memory_stats()
         return create_success_response(stats)
         
     except Exception as e:
@@ -148,7 +219,7 @@ async def get_memory_stats():
 async def get_active_sessions():
     """获取活跃会话列表"""
     try:
-        sessions = memory_service.get_active_sessions()
+        sessions = await memory_service.aget_active_sessions()
         return create_success_response({
             "active_sessions": sessions,
             "count": len(sessions)
@@ -181,7 +252,7 @@ async def get_knowledge_info():
 async def update_user_preferences(user_id: str, preferences: Dict[str, Any]):
     """更新用户偏好"""
     try:
-        success = memory_service.update_user_preferences(user_id, preferences)
+        success = await memory_service.aupdate_user_preferences(user_id, preferences)
         if success:
             return create_success_response({"message": "用户偏好已更新"})
         else:
@@ -194,7 +265,7 @@ async def update_user_preferences(user_id: str, preferences: Dict[str, Any]):
 async def get_user_preferences(user_id: str):
     """获取用户偏好"""
     try:
-        preferences = memory_service.get_user_preferences(user_id)
+        preferences = await memory_service.aget_user_preferences(user_id)
         return create_success_response(preferences)
         
     except Exception as e:
@@ -204,7 +275,7 @@ async def get_user_preferences(user_id: str):
 async def export_conversation(session_id: str):
     """导出对话历史"""
     try:
-        export_data = memory_service.export_conversation(session_id)
+        export_data = await memory_service.aexport_conversation(session_id)
         if export_data:
             return create_success_response({
                 "session_id": session_id,
@@ -1,4 +1,5 @@
 import os
+from pathlib import Path
 from dotenv import load_dotenv
 from typing import Optional
 
@@ -19,9 +20,43 @@ class Settings:
     OLLAMA_EMBEDDING_MODEL: str = os.getenv("OLLAMA_EMBEDDING_MODEL", "nomic-embed-text")
     USE_OLLAMA_EMBEDDING: bool = os.getenv("USE_OLLAMA_EMBEDDING", "True").lower() == "true"
     
+    # Embedding配置
+    # 后端: ollama / openai / hashing（确定性本地哈希向量，离线测试用）
+    EMBEDDING_BACKEND: str = os.getenv("EMBEDDING_BACKEND", "ollama" if USE_OLLAMA_EMBEDDING else "openai")
+    EMBEDDING_BATCH_SIZE: int = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+    HASHING_EMBEDDING_DIM: int = int(os.getenv("HASHING_EMBEDDING_DIM", "384"))
+    # 持久化向量缓存（按模型名+文本哈希寻址，重复入库时跳过未变化的分块）
+    EMBEDDING_CACHE_ENABLED: bool = os.getenv("EMBEDDING_CACHE_ENABLED", "True").lower() == "true"
+    EMBEDDING_CACHE_PATH: str = os.getenv("EMBEDDING_CACHE_PATH", "./embedding_cache/embeddings.db")
+    EMBEDDING_CACHE_MAX_ENTRIES: int = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+    
     # 向量数据库配置
     CHROMA_PERSIST_DIRECTORY: str = os.getenv("CHROMA_PERSIST_DIRECTORY", "./chroma_db")
     CHROMA_COLLECTION_NAME: str = os.getenv("CHROMA_COLLECTION_NAME", "commerce_knowledge")
+    # 混合语言多查询检索: 中英混合的问题另外拆分为各语言子查询（每个子查询只检索对应语言），
+    # 与完整问题的结果融合（召回率对比见 tests/benchmark/bench_hybrid_search.py）
+    MULTI_QUERY_RETRIEVAL: bool = os.getenv("MULTI_QUERY_RETRIEVAL", "True").lower() == "true"
+    
+    # 重排序: 是否默认启用、重排序器（lexical/cross_encoder）、交叉编码器模型、
+    # 参与重排序的候选数、重排序分数权重（其余为检索分数）、每个请求的延迟预算（毫秒，超出时跳过重排序）
+    RERANK_ENABLED: bool = os.getenv("RERANK_ENABLED", "False").lower() == "true"
+    RERANKER: str = os.getenv("RERANKER", "lexical")
+    RERANK_MODEL: str = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+    RERANK_TOP_N: int = int(os.getenv("RERANK_TOP_N", "20"))
+    RERANK_WEIGHT: float = float(os.getenv("RERANK_WEIGHT", "0.5"))
+    RERANK_LATENCY_BUDGET_MS: float = float(os.getenv("RERANK_LATENCY_BUDGET_MS", "200"))
+    
+    # 向量存储后端: chroma, numpy（内存映射矩阵 + 暴力检索，适合中小规模知识库）,
+    # ivfpq（倒排文件 + 乘积量化的近似检索，适合数百万级别的知识库）
+    VECTOR_STORE_BACKEND: str = os.getenv("VECTOR_STORE_BACKEND", "chroma")
+    # IVF-PQ 参数: 倒排列表数（0为按数据量自动选择）、检索时扫描的列表数、PQ子空间数、
+    # 精确重排的候选倍数（0为不重排）、开始训练的向量数、训练采样数
+    IVF_NLIST: int = int(os.getenv("IVF_NLIST", "0"))
+    IVF_NPROBE: int = int(os.getenv("IVF_NPROBE", "8"))
+    PQ_M: int = int(os.getenv("PQ_M", "16"))
+    IVF_REFINE_FACTOR: int = int(os.getenv("IVF_REFINE_FACTOR", "4"))
+    IVF_TRAIN_THRESHOLD: int = int(os.getenv("IVF_TRAIN_THRESHOLD", "10000"))
+    IVF_TRAIN_SAMPLE: int = int(os.getenv("IVF_TRAIN_SAMPLE", "50000"))
     
     # 应用配置
     APP_NAME: str = "Multi-RAG Commerce Agent"
@@ -32,9 +67,83 @@ class Settings:
     MAX_TOKENS: int = int(os.getenv("MAX_TOKENS", "1000"))
     TEMPERATURE: float = float(os.getenv("TEMPERATURE", "0.7"))
     TOP_K_RETRIEVAL: int = int(os.getenv("TOP_K_RETRIEVAL", "5"))
+    # 检索模式: hybrid（BM25 + 向量，RRF融合）, vector, keyword
+    RETRIEVAL_MODE: str = os.getenv("RETRIEVAL_MODE", "hybrid")
+    BM25_K1: float = float(os.getenv("BM25_K1", "1.5"))
+    BM25_B: float = float(os.getenv("BM25_B", "0.75"))
+    RRF_K: int = int(os.getenv("RRF_K", "60"))
+    # 混合检索时每路召回 top_k * 倍数 个候选再融合
+    HYBRID_CANDIDATE_MULTIPLIER: int = int(os.getenv("HYBRID_CANDIDATE_MULTIPLIER", "4"))
+    # 检索缓存（查询向量 + 检索结果，LRU + TTL，知识库变化时自动失效）
+    RAG_CACHE_ENABLED: bool = os.getenv("RAG_CACHE_ENABLED", "True").lower() == "true"
+    RAG_CACHE_MAX_SIZE: int = int(os.getenv("RAG_CACHE_MAX_SIZE", "1024"))
+    RAG_CACHE_TTL: float = float(os.getenv("RAG_CACHE_TTL", "300"))
+    # 语义回答缓存（相近的业务问题、相同语言和检索来源时复用回答，跳过LLM生成）
+    ANSWER_CACHE_ENABLED: bool = os.getenv("ANSWER_CACHE_ENABLED", "False").lower() == "true"
+    ANSWER_CACHE_MAX_ENTRIES: int = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "2048"))
+    ANSWER_CACHE_SIMILARITY: float = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))
+    ANSWER_CACHE_TTL: float = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+    # 推测检索：意图识别与RAG检索并行执行，闲聊意图时丢弃检索结果
+    SPECULATIVE_RETRIEVAL: bool = os.getenv("SPECULATIVE_RETRIEVAL", "True").lower() == "true"
+    
+    # 知识库版本（蓝绿切换）: 保留的版本数（含当前版本，至少2）、新版本的最小文档数、
+    # 服务进程检查别名切换的间隔秒数（0为不检查）
+    KNOWLEDGE_KEEP_VERSIONS: int = int(os.getenv("KNOWLEDGE_KEEP_VERSIONS", "2"))
+    KNOWLEDGE_MIN_DOCUMENTS: int = int(os.getenv("KNOWLEDGE_MIN_DOCUMENTS", "1"))
+    KNOWLEDGE_ALIAS_POLL_INTERVAL: float = float(os.getenv("KNOWLEDGE_ALIAS_POLL_INTERVAL", "5"))
+    
+    # 上下文token预算: 检索上下文与对话记忆上下文的最大token数、tiktoken编码
+    CONTEXT_MAX_TOKENS: int = int(os.getenv("CONTEXT_MAX_TOKENS", "1500"))
+    MEMORY_CONTEXT_MAX_TOKENS: int = int(os.getenv("MEMORY_CONTEXT_MAX_TOKENS", "500"))
+    TOKENIZER_ENCODING: str = os.getenv("TOKENIZER_ENCODING", "cl100k_base")
+    # 启动时等待tiktoken编码加载的最长秒数，超时后先使用近似计数，加载完成后自动切换
+    TOKENIZER_LOAD_TIMEOUT: float = float(os.getenv("TOKENIZER_LOAD_TIMEOUT", "10"))
+    
+    # 文本分块
+    CHUNK_SIZE: int = int(os.getenv("CHUNK_SIZE", "1000"))
+    CHUNK_OVERLAP: int = int(os.getenv("CHUNK_OVERLAP", "200"))
+    
+    # 流式入库配置: 每批写入的分块数、嵌入与写入之间最多排队的批次数（背压）、进度报告间隔(秒)
+    INGEST_BATCH_SIZE: int = int(os.getenv("INGEST_BATCH_SIZE", "256"))
+    INGEST_QUEUE_SIZE: int = int(os.getenv("INGEST_QUEUE_SIZE", "4"))
+    INGEST_PROGRESS_INTERVAL: float = float(os.getenv("INGEST_PROGRESS_INTERVAL", "5"))
+    # 并行入库: 文本分割进程数（默认1在当前进程内分割，0为CPU核数；子进程以spawn方式启动）、同时进行的向量计算批次数
+    INGEST_SPLIT_WORKERS: int = int(os.getenv("INGEST_SPLIT_WORKERS", "1"))
+    INGEST_EMBED_CONCURRENCY: int = int(os.getenv("INGEST_EMBED_CONCURRENCY", "4"))
+    
+    # 批量聊天配置
+    BATCH_MAX_SIZE: int = int(os.getenv("BATCH_MAX_SIZE", "1000"))
+    BATCH_MAX_CONCURRENCY: int = int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))
+    
+    # 意图识别配置
+    # 引擎: llm / keywords / classifier / hybrid（本地分类器置信度不足时再调用LLM）
+    INTENT_ENGINE: str = os.getenv("INTENT_ENGINE", "hybrid")
+    INTENT_CONFIDENCE_THRESHOLD: float = float(os.getenv("INTENT_CONFIDENCE_THRESHOLD", "0.75"))
+    INTENT_TRAINING_FILE: str = os.getenv(
+        "INTENT_TRAINING_FILE",
+        str(Path(__file__).parent.parent / "data" / "intent_train.jsonl")
+    )
     
     # 记忆配置
     MAX_HISTORY_LENGTH: int = int(os.getenv("MAX_HISTORY_LENGTH", "10"))
+    # 记忆存储后端: memory（进程内）/ sqlite（WAL，同主机多worker共享）/ redis（多主机共享）
+    MEMORY_BACKEND: str = os.getenv("MEMORY_BACKEND", "memory")
+    MEMORY_SQLITE_PATH: str = os.getenv("MEMORY_SQLITE_PATH", "./memory_store/memory.db")
+    REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+    MEMORY_REDIS_PREFIX: str = os.getenv("MEMORY_REDIS_PREFIX", "memory:")
+    # 会话过期: 最后一条消息之后保留的小时数、后台清理间隔秒数（0为不清理）
+    MEMORY_SESSION_TTL_HOURS: float = float(os.getenv("MEMORY_SESSION_TTL_HOURS", "24"))
+    MEMORY_EVICTION_INTERVAL: float = float(os.getenv("MEMORY_EVICTION_INTERVAL", "60"))
+    # 进程内存储的内存上限（字节，0为不限制），超出时淘汰最久未使用的会话
+    MEMORY_MAX_BYTES: int = int(os.getenv("MEMORY_MAX_BYTES", str(256 * 1024 * 1024)))
+    # 滚动摘要: 未总结的消息达到该数目时把较早的消息压缩进会话摘要（0为不总结，超过 MAX_HISTORY_LENGTH 时按其计算）、
+    # 总结后保留原文的最近消息数、摘要的最大token数、
+    # 摘要方式（llm: 后台调用LLM，失败时使用抽取式摘要 / extractive: 只使用抽取式摘要）；
+    # 后台摘要完成前消息就要被 MAX_HISTORY_LENGTH 丢弃时，写入时先用抽取式摘要压缩这些消息
+    SUMMARY_TRIGGER_MESSAGES: int = int(os.getenv("SUMMARY_TRIGGER_MESSAGES", "8"))
+    SUMMARY_KEEP_RECENT: int = int(os.getenv("SUMMARY_KEEP_RECENT", "4"))
+    SUMMARY_MAX_TOKENS: int = int(os.getenv("SUMMARY_MAX_TOKENS", "200"))
+    SUMMARIZER: str = os.getenv("SUMMARIZER", "llm")
     
     # 语言配置
     SUPPORTED_LANGUAGES: list = ["zh", "en"]
@@ -4,12 +4,16 @@ from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
 import time
+import asyncio
 import logging
 from typing import Dict, Any
 
 from .config import settings
 from .api.chat import router as chat_router
+from .services.rag_service import rag_service
+from .services.memory_service import memory_service
 from .utils.helpers import create_error_response
+from .utils.tokens import load_encoding
 
 # 配置日志
 logging.basicConfig(
@@ -122,6 +126,8 @@ async def app_info():
         ],
         "endpoints": {
             "chat": "/api/v1/chat",
+            "chat_stream": "/api/v1/chat/stream",
+            "chat_batch": "/api/v1/chat/batch",
             "history": "/api/v1/history/{session_id}",
             "search": "/api/v1/search",
             "language_detection": "/api/v1/detect-language"
@@ -135,14 +141,51 @@ async def startup_event():
     logger.info(f"启动 {settings.APP_NAME} v{settings.APP_VERSION}")
     logger.info("初始化服务...")
     
-    # 这里可以添加启动时的初始化逻辑
-    # 例如：初始化数据库连接、加载模型等
+    # 在线程中预先加载tiktoken编码（首次可能需要下载），不在第一个对话请求中加载
+    try:
+        await asyncio.wait_for(asyncio.to_thread(load_encoding), timeout=settings.TOKENIZER_LOAD_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning("加载tiktoken编码超时，加载完成前使用近似token计数")
+    
+    # 定期检查知识库别名，init_data.py 在其他进程中完成重建并切换后加载新版本
+    if settings.KNOWLEDGE_ALIAS_POLL_INTERVAL > 0:
+        app.state.alias_watcher = asyncio.create_task(watch_knowledge_alias())
+    # 定期清理过期对话
+    if settings.MEMORY_EVICTION_INTERVAL > 0:
+        app.state.memory_evictor = asyncio.create_task(evict_expired_conversations())
+
+async def watch_knowledge_alias():
+    """后台任务：别名切换后在线程池中打开新版本并替换（不阻塞检索）"""
+    while True:
+        await asyncio.sleep(settings.KNOWLEDGE_ALIAS_POLL_INTERVAL)
+        try:
+            await asyncio.to_thread(rag_service.refresh_active_version)
+        except Exception as e:
+            logger.error(f"检查知识库版本失败: {e}")
+
+async def evict_expired_conversations():
+    """后台任务：按过期时间清理对话（每次只处理已过期的会话）"""
+    while True:
+        await asyncio.sleep(settings.MEMORY_EVICTION_INTERVAL)
+        try:
+            expired = await memory_service.acleanup_expired_conversations()
+            if expired:
+                logger.info(f"清理过期对话 {expired} 个")
+        except Exception as e:
+            logger.error(f"清理过期对话失败: {e}")
 
 # 关闭事件
 @app.on_event("shutdown")
 async def shutdown_event():
     """应用关闭事件"""
     logger.info("正在关闭应用...")
+    for task_name in ("alias_watcher", "memory_evictor"):
+        task = getattr(app.state, task_name, None)
+        if task:
+            task.cancel()
+    
+    # 将尚未落盘的向量存储写入持久化
+    rag_service.vector_store.flush()
     
     # 这里可以添加关闭时的清理逻辑
     # 例如：关闭数据库连接、保存缓存等
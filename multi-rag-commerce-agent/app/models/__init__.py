@@ -1,4 +1,4 @@
-from .chat import ChatRequest, ChatResponse, Message
+from .chat import ChatRequest, ChatResponse, Message, BatchChatRequest, BatchChatResponse
 from .knowledge import KnowledgeItem, SearchResult
 
-__all__ = ["ChatRequest", "ChatResponse", "Message", "KnowledgeItem", "SearchResult"] 
\ No newline at end of file
+__all__ = ["ChatRequest", "ChatResponse", "Message", "BatchChatRequest", "BatchChatResponse", "KnowledgeItem", "SearchResult"] 
\ No newline at end of file
@@ -39,4 +39,14 @@ class ConversationHistory(BaseModel):
     user_id: Optional[str] = Field(None, description="用户ID")
     messages: List[Message] = Field(default_factory=list, description="消息列表")
     created_at: datetime = Field(default_factory=datetime.now, description="创建时间")
-    updated_at: datetime = Field(default_factory=datetime.now, description="更新时间") 
\ No newline at end of file
+    updated_at: datetime = Field(default_factory=datetime.now, description="更新时间") 
+
+class BatchChatRequest(BaseModel):
+    """批量聊天请求模型"""
+    requests: List[ChatRequest] = Field(..., description="聊天请求列表")
+
+class BatchChatResponse(BaseModel):
+    """批量聊天响应模型"""
+    responses: List[ChatResponse] = Field(default_factory=list, description="聊天响应列表（与请求顺序一致）")
+    total_count: int = Field(..., description="响应数量")
+    processing_time: float = Field(..., description="处理时间(秒)")
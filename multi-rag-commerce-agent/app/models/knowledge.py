@@ -26,6 +26,12 @@ class SearchRequest(BaseModel):
     top_k: int = Field(default=5, description="返回结果数量")
     category: Optional[str] = Field(None, description="搜索分类")
     language: Optional[str] = Field(None, description="搜索语言")
+    min_price: Optional[float] = Field(None, description="最低价格（含）")
+    max_price: Optional[float] = Field(None, description="最高价格（含）")
+    brand: Optional[str] = Field(None, description="品牌")
+    features: Optional[List[str]] = Field(None, description="必须包含的商品特性（全部包含）")
+    rerank: Optional[bool] = Field(None, description="是否重排序（默认按配置）")
+    rerank_budget_ms: Optional[float] = Field(None, description="延迟预算(毫秒)，检索耗时超出时跳过重排序")
 
 class SearchResponse(BaseModel):
     """搜索响应模型"""
@@ -2,5 +2,10 @@ from .rag_service import RAGService
 from .agent_service import AgentService
 from .memory_service import MemoryService
 from .language_service import LanguageService
+from .intent_service import IntentClassifier
+from .embedding_service import EmbeddingBackend
+from .vector_store import VectorStore
+from .reranker import Reranker
+from .memory_store import MemoryStore
 
-__all__ = ["RAGService", "AgentService", "MemoryService", "LanguageService"] 
\ No newline at end of file
+__all__ = ["RAGService", "AgentService", "MemoryService", "LanguageService", "IntentClassifier", "EmbeddingBackend", "VectorStore", "Reranker", "MemoryStore"] 
\ No newline at end of file
@@ -3,13 +3,18 @@ from langchain.prompts import PromptTemplate
 from langchain.schema import HumanMessage, SystemMessage
 from langchain.agents import initialize_agent, AgentType, Tool
 from langchain.memory import ConversationBufferMemory
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple, Awaitable, AsyncIterator
 import json
+import time
+import asyncio
 from ..config import settings
 from ..models.chat import ChatRequest, ChatResponse, Language
 from .rag_service import rag_service
 from .language_service import language_service
 from .memory_service import memory_service
+from .intent_service import intent_classifier
+from .answer_cache import answer_cache
+from ..utils.helpers import run_sync
 
 class AgentService:
     """智能Agent服务"""
@@ -46,6 +51,10 @@ class AgentService:
         # 提示词模板
         self.system_prompt = self._create_system_prompt()
         self.chat_prompt = self._create_chat_prompt()
+        
+        # 滚动摘要：对话变长后由LLM在后台把较早的消息压缩进会话摘要
+        if settings.SUMMARIZER == "llm":
+            memory_service.summarizer = self._asummarize_history
     
     def _create_tools(self) -> List[Tool]:
         """创建Agent工具"""
@@ -96,10 +105,9 @@ class AgentService:
         except Exception as e:
             return f"搜索失败: {str(e)}"
 
-    def _detect_intent_with_llm(self, message: str, language: str = "zh") -> str:
-        """使用LLM检测用户意图"""
-        try:
-            intent_prompt = f"""请分析以下用户消息的意图，只返回 "chat" 或 "business"：
+    def _build_intent_prompt(self, message: str) -> str:
+        """构建意图识别提示词"""
+        return f"""请分析以下用户消息的意图，只返回 "chat" 或 "business"：
 
 用户消息：{message}
 
@@ -109,17 +117,34 @@ class AgentService:
 
 请只返回一个单词："""
 
+    def _parse_intent(self, raw_intent: str, message: str) -> str:
+        """解析LLM返回的意图"""
+        intent = raw_intent.strip().lower()
+        
+        # 验证返回结果
+        if intent in ["chat", "business"]:
+            return intent
+        
+        # 如果LLM返回的不是预期值，使用关键词匹配作为备选
+        print(f"LLM意图识别返回异常值: {intent}，使用关键词匹配")
+        return self._detect_intent_with_keywords(message)
+
+    def _detect_intent_with_llm(self, message: str, language: str = "zh") -> str:
+        """使用LLM检测用户意图"""
+        try:
             # 使用LLM进行意图识别
-            response = self.llm([HumanMessage(content=intent_prompt)])
-            intent = response.content.strip().lower()
-            
-            # 验证返回结果
-            if intent in ["chat", "business"]:
-                return intent
-            else:
-                # 如果LLM返回的不是预期值，使用关键词匹配作为备选
-                print(f"LLM意图识别返回异常值: {intent}，使用关键词匹配")
-                return self._detect_intent_with_keywords(message)
+            response = self.llm([HumanMessage(content=self._build_intent_prompt(message))])
+            return self._parse_intent(response.content, message)
+                
+        except Exception as e:
+            print(f"LLM意图识别失败: {e}，使用关键词匹配")
+            return self._detect_intent_with_keywords(message)
+
+    async def _adetect_intent_with_llm(self, message: str, language: str = "zh") -> str:
+        """使用LLM异步检测用户意图"""
+        try:
+            response = await self.llm.ainvoke([HumanMessage(content=self._build_intent_prompt(message))])
+            return self._parse_intent(response.content, message)
                 
         except Exception as e:
             print(f"LLM意图识别失败: {e}，使用关键词匹配")
@@ -159,56 +184,215 @@ class AgentService:
         # 默认返回业务意图（保守策略）
         return "business"
 
+    def _detect_intent_with_classifier(self, message: str) -> Optional[str]:
+        """使用本地分类器检测用户意图，置信度不足时返回None"""
+        intent, confidence = intent_classifier.predict(message)
+        if settings.INTENT_ENGINE == "classifier" or confidence >= settings.INTENT_CONFIDENCE_THRESHOLD:
+            return intent
+        
+        print(f"本地意图分类置信度不足: {intent} ({confidence:.2f})，调用LLM")
+        return None
+
     def _detect_intent(self, message: str) -> str:
         """检测用户意图（主方法）"""
-        # 优先使用LLM进行意图识别，失败时自动降级到关键词匹配
+        engine = settings.INTENT_ENGINE
+        if engine == "keywords":
+            return self._detect_intent_with_keywords(message)
+        
+        if engine in ["classifier", "hybrid"]:
+            intent = self._detect_intent_with_classifier(message)
+            if intent:
+                return intent
+        
+        # 使用LLM进行意图识别，失败时自动降级到关键词匹配
         return self._detect_intent_with_llm(message)
 
-    def process_chat(self, chat_request: ChatRequest, detected_language: str = None) -> ChatResponse:
-        """处理聊天请求"""
-        try:
-            # 使用传入的语言检测结果，如果没有则进行检测
-            if detected_language is None:
-                detected_language = language_service.detect_language(chat_request.message)
-            user_language = chat_request.language or detected_language
-            
-            # 检测用户意图
-            intent = self._detect_intent(chat_request.message)
-            print(f"用户意图检测: '{chat_request.message}' -> {intent}")
+    async def _adetect_intent(self, message: str) -> str:
+        """异步检测用户意图（主方法）"""
+        engine = settings.INTENT_ENGINE
+        if engine == "keywords":
+            return self._detect_intent_with_keywords(message)
+        
+        if engine in ["classifier", "hybrid"]:
+            intent = self._detect_intent_with_classifier(message)
+            if intent:
+                return intent
+        
+        return await self._adetect_intent_with_llm(message)
+
+    def _build_summary_prompt(self, previous_summary: str, messages: list) -> str:
+        """构建滚动摘要提示词"""
+        conversation = "\n".join(
+            f"{'用户' if msg.role == 'user' else '助手'}: {msg.content}" for msg in messages
+        )
+        return f"""请把客服对话压缩为简洁的摘要，保留用户的需求、涉及的商品与订单、已经给出的结论和未解决的问题，不超过{settings.SUMMARY_MAX_TOKENS}个token。
+
+已有摘要：
+{previous_summary or "无"}
+
+新的对话：
+{conversation}
+
+请直接输出更新后的完整摘要。"""
+
+    async def _asummarize_history(self, previous_summary: str, messages: list) -> str:
+        """使用LLM把较早的对话合并进滚动摘要（由memory_service在后台调用）"""
+        response = await self.llm.ainvoke([HumanMessage(content=self._build_summary_prompt(previous_summary, messages))])
+        return response.content
+
+    def _build_messages(self, chat_request: ChatRequest, context: str, history: str, user_language: str) -> list:
+        """构建发送给LLM的消息列表（history 为滚动摘要 + 最近的消息，受token预算限制）"""
+        prompt = self.chat_prompt.format(
+            context=context,
+            history=history,
+            question=chat_request.message,
+            language="中文" if user_language == "zh" else "English"
+        )
+        
+        return [
+            SystemMessage(content=self.system_prompt),
+            HumanMessage(content=prompt)
+        ]
+
+    async def _timed(self, awaitable: Awaitable[Any]) -> Tuple[Any, float]:
+        """执行协程并返回(结果, 耗时毫秒)"""
+        start_time = time.perf_counter()
+        result = await awaitable
+        return result, (time.perf_counter() - start_time) * 1000
+
+    async def _aretrieve_context(self, message: str, timings: Dict[str, Any]) -> Tuple[str, str]:
+        """检测意图并按需检索上下文，返回(意图, 上下文)
+
+        开启推测检索时，意图识别与RAG检索同时启动；
+        若意图为闲聊，则丢弃已检索到的上下文。
+        """
+        if settings.SPECULATIVE_RETRIEVAL:
+            retrieval_task = asyncio.create_task(self._timed(
+                rag_service.aget_relevant_context(message, top_k=settings.TOP_K_RETRIEVAL)
+            ))
+            intent, timings["intent_ms"] = await self._timed(self._adetect_intent(message))
             
-            # 根据意图决定是否进行RAG检索
-            context = ""
             if intent == "business":
-                # 业务问题：进行RAG检索
-                print("检测到业务意图，进行RAG检索...")
-                context = rag_service.get_relevant_context(
-                    chat_request.message, 
-                    top_k=settings.TOP_K_RETRIEVAL
-                )
-            else:
-                # 闲聊问题：不进行RAG检索
-                print("检测到闲聊意图，跳过RAG检索...")
-                context = "这是用户的一般性问候或闲聊，请友好回应。"
+                context, timings["retrieval_ms"] = await retrieval_task
+                # 推测检索与意图识别重叠，只统计意图识别之后仍需等待的时间
+                timings["retrieval_wait_ms"] = max(0.0, timings["retrieval_ms"] - timings["intent_ms"])
+                return intent, context
             
-            # 构建提示词
-            prompt = self.chat_prompt.format(
-                context=context,
-                history=memory_service.get_context_for_session(chat_request.session_id, max_messages=5),
-                question=chat_request.message,
-                language="中文" if user_language == "zh" else "English"
+            # 闲聊意图：检索结果作废（线程中的查询会自然结束，结果被丢弃）
+            retrieval_task.cancel()
+            timings["retrieval_discarded"] = True
+            return intent, ""
+        
+        intent, timings["intent_ms"] = await self._timed(self._adetect_intent(message))
+        if intent == "business":
+            context, timings["retrieval_ms"] = await self._timed(
+                rag_service.aget_relevant_context(message, top_k=settings.TOP_K_RETRIEVAL)
+            )
+            timings["retrieval_wait_ms"] = timings["retrieval_ms"]
+            return intent, context
+        
+        return intent, ""
+
+    async def _aembed_for_answer_cache(self, message: str) -> Optional[List[float]]:
+        """计算语义回答缓存使用的问题向量，失败时返回None（不影响正常生成）"""
+        try:
+            return await asyncio.to_thread(rag_service.embed_query, message)
+        except Exception as e:
+            print(f"计算回答缓存向量失败: {e}")
+            return None
+
+    async def _aprepare_chat(self, chat_request: ChatRequest, detected_language: Optional[str],
+                             timings: Dict[str, Any],
+                             retrieved: Optional[Tuple[str, str]] = None) -> Dict[str, Any]:
+        """生成回答前的准备：语言、意图、检索上下文与语义回答缓存
+
+        retrieved 为批量处理时预先得到的(意图, 上下文)，提供时不再单独检索。
+        """
+        # 使用传入的语言检测结果，如果没有则进行检测
+        if detected_language is None:
+            detected_language = language_service.detect_language(chat_request.message)
+        user_language = chat_request.language or detected_language
+        
+        # 检测用户意图，并根据意图决定是否使用RAG检索结果
+        if retrieved is None:
+            intent, context = await self._aretrieve_context(chat_request.message, timings)
+        else:
+            intent, context = retrieved
+        print(f"用户意图检测: '{chat_request.message}' -> {intent}")
+        
+        if intent != "business":
+            # 闲聊问题：不使用RAG检索结果
+            print("检测到闲聊意图，跳过RAG检索...")
+            context = "这是用户的一般性问候或闲聊，请友好回应。"
+        
+        sources = self._extract_sources(context) if intent == "business" else []
+        
+        # 语义回答缓存：相近问题且检索来源相同时直接复用回答
+        cached_answer, answer_cache_info, query_embedding = None, {"hit": False}, None
+        if settings.ANSWER_CACHE_ENABLED and sources:
+            query_embedding = await self._aembed_for_answer_cache(chat_request.message)
+            cached = answer_cache.lookup(query_embedding, user_language, sources) if query_embedding else None
+            if cached:
+                cached_answer = cached["answer"]
+                answer_cache_info = {"hit": True, "similarity": cached["similarity"]}
+                timings["generation_ms"] = 0.0
+        
+        # 对话历史（SQLite/Redis的读取在线程池中执行，不阻塞事件循环）；命中回答缓存时不需要
+        history = ""
+        if cached_answer is None:
+            history = await memory_service.aget_context_for_session(chat_request.session_id)
+        
+        return {
+            "user_language": user_language,
+            "intent": intent,
+            "context": context,
+            "sources": sources,
+            "cached_answer": cached_answer,
+            "answer_cache_info": answer_cache_info,
+            "query_embedding": query_embedding,
+            "history": history
+        }
+
+    def _build_metadata(self, prepared: Dict[str, Any], timings: Dict[str, Any], total_start: float) -> Dict[str, Any]:
+        """构建响应元数据"""
+        return {
+            "intent": prepared["intent"],
+            "intent_engine": settings.INTENT_ENGINE,
+            "speculative_retrieval": settings.SPECULATIVE_RETRIEVAL,
+            "answer_cache": prepared["answer_cache_info"],
+            "timings": {
+                **timings,
+                "total_ms": (time.perf_counter() - total_start) * 1000
+            }
+        }
+
+    def _cache_answer(self, chat_request: ChatRequest, prepared: Dict[str, Any], answer: str):
+        """将新生成的回答写入语义回答缓存"""
+        if prepared["query_embedding"]:
+            answer_cache.store(
+                prepared["query_embedding"], chat_request.message, answer,
+                prepared["user_language"], prepared["sources"]
             )
+
+    async def aprocess_chat(self, chat_request: ChatRequest, detected_language: str = None,
+                            retrieved: Optional[Tuple[str, str]] = None) -> ChatResponse:
+        """异步处理聊天请求"""
+        try:
+            total_start = time.perf_counter()
+            timings: Dict[str, Any] = {}
+            prepared = await self._aprepare_chat(chat_request, detected_language, timings, retrieved)
+            user_language = prepared["user_language"]
             
             # 生成回答
-            messages = [
-                SystemMessage(content=self.system_prompt),
-                HumanMessage(content=prompt)
-            ]
-            
-            response = self.llm(messages)
-            answer = response.content
+            answer = prepared["cached_answer"]
+            if answer is None:
+                messages = self._build_messages(chat_request, prepared["context"], prepared["history"], user_language)
+                response, timings["generation_ms"] = await self._timed(self.llm.ainvoke(messages))
+                answer = response.content
+                self._cache_answer(chat_request, prepared, answer)
             
             # 更新记忆（通过memory_service）
-            memory_service.add_message(
+            await memory_service.aadd_message(
                 session_id=chat_request.session_id,
                 user_id=chat_request.user_id,
                 role="assistant",
@@ -222,7 +406,8 @@ class AgentService:
                 language=Language(user_language),
                 confidence=0.9,  # 可以根据实际需要调整
                 session_id=chat_request.session_id or "default",
-                sources=self._extract_sources(context) if intent == "business" else []
+                sources=prepared["sources"],
+                metadata=self._build_metadata(prepared, timings, total_start)
             )
             
             return chat_response
@@ -236,6 +421,111 @@ class AgentService:
                 session_id=chat_request.session_id or "default"
             )
 
+    async def astream_chat(self, chat_request: ChatRequest,
+                           detected_language: str = None) -> AsyncIterator[Dict[str, Any]]:
+        """流式处理聊天请求
+
+        依次产出事件：token（增量内容）、done（来源与耗时）或 error。
+        流结束后才把完整的助手回复写入记忆。
+        """
+        try:
+            total_start = time.perf_counter()
+            timings: Dict[str, Any] = {}
+            prepared = await self._aprepare_chat(chat_request, detected_language, timings)
+            user_language = prepared["user_language"]
+            
+            answer = prepared["cached_answer"]
+            if answer is not None:
+                timings["first_token_ms"] = (time.perf_counter() - total_start) * 1000
+                yield {"event": "token", "data": {"content": answer}}
+            else:
+                messages = self._build_messages(chat_request, prepared["context"], prepared["history"], user_language)
+                answer_parts = []
+                generation_start = time.perf_counter()
+                
+                async for chunk in self.llm.astream(messages):
+                    if not chunk.content:
+                        continue
+                    if not answer_parts:
+                        timings["first_token_ms"] = (time.perf_counter() - total_start) * 1000
+                    answer_parts.append(chunk.content)
+                    yield {"event": "token", "data": {"content": chunk.content}}
+                
+                timings["generation_ms"] = (time.perf_counter() - generation_start) * 1000
+                answer = "".join(answer_parts)
+                self._cache_answer(chat_request, prepared, answer)
+            
+            # 流结束后写入完整的助手回复
+            await memory_service.aadd_message(
+                session_id=chat_request.session_id,
+                user_id=chat_request.user_id,
+                role="assistant",
+                content=answer,
+                language=user_language
+            )
+            
+            yield {
+                "event": "done",
+                "data": {
+                    "session_id": chat_request.session_id or "default",
+                    "language": Language(user_language).value,
+                    "sources": prepared["sources"],
+                    "metadata": self._build_metadata(prepared, timings, total_start)
+                }
+            }
+            
+        except Exception as e:
+            print(f"流式处理聊天请求失败: {e}")
+            yield {
+                "event": "error",
+                "data": {"message": "抱歉，我现在无法回答您的问题，请稍后再试。"}
+            }
+
+    def process_chat(self, chat_request: ChatRequest, detected_language: str = None) -> ChatResponse:
+        """处理聊天请求（同步封装，内部复用异步流程）"""
+        return run_sync(self.aprocess_chat(chat_request, detected_language))
+
+    async def aprocess_batch(self, chat_requests: List[ChatRequest],
+                             max_concurrency: Optional[int] = None) -> List[ChatResponse]:
+        """异步批量处理聊天请求
+
+        整批完成语言检测和意图识别，业务问题去重后一次批量检索，
+        再以有限并发生成回答。返回结果与输入顺序一致。
+        """
+        semaphore = asyncio.Semaphore(max_concurrency or settings.BATCH_MAX_CONCURRENCY)
+        
+        async def bounded(awaitable: Awaitable[Any]) -> Any:
+            async with semaphore:
+                return await awaitable
+        
+        # 整批语言检测
+        detected_languages = [language_service.detect_language(req.message) for req in chat_requests]
+        
+        # 整批意图识别（相同消息只识别一次，需要调用LLM时受并发限制）
+        unique_messages = list(dict.fromkeys(req.message for req in chat_requests))
+        intents = await asyncio.gather(*[bounded(self._adetect_intent(message)) for message in unique_messages])
+        intent_by_message = dict(zip(unique_messages, intents))
+        
+        # 业务问题去重后一次批量检索
+        business_messages = [message for message in unique_messages if intent_by_message[message] == "business"]
+        contexts = await rag_service.aget_relevant_contexts(business_messages, top_k=settings.TOP_K_RETRIEVAL)
+        context_by_message = dict(zip(business_messages, contexts))
+        
+        # 有限并发生成回答
+        return list(await asyncio.gather(*[
+            bounded(self.aprocess_chat(
+                req,
+                detected_language,
+                retrieved=(intent_by_message[req.message], context_by_message.get(req.message, ""))
+            ))
+            for req, detected_language in zip(chat_requests, detected_languages)
+        ]))
+
+    def process_batch(self, chat_requests: List[ChatRequest],
+                      max_concurrency: Optional[int] = None) -> List[ChatResponse]:
+        """批量处理聊天请求（同步封装）"""
+        return run_sync(self.aprocess_batch(chat_requests, max_concurrency))
+
     def _extract_sources(self, context: str) -> List[str]:
         """提取信息来源"""
         sources = []
@@ -255,6 +545,9 @@ class AgentService:
             "model": settings.OPENAI_MODEL,
             "temperature": settings.TEMPERATURE,
             "max_tokens": settings.MAX_TOKENS,
+            "speculative_retrieval": settings.SPECULATIVE_RETRIEVAL,
+            "intent_engine": settings.INTENT_ENGINE,
+            "answer_cache": answer_cache.get_stats() if settings.ANSWER_CACHE_ENABLED else None,
             "tools": [tool.name for tool in self.tools]
         }
 
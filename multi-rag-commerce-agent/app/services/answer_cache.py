@@ -0,0 +1,151 @@
+from typing import List, Dict, Any, Optional, Sequence
+import threading
+import time
+import numpy as np
+from ..config import settings
+from .rag_service import rag_service
+
+class SemanticAnswerCache:
+    """语义回答缓存
+
+    以问题向量为键保存LLM生成的回答。新问题与缓存问题的余弦相似度超过阈值，
+    且回答语言和检索到的来源完全一致时，直接复用缓存的回答。
+    向量保存在预分配的矩阵中，查找时一次矩阵乘法完成相似度计算。
+    """
+
+    def __init__(self, max_entries: Optional[int] = None,
+                 similarity_threshold: Optional[float] = None,
+                 ttl: Optional[float] = None):
+        self.max_entries = max_entries or settings.ANSWER_CACHE_MAX_ENTRIES
+        self.similarity_threshold = similarity_threshold or settings.ANSWER_CACHE_SIMILARITY
+        self.ttl = ttl or settings.ANSWER_CACHE_TTL
+
+        self._lock = threading.Lock()
+        self._reset(dimension=0)
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _reset(self, dimension: int):
+        """重置存储（向量维度变化或失效时调用）"""
+        self.dimension = dimension
+        self._vectors = np.zeros((self.max_entries, dimension), dtype=np.float32)
+        # 过期时间为0表示空槽位
+        self._expires_at = np.zeros(self.max_entries, dtype=np.float64)
+        self._last_used = np.zeros(self.max_entries, dtype=np.float64)
+        self._key_ids = np.full(self.max_entries, -1, dtype=np.int64)
+        self._key_index: Dict[tuple, int] = {}
+        self._slot_keys: List[Optional[tuple]] = [None] * self.max_entries
+        self._questions: List[Optional[str]] = [None] * self.max_entries
+        self._answers: List[Optional[str]] = [None] * self.max_entries
+
+    def _make_key(self, language: str, sources: Sequence[str]) -> tuple:
+        """语言与检索来源组成精确匹配的键"""
+        return (str(language), tuple(sorted(set(sources))))
+
+    def _normalize(self, embedding: Sequence[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def lookup(self, embedding: Sequence[float], language: str,
+               sources: Sequence[str]) -> Optional[Dict[str, Any]]:
+        """查找语义相近的已缓存回答"""
+        vector = self._normalize(embedding)
+        key = self._make_key(language, sources)
+        now = time.time()
+
+        with self._lock:
+            key_id = self._key_index.get(key)
+            if key_id is None or vector.shape[0] != self.dimension:
+                self.misses += 1
+                return None
+
+            candidates = np.flatnonzero((self._key_ids == key_id) & (self._expires_at > now))
+            if candidates.size == 0:
+                self.misses += 1
+                return None
+
+            similarities = self._vectors[candidates] @ vector
+            best = int(np.argmax(similarities))
+            similarity = float(similarities[best])
+            if similarity < self.similarity_threshold:
+                self.misses += 1
+                return None
+
+            slot = int(candidates[best])
+            self._last_used[slot] = now
+            self.hits += 1
+            return {
+                "answer": self._answers[slot],
+                "question": self._questions[slot],
+                "similarity": similarity
+            }
+
+    def store(self, embedding: Sequence[float], question: str, answer: str,
+              language: str, sources: Sequence[str]):
+        """缓存生成的回答"""
+        vector = self._normalize(embedding)
+        key = self._make_key(language, sources)
+        now = time.time()
+
+        with self._lock:
+            if vector.shape[0] != self.dimension:
+                self._reset(dimension=vector.shape[0])
+
+            # 优先复用空槽位或已过期的槽位，否则淘汰最久未使用的条目
+            free_slots = np.flatnonzero(self._expires_at <= now)
+            if free_slots.size > 0:
+                slot = int(free_slots[0])
+            else:
+                slot = int(np.argmin(self._last_used))
+                self.evictions += 1
+
+            if key not in self._key_index and len(self._key_index) >= 2 * self.max_entries:
+                self._compact_keys(now)
+            key_id = self._key_index.setdefault(key, len(self._key_index))
+            self._slot_keys[slot] = key
+            self._vectors[slot] = vector
+            self._expires_at[slot] = now + self.ttl
+            self._last_used[slot] = now
+            self._key_ids[slot] = key_id
+            self._questions[slot] = question
+            self._answers[slot] = answer
+
+    def _compact_keys(self, now: float):
+        """重建键索引，丢弃已不被任何有效条目引用的键"""
+        self._key_index = {}
+        for slot in np.flatnonzero(self._expires_at > now):
+            key = self._slot_keys[slot]
+            self._key_ids[slot] = self._key_index.setdefault(key, len(self._key_index))
+        self._key_ids[self._expires_at <= now] = -1
+
+    def invalidate(self):
+        """清空所有缓存的回答（知识库重新加载时调用）"""
+        with self._lock:
+            self._reset(dimension=self.dimension)
+            self.invalidations += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        now = time.time()
+        total = self.hits + self.misses
+        return {
+            "entries": int(np.count_nonzero(self._expires_at > now)),
+            "max_entries": self.max_entries,
+            "similarity_threshold": self.similarity_threshold,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "hit_rate": self.hits / total if total > 0 else 0.0
+        }
+
+# 创建全局语义回答缓存实例
+answer_cache = SemanticAnswerCache()
+
+# 知识库重新加载后，缓存的回答可能已经过时
+rag_service.add_invalidation_listener(answer_cache.invalidate)
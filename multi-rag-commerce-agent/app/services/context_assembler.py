@@ -0,0 +1,116 @@
+from typing import List, Dict, Any, Optional, Tuple
+import threading
+from ..config import settings
+from ..models.knowledge import SearchResult
+from ..utils.tokens import count_tokens, truncate_to_tokens
+
+def merge_overlapping(previous: str, following: str, max_overlap: Optional[int] = None) -> str:
+    """合并同一来源的相邻分块，去掉分块之间重叠的文本"""
+    max_overlap = min(len(previous), len(following), max_overlap or settings.CHUNK_OVERLAP)
+    for size in range(max_overlap, 0, -1):
+        if previous.endswith(following[:size]):
+            return previous + following[size:]
+    return previous + "\n" + following
+
+class ContextAssembler:
+    """按token预算组装检索上下文
+
+    1. 同一ID的重复分块只保留一次
+    2. 同一来源（source_id）连续的分块按 chunk_index 合并为一段，去掉重叠文本
+    3. 各段按其中分块的最高相关度排序，依次放入预算；放不下的段截断后放入，之后停止
+    token数使用 tiktoken 计算，并统计相对直接拼接全部分块节省的token数。
+    """
+
+    SEPARATOR = "\n\n"
+    # 剩余预算少于该值时不再截断放入
+    MIN_PASSAGE_TOKENS = 32
+
+    def __init__(self, max_tokens: Optional[int] = None, lock: Optional[threading.Lock] = None):
+        self.max_tokens = max_tokens or settings.CONTEXT_MAX_TOKENS
+        # 统计可以与所属服务的其他统计共用一把锁，读取时得到一致的快照
+        self._lock = lock or threading.Lock()
+        self.stats = {"assembled": 0, "tokens_used": 0, "tokens_saved": 0, "truncated": 0, "dropped_passages": 0}
+
+    def _format(self, content: str, source: str) -> str:
+        return f"内容: {content}\n来源: {source}"
+
+    def _passages(self, results: List[SearchResult]) -> List[Tuple[float, str, str]]:
+        """去重并合并相邻分块，返回按相关度降序的 (分数, 来源, 内容)"""
+        chunks: Dict[str, Dict[int, SearchResult]] = {}
+        order: Dict[str, int] = {}
+        for result in results:
+            source = result.source
+            chunk_index = (result.metadata or {}).get("chunk_index")
+            key = chunk_index if isinstance(chunk_index, int) else -len(chunks.get(source, {})) - 1
+            source_chunks = chunks.setdefault(source, {})
+            order.setdefault(source, len(order))
+            if key not in source_chunks or result.score > source_chunks[key].score:
+                source_chunks[key] = result
+
+        passages = []
+        for source, source_chunks in chunks.items():
+            run: List[SearchResult] = []
+            previous_index = None
+            for index in sorted(source_chunks):
+                if run and (index < 0 or previous_index != index - 1):
+                    passages.append(self._merge_run(source, run))
+                    run = []
+                run.append(source_chunks[index])
+                previous_index = index
+            if run:
+                passages.append(self._merge_run(source, run))
+        # 分数相同时保持检索顺序
+        passages.sort(key=lambda passage: (-passage[0], order[passage[1]]))
+        return passages
+
+    def _merge_run(self, source: str, run: List[SearchResult]) -> Tuple[float, str, str]:
+        content = run[0].content
+        for result in run[1:]:
+            content = merge_overlapping(content, result.content)
+        return max(result.score for result in run), source, content
+
+    def assemble(self, results: List[SearchResult], max_tokens: Optional[int] = None) -> Tuple[str, Dict[str, Any]]:
+        """组装上下文，返回 (上下文, 统计信息)"""
+        max_tokens = max_tokens or self.max_tokens
+        separator_tokens = count_tokens(self.SEPARATOR)
+        raw_tokens = count_tokens(self.SEPARATOR.join(self._format(result.content, result.source) for result in results))
+
+        parts: List[str] = []
+        used = 0
+        truncated = False
+        passages = self._passages(results)
+        for _, source, content in passages:
+            text = self._format(content, source)
+            cost = count_tokens(text) + (separator_tokens if parts else 0)
+            if used + cost <= max_tokens:
+                parts.append(text)
+                used += cost
+                continue
+            remaining = max_tokens - used - (separator_tokens if parts else 0)
+            if remaining >= self.MIN_PASSAGE_TOKENS:
+                # 截断内容而不是来源行
+                source_line_tokens = count_tokens(self._format("", source))
+                text = self._format(truncate_to_tokens(content, remaining - source_line_tokens), source)
+                parts.append(text)
+                used += count_tokens(text) + (separator_tokens if len(parts) > 1 else 0)
+                truncated = True
+            break
+
+        context = self.SEPARATOR.join(parts)
+        stats = {
+            "chunks": len(results),
+            "passages": len(passages),
+            "included_passages": len(parts),
+            "truncated": truncated,
+            "tokens_used": count_tokens(context),
+            "tokens_raw": raw_tokens,
+            "max_tokens": max_tokens
+        }
+        stats["tokens_saved"] = max(0, raw_tokens - stats["tokens_used"])
+        with self._lock:
+            self.stats["assembled"] += 1
+            self.stats["tokens_used"] += stats["tokens_used"]
+            self.stats["tokens_saved"] += stats["tokens_saved"]
+            self.stats["truncated"] += int(truncated)
+            self.stats["dropped_passages"] += len(passages) - len(parts)
+        return context, stats
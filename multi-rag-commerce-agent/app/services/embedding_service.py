@@ -0,0 +1,177 @@
+from typing import List, Dict, Any, Optional
+import re
+import zlib
+import numpy as np
+from langchain_openai import OpenAIEmbeddings
+from langchain_community.embeddings import OllamaEmbeddings
+from ..config import settings
+from ..utils.helpers import hash_content
+from .embedding_cache import EmbeddingCache
+
+class EmbeddingBackend:
+    """Embedding后端基类
+
+    RAG服务通过该接口自行计算向量，再以 embeddings= / query_embeddings=
+    传给向量数据库，避免回退到ChromaDB默认的本地ONNX模型。
+    """
+
+    model_name: str = ""
+
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        """计算一批文本的向量（由子类实现）"""
+        raise NotImplementedError
+
+    def embed_documents(self, texts: List[str], batch_size: Optional[int] = None) -> List[List[float]]:
+        """按固定批大小计算文档向量"""
+        batch_size = batch_size or settings.EMBEDDING_BATCH_SIZE
+        embeddings = []
+        for start in range(0, len(texts), batch_size):
+            embeddings.extend(self._embed(texts[start:start + batch_size]))
+        return embeddings
+
+    def embed_query(self, text: str) -> List[float]:
+        """计算查询向量"""
+        return self._embed([text])[0]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """批量计算查询向量"""
+        return self.embed_documents(texts) if texts else []
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """获取向量缓存统计（无缓存时为空）"""
+        return {}
+
+class LangChainEmbeddingBackend(EmbeddingBackend):
+    """基于LangChain Embeddings（Ollama/OpenAI）的后端"""
+
+    def __init__(self, embeddings, model_name: str):
+        self.embeddings = embeddings
+        self.model_name = model_name
+
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+
+class HashingEmbeddingBackend(EmbeddingBackend):
+    """确定性的本地哈希向量后端（离线测试用）
+
+    中文按字符二元组、英文按单词和字符三元组切分特征，
+    用带符号的特征哈希映射到固定维度并做L2归一化。
+    """
+
+    _word_pattern = re.compile(r'[a-z0-9]+')
+    _cjk_pattern = re.compile(r'[\u4e00-\u9fff]+')
+
+    def __init__(self, dimension: Optional[int] = None):
+        self.dimension = dimension or settings.HASHING_EMBEDDING_DIM
+        self.model_name = f"hashing-{self.dimension}"
+
+    def _features(self, text: str) -> List[str]:
+        """提取文本特征"""
+        text = text.lower()
+        features = []
+
+        for word in self._word_pattern.findall(text):
+            features.append(word)
+            padded = f" {word} "
+            features.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+
+        for run in self._cjk_pattern.findall(text):
+            features.extend(run)
+            features.extend(run[i:i + 2] for i in range(len(run) - 1))
+
+        return features
+
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        matrix = np.zeros((len(texts), self.dimension), dtype=np.float32)
+
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                hashed = zlib.crc32(feature.encode("utf-8"))
+                # 最高位决定符号，降低哈希冲突带来的偏差
+                sign = 1.0 if hashed & 0x80000000 else -1.0
+                matrix[row, hashed % self.dimension] += sign
+
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (matrix / norms).tolist()
+
+class CachedEmbeddingBackend(EmbeddingBackend):
+    """带持久化缓存的Embedding后端
+
+    文档向量按 (模型名, 文本哈希) 读写缓存，只有未命中的文本才交给内部后端计算，
+    重复入库未变化的分块时无需重新计算向量。
+    """
+
+    def __init__(self, backend: EmbeddingBackend, cache: EmbeddingCache):
+        self.backend = backend
+        self.cache = cache
+        self.model_name = backend.model_name
+
+    def embed_documents(self, texts: List[str], batch_size: Optional[int] = None) -> List[List[float]]:
+        text_hashes = [hash_content(text) for text in texts]
+        cached = self.cache.get_many(self.model_name, text_hashes)
+
+        # 只计算未命中的文本（相同内容只计算一次）
+        missing = {}
+        for text, text_hash in zip(texts, text_hashes):
+            if text_hash not in cached and text_hash not in missing:
+                missing[text_hash] = text
+
+        if missing:
+            vectors = self.backend.embed_documents(list(missing.values()), batch_size)
+            computed = dict(zip(missing.keys(), vectors))
+            self.cache.put_many(self.model_name, computed)
+            cached.update(computed)
+
+        return [cached[text_hash] for text_hash in text_hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        # 查询向量不写入持久化缓存，避免每次查询都产生磁盘写入
+        return self.backend.embed_query(text)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        return self.backend.embed_queries(texts)
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        return self.cache.get_stats()
+
+def create_embedding_backend(backend: Optional[str] = None) -> EmbeddingBackend:
+    """根据配置创建Embedding后端（按配置包装持久化缓存）"""
+    embedding_backend = _create_base_backend(backend or settings.EMBEDDING_BACKEND)
+
+    if settings.EMBEDDING_CACHE_ENABLED:
+        try:
+            return CachedEmbeddingBackend(embedding_backend, EmbeddingCache())
+        except Exception as e:
+            print(f"初始化向量缓存失败: {e}，不使用缓存")
+
+    return embedding_backend
+
+def _create_base_backend(backend: str) -> EmbeddingBackend:
+    """创建基础Embedding后端: ollama / openai / hashing"""
+    if backend == "hashing":
+        return HashingEmbeddingBackend()
+
+    if backend == "ollama":
+        return LangChainEmbeddingBackend(
+            OllamaEmbeddings(
+                model=settings.OLLAMA_EMBEDDING_MODEL,
+                base_url=settings.OLLAMA_BASE_URL
+            ),
+            model_name=settings.OLLAMA_EMBEDDING_MODEL
+        )
+
+    if backend == "openai":
+        return LangChainEmbeddingBackend(
+            OpenAIEmbeddings(
+                openai_api_key=settings.OPENAI_API_KEY,
+                openai_api_base=settings.OPENAI_BASE_URL,
+                model=settings.OPENAI_EMBEDDING_MODEL
+            ),
+            model_name=settings.OPENAI_EMBEDDING_MODEL
+        )
+
+    raise ValueError(f"不支持的Embedding后端: {backend}")
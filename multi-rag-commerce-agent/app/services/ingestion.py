@@ -0,0 +1,289 @@
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Callable
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import json
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from ..config import settings
+from ..models.knowledge import KnowledgeItem
+from ..utils.chunking import split_items
+from .rag_service import RAGService, rag_service
+
+def iter_json_records(file_path: str, buffer_size: int = 65536) -> Iterator[Dict[str, Any]]:
+    """逐条读取 JSON 数组或 JSONL 文件中的记录，内存占用与单条记录大小相关而与文件大小无关"""
+    with open(file_path, "r", encoding="utf-8") as f:
+        buffer = f.read(buffer_size).lstrip()
+        if not buffer.startswith("["):
+            # JSONL：每行一条记录
+            lines = buffer.split("\n")
+            pending = lines.pop()
+            for line in lines:
+                if line.strip():
+                    yield json.loads(line)
+            for line in f:
+                line = pending + line
+                pending = ""
+                if line.strip():
+                    yield json.loads(line)
+            if pending.strip():
+                yield json.loads(pending)
+            return
+
+        # JSON数组：在缓冲区上逐个解析元素，不足一个完整元素时继续读取
+        decoder = json.JSONDecoder()
+        buffer = buffer[1:]
+        eof = False
+        while True:
+            buffer = buffer.lstrip().lstrip(",").lstrip()
+            if buffer.startswith("]"):
+                return
+            try:
+                record, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                chunk = f.read(buffer_size)
+                eof = not chunk
+                buffer += chunk
+                continue
+            yield record
+            buffer = buffer[end:]
+
+def iter_knowledge_items(records: Iterable[Dict[str, Any]], errors: Optional[List[str]] = None) -> Iterator[KnowledgeItem]:
+    """将原始记录转换为KnowledgeItem，无效记录跳过（错误信息写入 errors）"""
+    for record in records:
+        try:
+            yield KnowledgeItem(
+                id=record["id"],
+                content=record["content"],
+                title=record.get("title", ""),
+                category=record["category"],
+                language=record["language"],
+                metadata=record.get("metadata", {})
+            )
+        except Exception as e:
+            if errors is not None:
+                errors.append(f"{record.get('id', '?') if isinstance(record, dict) else '?'}: {e}")
+
+class IngestionPipeline:
+    """流式并行入库管道
+
+    读取 -> 分块（进程池）-> 按固定批大小计算向量（线程池，有界并发）-> 有界队列 -> 单独的写入线程。
+    - 分块：条目按 SPLIT_GROUP_SIZE 分组交给进程池，同时最多 2 * split_workers 组在处理中，
+      split_workers 为1时在当前进程内分块；进程池以spawn方式启动子进程，
+      不fork已经运行写入线程、向量计算线程池（以及服务进程中的数据库连接与锁）的当前进程
+    - 向量计算：同时最多 embed_concurrency 个批次在计算中（适合远程向量接口的网络延迟），
+      结果按提交顺序交给写入队列
+    - 写入：只有一个写入线程访问向量存储；写入慢于向量计算时，向量计算在队列满时阻塞（背压）
+    每个阶段分别统计累计耗时与吞吐量（分块/秒，并发阶段的耗时为所有工作线程耗时之和）。
+    """
+
+    SPLIT_GROUP_SIZE = 64
+
+    def __init__(self, service: Optional[RAGService] = None, batch_size: Optional[int] = None,
+                 queue_size: Optional[int] = None, progress_interval: Optional[float] = None,
+                 progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 split_workers: Optional[int] = None, embed_concurrency: Optional[int] = None):
+        self.service = service or rag_service
+        self.batch_size = batch_size or settings.INGEST_BATCH_SIZE
+        self.queue_size = queue_size or settings.INGEST_QUEUE_SIZE
+        self.progress_interval = progress_interval if progress_interval is not None else settings.INGEST_PROGRESS_INTERVAL
+        self.progress_callback = progress_callback or self._print_progress
+        split_workers = split_workers if split_workers is not None else settings.INGEST_SPLIT_WORKERS
+        self.split_workers = split_workers or os.cpu_count() or 1
+        self.embed_concurrency = max(1, embed_concurrency or settings.INGEST_EMBED_CONCURRENCY)
+
+    def _print_progress(self, stats: Dict[str, Any]):
+        stage_rates = ", ".join(f"{stage} {rate:.1f}" for stage, rate in stats["stage_chunks_per_s"].items())
+        print(f"已处理 {stats['items']} 条, 写入 {stats['chunks_written']} 个分块, "
+              f"{stats['chunks_per_s']:.1f} 分块/秒 ({stage_rates}), 写入队列 {stats['queue_depth']}/{self.queue_size}")
+
+    def _iter_item_groups(self, items: Iterable[KnowledgeItem], stats: Dict[str, Any]) -> Iterator[List[KnowledgeItem]]:
+        group = []
+        for item in items:
+            stats["items"] += 1
+            group.append(item)
+            if len(group) >= self.SPLIT_GROUP_SIZE:
+                yield group
+                group = []
+        if group:
+            yield group
+
+    def _iter_chunk_groups(self, items: Iterable[KnowledgeItem], stats: Dict[str, Any]) -> Iterator[tuple]:
+        """分块阶段，按输入顺序产出每组条目的 (ids, documents, metadatas)"""
+        groups = self._iter_item_groups(items, stats)
+        if self.split_workers <= 1:
+            for group in groups:
+                split_start = time.perf_counter()
+                chunk_group = self.service._build_chunks(group)
+                stats["split_s"] += time.perf_counter() - split_start
+                stats["chunks_split"] += len(chunk_group[0])
+                yield chunk_group
+            return
+
+        chunk_size, chunk_overlap = self.service.chunk_size, self.service.chunk_overlap
+        with ProcessPoolExecutor(max_workers=self.split_workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            in_flight: deque = deque()
+
+            def collect():
+                ids, documents, metadatas, elapsed = in_flight.popleft().result()
+                stats["split_s"] += elapsed
+                stats["chunks_split"] += len(ids)
+                return ids, documents, metadatas
+
+            for group in groups:
+                in_flight.append(pool.submit(split_items, group, chunk_size, chunk_overlap))
+                if len(in_flight) >= 2 * self.split_workers:
+                    yield collect()
+            while in_flight:
+                yield collect()
+
+    def _iter_batches(self, items: Iterable[KnowledgeItem], stats: Dict[str, Any]) -> Iterator[tuple]:
+        """分块并按批大小聚合，产出 (ids, documents, metadatas)"""
+        ids, documents, metadatas = [], [], []
+        for group_ids, group_documents, group_metadatas in self._iter_chunk_groups(items, stats):
+            ids.extend(group_ids)
+            documents.extend(group_documents)
+            metadatas.extend(group_metadatas)
+            while len(ids) >= self.batch_size:
+                yield ids[:self.batch_size], documents[:self.batch_size], metadatas[:self.batch_size]
+                del ids[:self.batch_size], documents[:self.batch_size], metadatas[:self.batch_size]
+        if ids:
+            yield ids, documents, metadatas
+
+    @staticmethod
+    def _stage_rates(stats: Dict[str, Any]) -> Dict[str, float]:
+        """各阶段吞吐量：处理的分块数 / 该阶段累计耗时"""
+        stages = (("split", "chunks_split"), ("embed", "chunks_embedded"), ("write", "chunks_written"))
+        return {
+            stage: stats[count_key] / stats[f"{stage}_s"] if stats[f"{stage}_s"] > 0 else 0.0
+            for stage, count_key in stages
+        }
+
+    def run(self, items: Iterable[KnowledgeItem]) -> Dict[str, Any]:
+        """执行入库，返回统计信息；写入失败时统计信息中包含 error"""
+        stats: Dict[str, Any] = {
+            "items": 0, "chunks_split": 0, "chunks_embedded": 0, "chunks_written": 0, "batches": 0,
+            "queue_depth": 0, "max_queue_depth": 0, "max_embed_in_flight": 0,
+            "split_s": 0.0, "embed_s": 0.0, "write_s": 0.0
+        }
+        stats_lock = threading.Lock()
+        write_queue: "queue.Queue[Optional[tuple]]" = queue.Queue(maxsize=self.queue_size)
+        failures: List[Exception] = []
+        start_time = time.perf_counter()
+        last_report = start_time
+
+        def writer():
+            while True:
+                batch = write_queue.get()
+                if batch is None:
+                    # 所有批次写入后统一落盘（已写入的部分在失败时同样落盘）
+                    try:
+                        write_start = time.perf_counter()
+                        self.service.vector_store.flush()
+                        stats["write_s"] += time.perf_counter() - write_start
+                    except Exception as e:
+                        failures.append(e)
+                    return
+                if failures:
+                    continue
+                try:
+                    write_start = time.perf_counter()
+                    self.service.store_chunks(*batch)
+                    stats["write_s"] += time.perf_counter() - write_start
+                    stats["chunks_written"] += len(batch[0])
+                    stats["batches"] += 1
+                except Exception as e:
+                    failures.append(e)
+
+        def embed(ids, documents, metadatas):
+            embed_start = time.perf_counter()
+            embeddings = self.service.embedding_backend.embed_documents(documents)
+            with stats_lock:
+                stats["embed_s"] += time.perf_counter() - embed_start
+                stats["chunks_embedded"] += len(ids)
+            return ids, documents, embeddings, metadatas
+
+        def enqueue(future) -> bool:
+            """按提交顺序取出向量计算结果放入写入队列，写入已失败时返回False"""
+            batch = future.result()
+            # 队列满时阻塞等待写入线程（背压），同时检查写入是否已失败
+            while not failures:
+                try:
+                    write_queue.put(batch, timeout=0.5)
+                    break
+                except queue.Full:
+                    continue
+            stats["queue_depth"] = write_queue.qsize()
+            stats["max_queue_depth"] = max(stats["max_queue_depth"], stats["queue_depth"])
+            return not failures
+
+        writer_thread = threading.Thread(target=writer, name="ingestion-writer", daemon=True)
+        writer_thread.start()
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.embed_concurrency, thread_name_prefix="ingestion-embed") as embed_pool:
+                in_flight: deque = deque()
+                try:
+                    for batch in self._iter_batches(items, stats):
+                        in_flight.append(embed_pool.submit(embed, *batch))
+                        stats["max_embed_in_flight"] = max(stats["max_embed_in_flight"], len(in_flight))
+                        if len(in_flight) >= self.embed_concurrency and not enqueue(in_flight.popleft()):
+                            break
+
+                        now = time.perf_counter()
+                        if self.progress_interval and now - last_report >= self.progress_interval:
+                            last_report = now
+                            stats["chunks_per_s"] = stats["chunks_written"] / (now - start_time)
+                            stats["stage_chunks_per_s"] = self._stage_rates(stats)
+                            self.progress_callback(dict(stats))
+                    while in_flight and not failures:
+                        enqueue(in_flight.popleft())
+                finally:
+                    for future in in_flight:
+                        future.cancel()
+        except Exception as e:
+            failures.append(e)
+        finally:
+            write_queue.put(None)
+            writer_thread.join()
+            if stats["chunks_written"]:
+                self.service._invalidate_caches()
+
+        stats["elapsed_s"] = time.perf_counter() - start_time
+        stats["chunks_per_s"] = stats["chunks_written"] / stats["elapsed_s"] if stats["elapsed_s"] > 0 else 0.0
+        stats["stage_chunks_per_s"] = self._stage_rates(stats)
+        stats["queue_depth"] = 0
+        if failures:
+            print(f"流式入库失败: {failures[0]}")
+            stats["error"] = str(failures[0])
+        return stats
+
+def iter_file_items(file_paths: Iterable[str], errors: Optional[List[str]] = None) -> Iterator[KnowledgeItem]:
+    """依次流式读取多个 JSON 数组 / JSONL 文件中的知识条目"""
+    for file_path in file_paths:
+        yield from iter_knowledge_items(iter_json_records(str(file_path)), errors)
+
+def _report_skipped(stats: Dict[str, Any], errors: List[str]):
+    stats["skipped"] = len(errors)
+    for error in errors[:10]:
+        print(f"跳过无效记录 {error}")
+
+def ingest_files(file_paths: Iterable[str], service: Optional[RAGService] = None,
+                 **pipeline_options) -> Dict[str, Any]:
+    """流式导入多个 JSON 数组 / JSONL 文件（写入当前版本）"""
+    errors: List[str] = []
+    stats = IngestionPipeline(service=service, **pipeline_options).run(iter_file_items(file_paths, errors))
+    _report_skipped(stats, errors)
+    return stats
+
+def reload_files(file_paths: Iterable[str], service: Optional[RAGService] = None,
+                 **reload_options) -> Dict[str, Any]:
+    """用多个 JSON 数组 / JSONL 文件蓝绿重建知识库（见 RAGService.reload_knowledge）"""
+    errors: List[str] = []
+    stats = (service or rag_service).reload_knowledge(iter_file_items(file_paths, errors), **reload_options)
+    _report_skipped(stats, errors)
+    return stats
@@ -0,0 +1,127 @@
+from typing import List, Tuple
+import json
+import os
+import random
+import zlib
+import numpy as np
+from ..config import settings
+
+class IntentClassifier:
+    """本地意图分类器（字符n-gram哈希特征 + 逻辑回归）
+
+    进程内完成推理，无需调用LLM；置信度不足时由调用方降级到LLM。
+    """
+
+    # 标签顺序：0 -> chat, 1 -> business
+    LABELS = ("chat", "business")
+
+    def __init__(self, ngram_range: Tuple[int, int] = (1, 3), n_features: int = 2 ** 16,
+                 epochs: int = 30, learning_rate: float = 0.5, l2: float = 1e-4):
+        self.ngram_range = ngram_range
+        self.n_features = n_features
+        self.epochs = epochs
+        self.learning_rate = learning_rate
+        self.l2 = l2
+
+        self.weights = np.zeros(n_features, dtype=np.float64)
+        self.bias = 0.0
+        self.is_trained = False
+
+    def _featurize(self, text: str) -> Tuple[np.ndarray, np.ndarray]:
+        """提取字符n-gram特征（哈希到固定维度，L2归一化）"""
+        # 合并连续空白并加上边界标记，使短文本也能产生首尾特征
+        normalized = " " + " ".join(text.lower().split()) + " "
+        counts = {}
+
+        min_n, max_n = self.ngram_range
+        for n in range(min_n, max_n + 1):
+            for i in range(len(normalized) - n + 1):
+                gram = normalized[i:i + n]
+                if gram.isspace():
+                    continue
+                index = zlib.crc32(gram.encode("utf-8")) % self.n_features
+                counts[index] = counts.get(index, 0.0) + 1.0
+
+        if not counts:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+
+        indices = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+        values = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+        values /= np.linalg.norm(values)
+        return indices, values
+
+    def fit(self, texts: List[str], labels: List[str]) -> "IntentClassifier":
+        """使用SGD训练逻辑回归"""
+        samples = [
+            (self._featurize(text), float(self.LABELS.index(label)))
+            for text, label in zip(texts, labels)
+        ]
+
+        self.weights = np.zeros(self.n_features, dtype=np.float64)
+        self.bias = 0.0
+        # 固定随机种子，保证同一份训练数据得到相同的模型
+        rng = random.Random(0)
+
+        for _ in range(self.epochs):
+            rng.shuffle(samples)
+            for (indices, values), target in samples:
+                error = self._sigmoid(self.weights[indices] @ values + self.bias) - target
+                self.weights[indices] -= self.learning_rate * (error * values + self.l2 * self.weights[indices])
+                self.bias -= self.learning_rate * error
+
+        self.is_trained = bool(samples)
+        return self
+
+    def predict(self, text: str) -> Tuple[str, float]:
+        """预测意图，返回(意图, 置信度)"""
+        if not self.is_trained:
+            return "business", 0.0
+
+        indices, values = self._featurize(text)
+        probability = float(self._sigmoid(self.weights[indices] @ values + self.bias))
+
+        if probability >= 0.5:
+            return "business", probability
+        return "chat", 1.0 - probability
+
+    @staticmethod
+    def _sigmoid(score: float) -> float:
+        """数值稳定的sigmoid"""
+        if score >= 0:
+            return 1.0 / (1.0 + np.exp(-score))
+        exp_score = np.exp(score)
+        return exp_score / (1.0 + exp_score)
+
+    @classmethod
+    def from_jsonl(cls, file_path: str) -> "IntentClassifier":
+        """从标注的JSONL文件训练分类器（每行: {"text": ..., "intent": "chat|business"}）"""
+        classifier = cls()
+        texts, labels = load_intent_samples(file_path)
+        if texts:
+            classifier.fit(texts, labels)
+        return classifier
+
+def load_intent_samples(file_path: str) -> Tuple[List[str], List[str]]:
+    """加载意图标注数据"""
+    texts, labels = [], []
+    if not os.path.exists(file_path):
+        print(f"意图训练文件不存在: {file_path}，本地分类器未启用")
+        return texts, labels
+
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                sample = json.loads(line)
+                if sample.get("intent") in IntentClassifier.LABELS:
+                    texts.append(sample["text"])
+                    labels.append(sample["intent"])
+    except Exception as e:
+        print(f"加载意图训练文件失败: {e}")
+        return [], []
+
+    return texts, labels
+
+# 创建全局意图分类器实例
+intent_classifier = IntentClassifier.from_jsonl(settings.INTENT_TRAINING_FILE)
@@ -0,0 +1,289 @@
+from typing import List, Dict, Any, Optional
+import os
+import numpy as np
+from ..config import settings
+from .vector_store import NumpyVectorStore
+
+def assign_nearest(data: np.ndarray, centroids: np.ndarray, chunk_size: int = 8192) -> np.ndarray:
+    """为每个向量找到最近的中心（欧氏距离，分块计算控制内存）"""
+    half_norms = 0.5 * np.einsum("kd,kd->k", centroids, centroids)
+    assignments = np.empty(len(data), dtype=np.int32)
+    for start in range(0, len(data), chunk_size):
+        chunk = data[start:start + chunk_size]
+        # argmin ||x - c||² 等价于 argmax (x·c - ||c||²/2)
+        assignments[start:start + chunk_size] = np.argmax(chunk @ centroids.T - half_norms, axis=1)
+    return assignments
+
+def kmeans(data: np.ndarray, k: int, iterations: int = 20, seed: int = 0) -> np.ndarray:
+    """Lloyd k-means，返回 k 个中心"""
+    rng = np.random.default_rng(seed)
+    centroids = data[rng.choice(len(data), k, replace=False)].astype(np.float32)
+    for _ in range(iterations):
+        assignments = assign_nearest(data, centroids)
+        counts = np.bincount(assignments, minlength=k)
+        sums = np.stack([np.bincount(assignments, weights=data[:, d], minlength=k) for d in range(data.shape[1])], axis=1)
+        empty = counts == 0
+        centroids[~empty] = (sums[~empty] / counts[~empty, None]).astype(np.float32)
+        # 空簇重新随机选取一个样本作为中心
+        if empty.any():
+            centroids[empty] = data[rng.choice(len(data), int(empty.sum()), replace=False)]
+    return centroids
+
+class IVFPQVectorStore(NumpyVectorStore):
+    """IVF-PQ 近似最近邻向量存储
+
+    在 NumpyVectorStore 的基础上增加倒排文件（IVF）与乘积量化（PQ）：
+    - 粗量化：k-means 得到 nlist 个中心，每个向量归入最近的中心（倒排列表）
+    - 乘积量化：向量与中心的残差切分为 m 段，每段用 256 个码字编码为1字节
+    检索时只扫描与查询最接近的 nprobe 个倒排列表，用查表法（ADC）计算近似分数；
+    refine_factor > 0 时再从磁盘上的原始向量中读取 top_k * refine_factor 个候选精确重排。
+    常驻内存的只有中心、码本和每个向量 m 字节的编码，原始向量留在内存映射文件中。
+    向量数达到训练阈值前使用精确检索；训练后新写入的向量增量编码并追加到倒排列表，
+    数据量增长到训练时的 RETRAIN_GROWTH 倍后自动重新训练。
+    训练（k-means 与全部向量的重新编码）在锁外进行，完成后在锁内替换中心与码本，
+    训练期间检索继续使用旧的索引（或精确检索）。
+    """
+
+    name = "ivfpq"
+    RETRAIN_GROWTH = 8
+
+    def __init__(self, directory: str, nlist: Optional[int] = None, nprobe: Optional[int] = None,
+                 m: Optional[int] = None, refine_factor: Optional[int] = None,
+                 train_threshold: Optional[int] = None):
+        self.nlist_setting = nlist if nlist is not None else settings.IVF_NLIST
+        self.nprobe = nprobe or settings.IVF_NPROBE
+        self.m_setting = m or settings.PQ_M
+        self.refine_factor = refine_factor if refine_factor is not None else settings.IVF_REFINE_FACTOR
+        self.train_threshold = train_threshold or settings.IVF_TRAIN_THRESHOLD
+        super().__init__(directory)
+
+    def _open(self):
+        super()._open()
+        self._trained = False
+        self._centroids = np.zeros((0, self.dimension), dtype=np.float32)
+        self._codebooks = np.zeros((0, 0, 0), dtype=np.float32)
+        self._list_ids = np.full(self._capacity, -1, dtype=np.int32)
+        self._pq_codes = np.zeros((self._capacity, 0), dtype=np.uint8)
+        self._trained_size = 0
+        self._inverted_lists: Optional[List[np.ndarray]] = None
+        self._train_pending = False
+        self._training = False
+        self._rows_written_during_training: List[np.ndarray] = []
+
+        if os.path.exists(self._path("ivfpq.npz")):
+            index = np.load(self._path("ivfpq.npz"))
+            self._centroids = index["centroids"]
+            self._codebooks = index["codebooks"]
+            self._trained_size = int(index["trained_size"])
+            self._trained = True
+            # 索引文件在头信息之后写入，可能比头信息旧：补齐容量并编码缺少的行
+            list_ids, pq_codes = index["list_ids"][:self._capacity], index["pq_codes"][:self._capacity]
+            self._list_ids[:len(list_ids)] = list_ids
+            self._pq_codes = np.zeros((self._capacity, self._codebooks.shape[0]), dtype=np.uint8)
+            self._pq_codes[:len(pq_codes)] = pq_codes
+            missing = np.flatnonzero(self._alive[:self._size] & (self._list_ids[:self._size] < 0))
+            if missing.size:
+                self._encode_rows(missing, np.asarray(self._vectors[missing]))
+
+    def _save(self):
+        super()._save()
+        if self._trained:
+            self._write_file("ivfpq.npz", lambda f: np.savez(
+                f,
+                centroids=self._centroids,
+                codebooks=self._codebooks,
+                list_ids=self._list_ids,
+                pq_codes=self._pq_codes,
+                trained_size=self._trained_size
+            ))
+
+    def _reserve(self, rows: int):
+        previous_capacity = self._capacity
+        super()._reserve(rows)
+        extra = self._capacity - previous_capacity
+        if extra > 0:
+            self._list_ids = np.concatenate([self._list_ids, np.full(extra, -1, dtype=np.int32)])
+            self._pq_codes = np.concatenate([
+                self._pq_codes, np.zeros((extra, self._pq_codes.shape[1]), dtype=np.uint8)
+            ])
+
+    @property
+    def m(self) -> int:
+        """子空间数量（取不超过配置值的维度约数）"""
+        return max(divisor for divisor in range(1, min(self.m_setting, self.dimension) + 1)
+                   if self.dimension % divisor == 0)
+
+    def _quantize(self, vectors: np.ndarray, centroids: np.ndarray, codebooks: np.ndarray) -> tuple:
+        """用给定的中心与码本将向量编码为 (倒排列表, PQ编码)"""
+        list_ids = assign_nearest(vectors, centroids)
+        residuals = vectors - centroids[list_ids]
+        m, dsub = codebooks.shape[0], codebooks.shape[2]
+        codes = np.empty((len(vectors), m), dtype=np.uint8)
+        for j in range(m):
+            codes[:, j] = assign_nearest(residuals[:, j * dsub:(j + 1) * dsub], codebooks[j])
+        return list_ids, codes
+
+    def _encode_rows(self, rows: np.ndarray, vectors: np.ndarray):
+        """用当前码本编码写入的行，并把它们移动到新的倒排列表"""
+        previous = self._list_ids[rows].copy()
+        list_ids, codes = self._quantize(vectors, self._centroids, self._codebooks)
+        self._list_ids[rows] = list_ids
+        self._pq_codes[rows] = codes
+        if self._inverted_lists is None:
+            return
+        # 覆盖写入的行先从原来的列表中移除，新行按列表分组追加，不重建整个倒排索引
+        for list_id in np.unique(previous[previous >= 0]).tolist():
+            inverted_list = self._inverted_lists[list_id]
+            self._inverted_lists[list_id] = inverted_list[~np.isin(inverted_list, rows)]
+        order = np.argsort(list_ids, kind="stable")
+        sorted_ids = list_ids[order]
+        bounds = np.flatnonzero(np.diff(sorted_ids)) + 1
+        for group in np.split(order, bounds):
+            list_id = int(list_ids[group[0]])
+            self._inverted_lists[list_id] = np.concatenate([self._inverted_lists[list_id], rows[group]])
+
+    def add(self, ids, documents, embeddings, metadatas):
+        super().add(ids, documents, embeddings, metadatas)
+        # 达到训练条件时在写入锁释放后训练，不阻塞检索
+        if self._train_pending:
+            self.train()
+
+    def train(self, sample_size: Optional[int] = None, seed: int = 0):
+        """训练粗量化中心与PQ码本，并重新编码所有向量
+
+        只在锁内取快照与替换结果：训练期间写入的行在替换时用新码本重新编码，
+        训练期间的检索继续使用旧的索引。同一时间只有一个训练任务。
+        """
+        with self._lock:
+            alive_rows = np.flatnonzero(self._alive[:self._size])
+            if self._training or alive_rows.size == 0:
+                return
+            self._training = True
+            self._train_pending = False
+            self._rows_written_during_training = []
+            size, vectors, m = self._size, self._vectors, self.m
+            rng = np.random.default_rng(seed)
+            sample_size = sample_size or settings.IVF_TRAIN_SAMPLE
+            sample_rows = np.sort(rng.choice(alive_rows, min(sample_size, alive_rows.size), replace=False))
+            sample = np.asarray(vectors[sample_rows])
+
+        try:
+            nlist = self.nlist_setting or int(4 * np.sqrt(alive_rows.size))
+            nlist = max(1, min(nlist, 4096, sample.shape[0]))
+            centroids = kmeans(sample, nlist, seed=seed)
+
+            residuals = sample - centroids[assign_nearest(sample, centroids)]
+            dsub = sample.shape[1] // m
+            ksub = min(256, sample.shape[0])
+            codebooks = np.stack([
+                kmeans(residuals[:, j * dsub:(j + 1) * dsub], ksub, seed=seed + j + 1) for j in range(m)
+            ])
+
+            list_ids = np.full(size, -1, dtype=np.int32)
+            pq_codes = np.zeros((size, m), dtype=np.uint8)
+            for start in range(0, alive_rows.size, 65536):
+                rows = alive_rows[start:start + 65536]
+                list_ids[rows], pq_codes[rows] = self._quantize(np.asarray(vectors[rows]), centroids, codebooks)
+
+            with self._lock:
+                if self._size < size:
+                    # 训练期间存储被清空
+                    return
+                self._centroids, self._codebooks = centroids, codebooks
+                self._list_ids = np.full(self._capacity, -1, dtype=np.int32)
+                self._list_ids[:size] = list_ids
+                self._pq_codes = np.zeros((self._capacity, m), dtype=np.uint8)
+                self._pq_codes[:size] = pq_codes
+                self._inverted_lists = None
+                # 训练期间写入（追加或覆盖）的行用新码本重新编码
+                written = np.unique(np.concatenate([np.zeros(0, dtype=np.int64)] + self._rows_written_during_training))
+                written = written[self._alive[written]]
+                if written.size:
+                    self._encode_rows(written, np.asarray(self._vectors[written]))
+                self._trained = True
+                self._trained_size = int(alive_rows.size)
+                self._dirty = True
+        finally:
+            with self._lock:
+                self._training = False
+                self._rows_written_during_training = []
+
+    def _on_rows_written(self, rows: np.ndarray, vectors: np.ndarray):
+        if self._training:
+            # 正在训练：记录写入的行，替换码本时重新编码
+            self._rows_written_during_training.append(rows.copy())
+        if self._trained:
+            self._encode_rows(rows, vectors)
+        if self._training:
+            return
+        if self._trained and self._count >= self._trained_size * self.RETRAIN_GROWTH:
+            self._train_pending = True
+        elif not self._trained and self._count >= self.train_threshold:
+            self._train_pending = True
+
+    def _get_inverted_lists(self) -> List[np.ndarray]:
+        """按倒排列表分组的行号（打开或训练后构建一次，之后随写入增量更新）"""
+        if self._inverted_lists is None:
+            list_ids = self._list_ids[:self._size]
+            order = np.argsort(list_ids, kind="stable")
+            bounds = np.searchsorted(list_ids[order], np.arange(len(self._centroids) + 1))
+            self._inverted_lists = [order[bounds[i]:bounds[i + 1]] for i in range(len(self._centroids))]
+        return self._inverted_lists
+
+    def _search_rows(self, queries: np.ndarray, mask: np.ndarray, n_results: int) -> List[tuple]:
+        if not self._trained:
+            return super()._search_rows(queries, mask, n_results)
+
+        nlist = len(self._centroids)
+        nprobe = min(self.nprobe, nlist)
+        if not mask.all() and mask.sum() <= self._count * nprobe / nlist:
+            # 过滤后的候选行不多于探测 nprobe 个列表要扫描的行：直接对候选行精确打分
+            return super()._search_rows(queries, mask, n_results)
+
+        inverted_lists = self._get_inverted_lists()
+        m, dsub = self._codebooks.shape[0], self._codebooks.shape[2]
+        subspaces = np.arange(m)
+
+        top_rows = []
+        for query in queries:
+            coarse_scores = self._centroids @ query
+            order = np.argsort(-coarse_scores)
+            # 过滤条件在打分前生效；通过过滤的候选不足 n_results 时成倍增加探测的列表
+            probed = 0
+            parts = []
+            candidate_count = 0
+            while probed < nlist and (probed < nprobe or candidate_count < n_results):
+                for list_id in order[probed:max(nprobe, probed * 2)]:
+                    listed = inverted_lists[list_id]
+                    parts.append(listed[mask[listed]])
+                    candidate_count += parts[-1].size
+                probed = max(nprobe, probed * 2)
+            rows = np.concatenate(parts) if parts else np.zeros(0, dtype=np.int64)
+            if rows.size == 0:
+                top_rows.append(([], np.zeros(0, dtype=np.float32)))
+                continue
+
+            # 查表法: q·x ≈ q·c + Σ_j q_j·codebook_j[code_j]
+            lookup = np.einsum("md,mkd->mk", query.reshape(m, dsub), self._codebooks)
+            scores = coarse_scores[self._list_ids[rows]] + lookup[subspaces, self._pq_codes[rows]].sum(axis=1)
+
+            if self.refine_factor > 0:
+                top = self._top_k(scores, min(n_results * self.refine_factor, rows.size))
+                rows = np.sort(rows[top])
+                scores = np.asarray(self._vectors[rows]) @ query
+            top = self._top_k(scores, min(n_results, rows.size))
+            top_rows.append((rows[top].tolist(), scores[top]))
+        return top_rows
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = super().get_stats()
+        stats.update({
+            "trained": self._trained,
+            "trained_size": self._trained_size,
+            "nlist": len(self._centroids),
+            "nprobe": self.nprobe,
+            "m": self._codebooks.shape[0] if self._trained else self.m_setting,
+            "refine_factor": self.refine_factor,
+            "code_bytes": self._count * (self._codebooks.shape[0] if self._trained else 0)
+        })
+        return stats
@@ -0,0 +1,165 @@
+from typing import List, Dict, Any, Optional, Set, Tuple
+from collections import Counter
+import math
+import re
+import threading
+from ..config import settings
+from ..utils.metadata_filter import metadata_matches
+
+# 拉丁字母/数字组成的词（支持 SKU、型号中的连字符与点号），以及连续的中日韩字符
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[-.][a-z0-9]+)*|[぀-ヿ㐀-䶿一-鿿가-힯]+")
+_LATIN_PATTERN = re.compile(r"[a-z0-9]")
+
+def tokenize(text: str) -> List[str]:
+    """中日韩感知的分词
+
+    拉丁文本按词切分并转为小写，中日韩连续字符切分为字符二元组（单字保留为一元组）。
+    """
+    tokens = []
+    for match in _TOKEN_PATTERN.finditer(text.lower()):
+        token = match.group()
+        if _LATIN_PATTERN.match(token):
+            tokens.append(token)
+        elif len(token) == 1:
+            tokens.append(token)
+        else:
+            tokens.extend(token[i:i + 2] for i in range(len(token) - 1))
+    return tokens
+
+class BM25Index:
+    """进程内BM25倒排索引
+
+    与向量集合使用相同的文档ID，按分类、语言与品牌维护文档集合，
+    检索时先按过滤条件确定候选文档，再只对候选文档计算BM25分数；
+    其他元数据条件（价格范围、特性包含）在打分时逐个文档判断。
+    """
+
+    FILTER_FIELDS = ("category", "language", "brand")
+
+    def __init__(self, k1: Optional[float] = None, b: Optional[float] = None):
+        self.k1 = k1 if k1 is not None else settings.BM25_K1
+        self.b = b if b is not None else settings.BM25_B
+
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        """清空索引"""
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._doc_lengths: Dict[str, int] = {}
+        self._doc_terms: Dict[str, List[str]] = {}
+        self._documents: Dict[str, str] = {}
+        self._metadatas: Dict[str, Dict[str, Any]] = {}
+        self._filters: Dict[Tuple[str, str], Set[str]] = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def add(self, ids: List[str], documents: List[str], metadatas: List[Dict[str, Any]]):
+        """添加文档（ID已存在时覆盖）"""
+        with self._lock:
+            for doc_id, document, metadata in zip(ids, documents, metadatas):
+                self._remove(doc_id)
+
+                term_counts = Counter(tokenize(f"{metadata.get('title', '')} {document}"))
+                for term, count in term_counts.items():
+                    self._postings.setdefault(term, {})[doc_id] = count
+                length = sum(term_counts.values())
+                self._doc_lengths[doc_id] = length
+                self._doc_terms[doc_id] = list(term_counts)
+                self._documents[doc_id] = document
+                self._metadatas[doc_id] = metadata
+                self._total_length += length
+                for field in self.FILTER_FIELDS:
+                    self._filters.setdefault((field, metadata.get(field)), set()).add(doc_id)
+
+    def remove(self, ids: List[str]):
+        """删除文档"""
+        with self._lock:
+            for doc_id in ids:
+                self._remove(doc_id)
+
+    def _remove(self, doc_id: str):
+        if doc_id not in self._documents:
+            return
+        for term in self._doc_terms.pop(doc_id):
+            postings = self._postings[term]
+            del postings[doc_id]
+            if not postings:
+                del self._postings[term]
+        metadata = self._metadatas.pop(doc_id)
+        for field in self.FILTER_FIELDS:
+            self._filters[(field, metadata.get(field))].discard(doc_id)
+        self._total_length -= self._doc_lengths.pop(doc_id)
+        del self._documents[doc_id]
+
+    def _candidates(self, where: Dict[str, Any]) -> Optional[Set[str]]:
+        """按分类型字段的等值条件确定候选文档，没有这类条件时返回None（全部文档）"""
+        candidates = None
+        for field in self.FILTER_FIELDS:
+            value = where.get(field)
+            if value is not None and not isinstance(value, dict):
+                doc_ids = self._filters.get((field, value), set())
+                candidates = doc_ids if candidates is None else candidates & doc_ids
+        return candidates
+
+    def search(self, query: str, top_k: int = 5, category: Optional[str] = None,
+               language: Optional[str] = None, where: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """BM25检索，返回按分数降序排列的文档
+
+        where 为与向量存储相同格式的元数据过滤条件，与 category / language 同时生效。
+        """
+        where = dict(where or {})
+        if category:
+            where["category"] = category
+        if language:
+            where["language"] = language
+        with self._lock:
+            doc_count = len(self._documents)
+            candidates = self._candidates(where)
+            # 候选集合之外的其他条件逐个文档判断（结果缓存，每个文档只判断一次）
+            residual = {
+                field: condition for field, condition in where.items()
+                if field not in self.FILTER_FIELDS or isinstance(condition, dict)
+            }
+            matched: Dict[str, bool] = {}
+            if doc_count == 0 or candidates == set():
+                return []
+
+            average_length = self._total_length / doc_count
+            scores: Dict[str, float] = {}
+            for term in set(tokenize(query)):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    if candidates is not None and doc_id not in candidates:
+                        continue
+                    if residual:
+                        if doc_id not in matched:
+                            matched[doc_id] = metadata_matches(self._metadatas[doc_id], residual)
+                        if not matched[doc_id]:
+                            continue
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_lengths[doc_id] / average_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+            ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+            return [
+                {
+                    "id": doc_id,
+                    "score": score,
+                    "document": self._documents[doc_id],
+                    "metadata": self._metadatas[doc_id]
+                }
+                for doc_id, score in ranked
+            ]
+
+def reciprocal_rank_fusion(ranked_lists: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """倒数排名融合（RRF）：score(d) = Σ 1 / (k + rank)，rank从1开始"""
+    scores: Dict[str, float] = {}
+    for ranked_ids in ranked_lists:
+        for rank, doc_id in enumerate(ranked_ids, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
@@ -11,6 +11,11 @@ class LanguageService:
         # 中文特征字符
         self.chinese_pattern = re.compile(r'[\u4e00-\u9fff]')
         
+        # 混合语言拆分：句子边界，以及中文（含全角标点）/非中文字符段
+        self.sentence_pattern = re.compile(r'(?<=[。！？；!?;])\s*|(?<=\.)\s+|\n+')
+        self.script_pattern = re.compile(r'[\u4e00-\u9fff\u3000-\u303f\uff00-\uffef]+|[^\u4e00-\u9fff\u3000-\u303f\uff00-\uffef]+')
+        self.word_pattern = re.compile(r'[\u4e00-\u9fffa-zA-Z]')
+        
         # 语言检测规则
         self.language_rules = {
             'zh': {
@@ -87,6 +92,25 @@ class LanguageService:
         
         return False
     
+    def split_by_language(self, text: str) -> List[Tuple[str, str]]:
+        """将混合语言文本拆分为各语言的子查询
+
+        先按句末标点切分句子，每个句子归属 detect_language 检测出的语言；
+        句子本身中英混合时再按中文/非中文字符段切分。
+        返回 [(语言, 该语言的全部片段)]，按语言首次出现的顺序。
+        """
+        groups: Dict[str, List[str]] = {}
+        for sentence in self.sentence_pattern.split(text):
+            sentence = sentence.strip()
+            if not sentence:
+                continue
+            pieces = self.script_pattern.findall(sentence) if self.is_mixed_language(sentence) else [sentence]
+            for piece in pieces:
+                piece = piece.strip()
+                if self.word_pattern.search(piece):
+                    groups.setdefault(self.detect_language(piece), []).append(piece)
+        return [(language, " ".join(pieces)) for language, pieces in groups.items()]
+    
     def get_language_info(self, text: str) -> Dict[str, Any]:
         """获取语言信息"""
         detected_lang = self.detect_language(text)
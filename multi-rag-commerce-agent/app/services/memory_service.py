@@ -1,46 +1,54 @@
-from typing import List, Dict, Any, Optional
-from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional, Tuple, Callable, Awaitable
+from datetime import datetime
+import asyncio
 import json
-from ..models.chat import Message, ConversationHistory
+import re
+import time
+from ..models.chat import Message, ConversationHistory, Language
 from ..config import settings
+from ..utils.tokens import count_tokens, truncate_to_tokens
+from .memory_store import MemoryStore, MessageRecord, create_memory_store
+
+# 摘要生成函数: (已有摘要, 待压缩的消息) -> 新摘要
+Summarizer = Callable[[str, List[MessageRecord]], Awaitable[str]]
+
+# 抽取式摘要只取每条消息的第一句，每句最多的token数
+_SENTENCE_END = re.compile(r"[。！？!?\n]|\.\s")
+_SUMMARY_SENTENCE_TOKENS = 40
 
 class MemoryService:
     """记忆管理服务"""
     
-    def __init__(self):
-        # 内存存储（生产环境建议使用Redis或数据库）
-        # [mark] 为何使用Redis？ 还有其他选项吗？supabase是否是其中之一？
-        self.conversations: Dict[str, ConversationHistory] = {}
-        self.user_preferences: Dict[str, Dict[str, Any]] = {}
+    def __init__(self, store: Optional[MemoryStore] = None, summarizer: Optional[Summarizer] = None):
+        # 对话与用户偏好保存在可替换的存储后端中（见 MEMORY_BACKEND）：
+        # 进程内存储只在单个worker内可见，多worker或需要重启后保留时使用SQLite或Redis
+        self.store = store or create_memory_store()
         
-        # 清理过期对话的时间间隔（小时）
-        self.cleanup_interval = 24
+        # 对话过期时间（小时）：最后一条消息之后超过该时间的会话被清理
+        self.cleanup_interval = settings.MEMORY_SESSION_TTL_HOURS
+        
+        # 滚动摘要的生成函数，为None时使用抽取式摘要（SUMMARIZER=llm 时由AgentService注册LLM实现）
+        self.summarizer = summarizer
+        # 正在后台更新摘要的会话（每个会话同时最多一个任务）
+        self._summary_tasks: Dict[str, asyncio.Task] = {}
+    
+    async def _arun(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """在事件循环中调用同步方法：SQLite/Redis的读写在线程池中执行，进程内存储直接在当前协程中执行"""
+        if self.store.blocking:
+            return await asyncio.to_thread(func, *args, **kwargs)
+        return func(*args, **kwargs)
     
     def add_message(self, session_id: str, user_id: Optional[str], 
                    role: str, content: str, language: Optional[str] = None) -> bool:
         """添加消息到对话历史"""
         try:
-            # 获取或创建对话历史
-            if session_id not in self.conversations:
-                self.conversations[session_id] = ConversationHistory(
-                    session_id=session_id,
-                    user_id=user_id,
-                    messages=[]
-                )
-            
-            # 创建消息
-            message = Message(
-                role=role,
-                content=content,
-                language=language
-            )
-            
-            # 添加到对话历史
-            self.conversations[session_id].messages.append(message)
-            self.conversations[session_id].updated_at = datetime.now()
-            
-            # 限制对话历史长度
-            self._limit_conversation_length(session_id)
+            # 只追加一条紧凑的消息记录（会话不存在时由存储创建），不重写整个对话历史；
+            # 超过 MAX_HISTORY_LENGTH 时存储在追加的同时丢弃最旧的消息（进程内存储为环形缓冲区）；
+            # 开启摘要时，丢弃的消息若尚未压缩进摘要（后台摘要较慢），存储在同一次操作中用抽取式摘要压缩，不丢失对话内容，
+            # 之后完成的后台摘要只覆盖更新的消息时才会写入（见 set_summary）
+            record = MessageRecord(role, content, time.time(), Language(language).value if language else None)
+            fold = self._extractive_summary if self._summary_trigger() > 0 else None
+            self.store.append_message(session_id, user_id, record, settings.MAX_HISTORY_LENGTH, fold)
             
             return True
             
@@ -48,68 +56,84 @@ class MemoryService:
             print(f"添加消息失败: {e}")
             return False
     
+    async def aadd_message(self, session_id: str, user_id: Optional[str],
+                           role: str, content: str, language: Optional[str] = None) -> bool:
+        """异步添加消息到对话历史（助手回复写入后，一轮对话结束，检查是否需要更新滚动摘要）"""
+        # 进程内存储的写入不会阻塞事件循环，直接在当前协程中执行，
+        # 同时避免多线程并发修改同一会话的消息列表；SQLite/Redis的写入在线程池中执行
+        added = await self._arun(self.add_message, session_id, user_id, role, content, language)
+        if added and role == "assistant":
+            self.schedule_summary(session_id)
+        return added
+    
     def get_conversation_history(self, session_id: str, 
                                 limit: Optional[int] = None) -> List[Message]:
         """获取对话历史"""
-        if session_id not in self.conversations:
-            return []
-        
-        messages = self.conversations[session_id].messages
-        
-        if limit:
-            messages = messages[-limit:]
-        
-        return messages
+        return [self._to_message(record) for record in self.store.get_messages(session_id, limit)]
+    
+    def get_conversation(self, session_id: str) -> Optional[ConversationHistory]:
+        """获取完整对话（会话不存在时返回None）"""
+        session = self.store.get_session(session_id)
+        if session is None:
+            return None
+        return ConversationHistory(
+            session_id=session_id,
+            user_id=session["user_id"],
+            messages=self.get_conversation_history(session_id),
+            created_at=datetime.fromtimestamp(session["created_at"]),
+            updated_at=datetime.fromtimestamp(session["updated_at"])
+        )
+    
+    @staticmethod
+    def _to_message(record: MessageRecord) -> Message:
+        return Message(
+            role=record.role,
+            content=record.content,
+            timestamp=datetime.fromtimestamp(record.timestamp),
+            language=record.language
+        )
     
     def get_conversation_statistics(self, session_id: str) -> Dict[str, Any]:
-        """获取对话统计信息"""
-        if session_id not in self.conversations:
+        """获取对话统计信息（由存储增量维护的计数器读取，不遍历消息）"""
+        conv = self.store.session_stats(session_id)
+        if conv is None:
             return {}
         
-        conv = self.conversations[session_id]
-        messages = conv.messages
-        
-        # 统计信息
-        user_messages = [msg for msg in messages if msg.role == "user"]
-        assistant_messages = [msg for msg in messages if msg.role == "assistant"]
-        
-        # 语言统计
-        languages = {}
-        for msg in messages:
-            if msg.language:
-                lang = msg.language.value if hasattr(msg.language, 'value') else str(msg.language)
-                languages[lang] = languages.get(lang, 0) + 1
-        
         return {
             "session_id": session_id,
-            "user_id": conv.user_id,
-            "total_messages": len(messages),
-            "user_messages": len(user_messages),
-            "assistant_messages": len(assistant_messages),
-            "languages": languages,
-            "created_at": conv.created_at.isoformat(),
-            "updated_at": conv.updated_at.isoformat(),
-            "last_message": messages[-1].content if messages else None
+            "user_id": conv["user_id"],
+            "total_messages": conv["messages"],
+            "user_messages": conv["roles"].get("user", 0),
+            "assistant_messages": conv["roles"].get("assistant", 0),
+            "languages": conv["languages"],
+            "created_at": datetime.fromtimestamp(conv["created_at"]).isoformat(),
+            "updated_at": datetime.fromtimestamp(conv["updated_at"]).isoformat(),
+            "last_message": conv["last_message"]
         }
     
     def get_conversation_summary(self, session_id: str) -> Dict[str, Any]:
-        """获取对话内容总结（使用LLM生成）"""
-        if session_id not in self.conversations:
+        """获取对话内容总结（滚动摘要；尚未生成摘要时对当前消息做抽取式摘要）"""
+        session = self.store.get_session(session_id)
+        if session is None:
             return {}
         
-        messages = self.get_conversation_history(session_id)
-        if not messages:
-            return {"summary": "无对话内容"}
-        
         try:
-            # 生成简单总结（临时实现，后续可集成LLM）
-            summary = self._generate_simple_summary(messages)
+            messages = self.store.get_messages(session_id)
+            summary, pending = self._split_summarized(session_id, messages)
+            if summary is not None:
+                text = summary["summary"]
+            else:
+                text = self._extractive_summary("", pending) if pending else "无对话内容"
             
             return {
                 "session_id": session_id,
-                "summary": summary,
-                "conversation_length": len(messages),
-                "main_topics": self._extract_main_topics(messages)
+                "summary": text,
+                "rolling": summary is not None,
+                "summarized_until": (
+                    datetime.fromtimestamp(summary["summarized_until"]).isoformat() if summary else None
+                ),
+                "pending_messages": len(pending),
+                "conversation_length": len(messages)
             }
             
         except Exception as e:
@@ -124,159 +148,192 @@ class MemoryService:
             "context": self.get_context_for_session(session_id, max_messages=10)
         }
 
-    def _generate_simple_summary(self, messages: List[Message]) -> str:
-        """生成简单总结（临时实现）"""
-        if not messages:
-            return "无对话内容"
-        
-        user_messages = [msg.content for msg in messages if msg.role == "user"]
-        if not user_messages:
-            return "用户未发送消息"
-        
-        # 简单的关键词提取
-        keywords = []
-        for msg in user_messages:
-            if any(word in msg for word in ["价格", "多少钱", "费用"]):
-                keywords.append("价格咨询")
-            if any(word in msg for word in ["物流", "快递", "配送", "发货"]):
-                keywords.append("物流问题")
-            if any(word in msg for word in ["退货", "换货", "退款"]):
-                keywords.append("售后服务")
-            if any(word in msg for word in ["商品", "产品", "功能"]):
-                keywords.append("商品信息")
-        
-        if keywords:
-            unique_keywords = list(set(keywords))
-            return f"用户主要咨询：{', '.join(unique_keywords)}"
-        else:
-            return "一般性咨询"
+    def _split_summarized(self, session_id: str, messages: Optional[List[MessageRecord]] = None
+                          ) -> Tuple[Optional[Dict[str, Any]], List[MessageRecord]]:
+        """返回 (滚动摘要, 尚未压缩进摘要的消息)"""
+        summary = self.store.get_summary(session_id)
+        if messages is None:
+            messages = self.store.get_messages(session_id)
+        if summary is not None:
+            messages = [msg for msg in messages if msg.timestamp > summary["summarized_until"]]
+        return summary, messages
+
+    def _summary_trigger(self) -> int:
+        # 超出历史长度的消息会被环形缓冲区丢弃，阈值不能超过 MAX_HISTORY_LENGTH
+        return min(settings.SUMMARY_TRIGGER_MESSAGES, settings.MAX_HISTORY_LENGTH)
+
+    def schedule_summary(self, session_id: str) -> Optional[asyncio.Task]:
+        """在后台更新会话的滚动摘要，不阻塞当前请求；该会话已有摘要任务时跳过"""
+        if self._summary_trigger() <= 0 or session_id in self._summary_tasks:
+            return None
+        task = asyncio.create_task(self.aupdate_summary(session_id))
+        self._summary_tasks[session_id] = task
+        task.add_done_callback(lambda _: self._summary_tasks.pop(session_id, None))
+        return task
+
+    async def aupdate_summary(self, session_id: str, force: bool = False) -> bool:
+        """把较早的未总结消息压缩进滚动摘要，只保留最近 SUMMARY_KEEP_RECENT 条原文
+
+        未总结的消息少于 SUMMARY_TRIGGER_MESSAGES 条时不处理；force 时只要有可压缩的消息就处理。
+        """
+        try:
+            summary, pending = await self._arun(self._split_summarized, session_id)
+            trigger = self._summary_trigger()
+            if not force and (trigger <= 0 or len(pending) < trigger):
+                return False
+            folded = pending[:max(0, len(pending) - settings.SUMMARY_KEEP_RECENT)]
+            if not folded:
+                return False
+            
+            text = await self._asummarize(summary["summary"] if summary else "", folded)
+            await self._arun(self.store.set_summary, session_id, text, folded[-1].timestamp)
+            return True
+            
+        except Exception as e:
+            print(f"更新对话摘要失败: {e}")
+            return False
+
+    async def _asummarize(self, previous: str, messages: List[MessageRecord]) -> str:
+        """生成新的滚动摘要（LLM失败或返回空内容时使用抽取式摘要）"""
+        if self.summarizer is not None:
+            try:
+                summary = (await self.summarizer(previous, messages)).strip()
+                if summary:
+                    return truncate_to_tokens(summary, settings.SUMMARY_MAX_TOKENS)
+            except Exception as e:
+                print(f"LLM生成对话摘要失败: {e}，使用抽取式摘要")
+        return self._extractive_summary(previous, messages)
 
-    def _extract_main_topics(self, messages: List[Message]) -> List[str]:
-        """提取主要话题"""
-        topics = []
+    def _extractive_summary(self, previous: str, messages: List[MessageRecord]) -> str:
+        """抽取式摘要：已有摘要之后追加每条消息的第一句，超出 SUMMARY_MAX_TOKENS 时丢弃最早的行"""
+        lines = previous.split("\n") if previous else []
         for msg in messages:
-            if msg.role == "user":
-                content = msg.content.lower()
-                if any(word in content for word in ["价格", "多少钱"]):
-                    topics.append("价格咨询")
-                elif any(word in content for word in ["物流", "快递"]):
-                    topics.append("物流问题")
-                elif any(word in content for word in ["退货", "换货"]):
-                    topics.append("售后服务")
-                elif any(word in content for word in ["商品", "产品"]):
-                    topics.append("商品信息")
-        
-        return list(set(topics))  # 去重
+            sentence = _SENTENCE_END.split(msg.content.strip(), 1)[0].strip()
+            if sentence:
+                role = "用户" if msg.role == "user" else "助手"
+                lines.append(f"{role}: {truncate_to_tokens(sentence, _SUMMARY_SENTENCE_TOKENS)}")
+        while len(lines) > 1 and count_tokens("\n".join(lines)) > settings.SUMMARY_MAX_TOKENS:
+            lines.pop(0)
+        return truncate_to_tokens("\n".join(lines), settings.SUMMARY_MAX_TOKENS)
     
     def get_user_preferences(self, user_id: str) -> Dict[str, Any]:
         """获取用户偏好"""
-        return self.user_preferences.get(user_id, {})
+        return self.store.get_preferences(user_id)
     
     def update_user_preferences(self, user_id: str, preferences: Dict[str, Any]) -> bool:
         """更新用户偏好"""
         try:
-            if user_id not in self.user_preferences:
-                self.user_preferences[user_id] = {}
-            
-            self.user_preferences[user_id].update(preferences)
+            self.store.update_preferences(user_id, preferences)
             return True
             
         except Exception as e:
             print(f"更新用户偏好失败: {e}")
             return False
     
-    def get_context_for_session(self, session_id: str, max_messages: int = 5) -> str:
-        """获取会话上下文（用于Agent）"""
-        messages = self.get_conversation_history(session_id, limit=max_messages)
+    def get_context_for_session(self, session_id: str, max_messages: Optional[int] = None,
+                                max_tokens: Optional[int] = None) -> str:
+        """获取会话上下文（用于Agent）
+
+        由滚动摘要与尚未压缩进摘要的最近消息（最多 max_messages 条）组成，
+        总token数不超过 max_tokens（默认 MEMORY_CONTEXT_MAX_TOKENS）：摘要最多占一半预算，
+        其余预算从最新的消息开始向前放入，单条消息超出剩余预算时截断；输出保持时间顺序。
+        """
+        summary, messages = self._split_summarized(session_id)
+        if max_messages:
+            messages = messages[-max_messages:]
         
-        if not messages:
+        if not messages and summary is None:
             return ""
         
+        max_tokens = max_tokens or settings.MEMORY_CONTEXT_MAX_TOKENS
+        newline_tokens = count_tokens("\n")
+        summary_line = ""
+        if summary is not None:
+            summary_line = truncate_to_tokens(
+                f"对话摘要: {summary['summary']}", min(settings.SUMMARY_MAX_TOKENS, max_tokens // 2)
+            )
         context_parts = []
-        for msg in messages:
+        used = count_tokens(summary_line)
+        for msg in reversed(messages):
             role = "用户" if msg.role == "user" else "助手"
-            context_parts.append(f"{role}: {msg.content}")
+            line = f"{role}: {msg.content}"
+            separator = newline_tokens if context_parts or summary_line else 0
+            cost = count_tokens(line) + separator
+            if used + cost > max_tokens:
+                remaining = max_tokens - used - separator
+                if not context_parts and remaining > 0:
+                    context_parts.append(truncate_to_tokens(line, remaining))
+                break
+            context_parts.append(line)
+            used += cost
         
-        return "\n".join(context_parts)
+        return "\n".join(([summary_line] if summary_line else []) + context_parts[::-1])
     
     def clear_conversation(self, session_id: str) -> bool:
         """清空对话历史"""
         try:
-            if session_id in self.conversations:
-                del self.conversations[session_id]
+            self.store.delete_session(session_id)
             return True
         except Exception as e:
             print(f"清空对话失败: {e}")
             return False
     
     def cleanup_expired_conversations(self) -> int:
-        """清理过期的对话"""
+        """清理过期的对话（耗时与过期会话数成正比）"""
         try:
-            cutoff_time = datetime.now() - timedelta(hours=self.cleanup_interval)
-            expired_sessions = []
-            
-            for session_id, conv in self.conversations.items():
-                if conv.updated_at < cutoff_time:
-                    expired_sessions.append(session_id)
-            
-            # 删除过期对话
-            for session_id in expired_sessions:
-                del self.conversations[session_id]
-            
-            return len(expired_sessions)
+            cutoff_time = time.time() - self.cleanup_interval * 3600
+            return self.store.expire_sessions(cutoff_time)
             
         except Exception as e:
             print(f"清理过期对话失败: {e}")
             return 0
     
+    async def acleanup_expired_conversations(self) -> int:
+        """异步清理过期的对话（进程内存储在当前协程中执行，与 aadd_message 一致）"""
+        return await self._arun(self.cleanup_expired_conversations)
+    
     def get_active_sessions(self) -> List[str]:
         """获取活跃会话列表"""
-        return list(self.conversations.keys())
+        return self.store.list_sessions()
     
     def get_memory_stats(self) -> Dict[str, Any]:
-        """获取记忆统计信息"""
-        total_conversations = len(self.conversations)
-        total_users = len(set(conv.user_id for conv in self.conversations.values() if conv.user_id))
-        total_messages = sum(len(conv.messages) for conv in self.conversations.values())
+        """获取记忆统计信息（由存储增量维护的计数器读取，不遍历会话）"""
+        stats = self.store.stats()
         
         return {
-            "total_conversations": total_conversations,
-            "total_users": total_users,
-            "total_messages": total_messages,
-            "active_sessions": len(self.get_active_sessions()),
-            "user_preferences": len(self.user_preferences)
+            "backend": type(self.store).__name__,
+            "total_conversations": stats["sessions"],
+            "total_users": stats["users"],
+            "total_messages": stats["messages"],
+            "messages_by_language": stats["languages"],
+            "active_sessions": stats["sessions"],
+            "user_preferences": stats["user_preferences"],
+            "expired_sessions": self.store.expirations,
+            "evicted_sessions": self.store.evictions,
+            "memory_bytes": stats.get("memory_bytes"),
+            "max_memory_bytes": stats.get("max_memory_bytes")
         }
     
-    def _limit_conversation_length(self, session_id: str):
-        """限制对话历史长度"""
-        if session_id in self.conversations:
-            messages = self.conversations[session_id].messages
-            max_length = settings.MAX_HISTORY_LENGTH
-            
-            if len(messages) > max_length:
-                # 保留最新的消息
-                self.conversations[session_id].messages = messages[-max_length:]
-    
     def export_conversation(self, session_id: str) -> Optional[str]:
         """导出对话历史"""
-        if session_id not in self.conversations:
-            return None
-        
         try:
-            conv = self.conversations[session_id]
+            conv = self.store.get_session(session_id)
+            if conv is None:
+                return None
+            
             export_data = {
-                "session_id": conv.session_id,
-                "user_id": conv.user_id,
-                "created_at": conv.created_at.isoformat(),
-                "updated_at": conv.updated_at.isoformat(),
+                "session_id": session_id,
+                "user_id": conv["user_id"],
+                "created_at": datetime.fromtimestamp(conv["created_at"]).isoformat(),
+                "updated_at": datetime.fromtimestamp(conv["updated_at"]).isoformat(),
                 "messages": [
                     {
                         "role": msg.role,
                         "content": msg.content,
-                        "timestamp": msg.timestamp.isoformat(),
-                        "language": msg.language.value if msg.language else None
+                        "timestamp": datetime.fromtimestamp(msg.timestamp).isoformat(),
+                        "language": msg.language
                     }
-                    for msg in conv.messages
+                    for msg in self.store.get_messages(session_id)
                 ]
             }
             
@@ -286,5 +343,41 @@ class MemoryService:
             print(f"导出对话失败: {e}")
             return None
 
+    # 异步接口（供API与Agent在事件循环中调用，不阻塞其他请求）
+
+    async def aget_conversation_history(self, session_id: str, limit: Optional[int] = None) -> List[Message]:
+        return await self._arun(self.get_conversation_history, session_id, limit)
+
+    async def aget_conversation_statistics(self, session_id: str) -> Dict[str, Any]:
+        return await self._arun(self.get_conversation_statistics, session_id)
+
+    async def aget_conversation_summary(self, session_id: str) -> Dict[str, Any]:
+        return await self._arun(self.get_conversation_summary, session_id)
+
+    async def aget_conversation_insights(self, session_id: str) -> Dict[str, Any]:
+        return await self._arun(self.get_conversation_insights, session_id)
+
+    async def aget_context_for_session(self, session_id: str, max_messages: Optional[int] = None,
+                                       max_tokens: Optional[int] = None) -> str:
+        return await self._arun(self.get_context_for_session, session_id, max_messages, max_tokens)
+
+    async def aget_user_preferences(self, user_id: str) -> Dict[str, Any]:
+        return await self._arun(self.get_user_preferences, user_id)
+
+    async def aupdate_user_preferences(self, user_id: str, preferences: Dict[str, Any]) -> bool:
+        return await self._arun(self.update_user_preferences, user_id, preferences)
+
+    async def aclear_conversation(self, session_id: str) -> bool:
+        return await self._arun(self.clear_conversation, session_id)
+
+    async def aget_active_sessions(self) -> List[str]:
+        return await self._arun(self.get_active_sessions)
+
+    async def aget_memory_stats(self) -> Dict[str, Any]:
+        return await self._arun(self.get_memory_stats)
+
+    async def aexport_conversation(self, session_id: str) -> Optional[str]:
+        return await self._arun(self.export_conversation, session_id)
+
 # 创建全局记忆服务实例
 memory_service = MemoryService() 
\ No newline at end of file
@@ -0,0 +1,851 @@
+from typing import List, Dict, Any, Optional, Tuple, Callable
+from collections import OrderedDict, deque
+import heapq
+import itertools
+import json
+import os
+import sqlite3
+import sys
+import threading
+from ..config import settings
+
+class MessageRecord:
+    """一条消息的紧凑记录（pydantic模型只在API边界由记录构建）"""
+
+    __slots__ = ("role", "content", "timestamp", "language")
+
+    def __init__(self, role: str, content: str, timestamp: float, language: Optional[str] = None):
+        self.role = role
+        self.content = content
+        self.timestamp = timestamp
+        self.language = language
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"role": self.role, "content": self.content, "timestamp": self.timestamp, "language": self.language}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "MessageRecord":
+        return cls(data["role"], data["content"], data["timestamp"], data.get("language"))
+
+# 压缩函数: (已有摘要, 被丢弃且尚未压缩进摘要的消息) -> 新摘要
+Folder = Callable[[str, List[MessageRecord]], str]
+
+def _counter_names(role: str, language: Optional[str]) -> List[str]:
+    """消息计入的计数器: role:<角色>、lang:<语言>（无语言时不计）"""
+    return [f"role:{role}", f"lang:{language}"] if language else [f"role:{role}"]
+
+def _prefixed(counters: Dict[str, int], prefix: str) -> Dict[str, int]:
+    return {name[len(prefix):]: int(count) for name, count in counters.items() if name.startswith(prefix) and int(count)}
+
+class MemoryStore:
+    """对话记忆存储后端接口
+
+    消息保存为 MessageRecord（timestamp 为Unix秒，language 为str或None），
+    会话信息: {session_id, user_id, created_at, updated_at}。
+    追加消息只写入一条记录（不重写整个会话），并在同一次操作中丢弃超出 max_length 的最旧消息，
+    返回实际丢弃的消息；传入 fold 时，丢弃的消息中尚未压缩进摘要的部分也在同一次操作中压缩进滚动摘要。
+    全局与每个会话的统计由计数器随写入、裁剪和删除增量维护，读取统计不扫描会话或消息；
+    统计的是当前保存的消息（环形缓冲区丢弃的消息不再计入），用户按会话引用计数。
+    会话的 user_id 在创建时确定。
+    """
+
+    # 读写是否会阻塞（需要在线程池中执行）
+    blocking = True
+
+    def __init__(self):
+        # 本进程中因过期（TTL）与容量上限（LRU）删除的会话数
+        self.expirations = 0
+        self.evictions = 0
+
+    def append_message(self, session_id: str, user_id: Optional[str], record: MessageRecord, max_length: int,
+                       fold: Optional[Folder] = None) -> List[MessageRecord]:
+        raise NotImplementedError
+
+    @staticmethod
+    def _fold(summary: Optional[str], summarized_until: float, dropped: List[MessageRecord],
+              fold: Optional[Folder]) -> Optional[Tuple[str, float]]:
+        """丢弃的消息压缩后的 (新摘要, summarized_until)；没有尚未压缩的消息时返回None"""
+        pending = [msg for msg in dropped if summary is None or msg.timestamp > summarized_until]
+        if fold is None or not pending:
+            return None
+        return fold(summary or "", pending), pending[-1].timestamp
+
+    def get_messages(self, session_id: str, limit: Optional[int] = None) -> List[MessageRecord]:
+        raise NotImplementedError
+
+    def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def session_stats(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """会话统计: 会话信息及 {messages, roles, languages, last_message}，会话不存在时返回None"""
+        raise NotImplementedError
+
+    def get_summary(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """会话的滚动摘要 {summary, summarized_until}，没有摘要时返回None
+
+        summarized_until 为已压缩进摘要的最后一条消息的时间戳，之后的消息尚未总结。
+        """
+        raise NotImplementedError
+
+    def set_summary(self, session_id: str, summary: str, summarized_until: float):
+        """保存滚动摘要；会话不存在或已有覆盖更新消息的摘要时不写入"""
+        raise NotImplementedError
+
+    def delete_session(self, session_id: str) -> bool:
+        raise NotImplementedError
+
+    def list_sessions(self) -> List[str]:
+        raise NotImplementedError
+
+    def expire_sessions(self, cutoff: float) -> int:
+        """删除最后更新时间早于 cutoff 的会话，返回删除数；耗时与过期会话数成正比"""
+        raise NotImplementedError
+
+    def get_preferences(self, user_id: str) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def update_preferences(self, user_id: str, preferences: Dict[str, Any]):
+        """合并更新用户偏好（只写入变化的键）"""
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        """返回 {sessions, users, messages, languages, user_preferences}（进程内存储另有 memory_bytes、max_memory_bytes）"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+class _Session:
+    """进程内会话：消息保存在 deque(maxlen) 环形缓冲区中，写满后追加时原地丢弃最旧的消息"""
+
+    __slots__ = ("user_id", "created_at", "updated_at", "messages", "roles", "languages",
+                 "summary", "summarized_until", "size", "expiry_seq")
+
+    def __init__(self, user_id: Optional[str], created_at: float, max_length: int):
+        self.user_id = user_id
+        self.created_at = created_at
+        self.updated_at = created_at
+        self.messages: deque = deque(maxlen=max_length)
+        # 当前消息按角色与语言的计数（计数归零的键保留，读取时过滤）
+        self.roles: Dict[str, int] = {}
+        self.languages: Dict[str, int] = {}
+        # 滚动摘要及其覆盖到的最后一条消息的时间戳
+        self.summary: Optional[str] = None
+        self.summarized_until = 0.0
+        # 估算的内存占用（字节）与过期堆中当前有效条目的序号
+        self.size = 0
+        self.expiry_seq = -1
+
+# 内存占用估算：消息文本之外，每条消息与每个会话的固定开销
+_MESSAGE_OVERHEAD = sys.getsizeof(MessageRecord("", "", 0.0)) + sys.getsizeof(0.0) + 8
+_SESSION_OVERHEAD = sys.getsizeof(_Session(None, 0.0, 1)) + sys.getsizeof(deque(maxlen=1)) + 128
+
+def _message_size(record: MessageRecord) -> int:
+    return sys.getsizeof(record.content) + _MESSAGE_OVERHEAD
+
+class InMemoryStore(MemoryStore):
+    """进程内存储（多进程部署时各进程互不可见，重启后丢失）
+
+    - 会话按最近使用顺序保存（OrderedDict），估算的内存占用超过 max_bytes 时淘汰最久未使用的整个会话
+    - 过期时间保存在最小堆中，每个会话一个条目：清理时只弹出已到期的条目，
+      到期条目对应的会话之后又有更新时按新的时间重新入堆，已删除的会话的条目直接丢弃
+    - 计数器: 消息总数、各语言消息数、各用户的会话数（引用计数，归零时删除）
+    """
+
+    blocking = False
+
+    def __init__(self, max_bytes: Optional[int] = None):
+        super().__init__()
+        self.sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self.preferences: Dict[str, Dict[str, Any]] = {}
+        self.max_bytes = max_bytes if max_bytes is not None else settings.MEMORY_MAX_BYTES
+        self.memory_bytes = 0
+        self.message_count = 0
+        self.language_counts: Dict[str, int] = {}
+        self.user_sessions: Dict[str, int] = {}
+        self._expiry: List[Tuple[float, int, str]] = []
+        self._expiry_seq = itertools.count()
+
+    def _schedule_expiry(self, session_id: str, session: _Session):
+        session.expiry_seq = next(self._expiry_seq)
+        heapq.heappush(self._expiry, (session.updated_at, session.expiry_seq, session_id))
+
+    def _count(self, session: _Session, record: MessageRecord, delta: int):
+        # 每次追加都会执行：直接按角色/语言计数，不拼接计数器名
+        roles = session.roles
+        roles[record.role] = roles.get(record.role, 0) + delta
+        language = record.language
+        if language:
+            languages = session.languages
+            languages[language] = languages.get(language, 0) + delta
+            self.language_counts[language] = self.language_counts.get(language, 0) + delta
+        self.message_count += delta
+
+    def _remove(self, session_id: str) -> bool:
+        session = self.sessions.pop(session_id, None)
+        if session is None:
+            return False
+        self.memory_bytes -= session.size
+        self.message_count -= len(session.messages)
+        for language, count in session.languages.items():
+            self.language_counts[language] -= count
+        if session.user_id:
+            self.user_sessions[session.user_id] -= 1
+            if not self.user_sessions[session.user_id]:
+                del self.user_sessions[session.user_id]
+        return True
+
+    def append_message(self, session_id: str, user_id: Optional[str], record: MessageRecord, max_length: int,
+                       fold: Optional[Folder] = None) -> List[MessageRecord]:
+        dropped: List[MessageRecord] = []
+        session = self.sessions.get(session_id)
+        if session is None:
+            session = self.sessions[session_id] = _Session(user_id, record.timestamp, max_length)
+            session.size = _SESSION_OVERHEAD + sys.getsizeof(session_id)
+            self.memory_bytes += session.size
+            if user_id:
+                self.user_sessions[user_id] = self.user_sessions.get(user_id, 0) + 1
+            self._schedule_expiry(session_id, session)
+        else:
+            self.sessions.move_to_end(session_id)
+            if session.messages.maxlen != max_length:
+                # 历史长度配置变化时重建缓冲区
+                dropped = list(itertools.islice(session.messages, 0, max(0, len(session.messages) - max_length)))
+                for old in dropped:
+                    self._count(session, old, -1)
+                    session.size -= _message_size(old)
+                    self.memory_bytes -= _message_size(old)
+                session.messages = deque(session.messages, maxlen=max_length)
+        messages = session.messages
+        size = _message_size(record)
+        if len(messages) == messages.maxlen:
+            # 环形缓冲区写满，追加时丢弃最旧的消息
+            dropped.append(messages[0])
+            size -= _message_size(messages[0])
+            self._count(session, messages[0], -1)
+        messages.append(record)
+        self._count(session, record, 1)
+        session.updated_at = record.timestamp
+        session.size += size
+        self.memory_bytes += size
+        folded = self._fold(session.summary, session.summarized_until, dropped, fold)
+        if folded is not None:
+            self.set_summary(session_id, *folded)
+
+        # 超过内存上限时淘汰最久未使用的会话（不淘汰正在写入的会话）
+        while self.max_bytes and self.memory_bytes > self.max_bytes and len(self.sessions) > 1:
+            self._remove(next(iter(self.sessions)))
+            self.evictions += 1
+        return dropped
+
+    def get_messages(self, session_id: str, limit: Optional[int] = None) -> List[MessageRecord]:
+        session = self.sessions.get(session_id)
+        if session is None:
+            return []
+        self.sessions.move_to_end(session_id)
+        messages = session.messages
+        if limit and limit < len(messages):
+            return [messages[i] for i in range(len(messages) - limit, len(messages))]
+        return list(messages)
+
+    def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        session = self.sessions.get(session_id)
+        if session is None:
+            return None
+        return {
+            "session_id": session_id, "user_id": session.user_id,
+            "created_at": session.created_at, "updated_at": session.updated_at
+        }
+
+    def session_stats(self, session_id: str) -> Optional[Dict[str, Any]]:
+        session = self.sessions.get(session_id)
+        if session is None:
+            return None
+        return {
+            **self.get_session(session_id),
+            "messages": len(session.messages),
+            "roles": _prefixed(session.roles, ""),
+            "languages": _prefixed(session.languages, ""),
+            "last_message": session.messages[-1].content if session.messages else None
+        }
+
+    def get_summary(self, session_id: str) -> Optional[Dict[str, Any]]:
+        session = self.sessions.get(session_id)
+        if session is None or session.summary is None:
+            return None
+        return {"summary": session.summary, "summarized_until": session.summarized_until}
+
+    def set_summary(self, session_id: str, summary: str, summarized_until: float):
+        session = self.sessions.get(session_id)
+        if session is None or (session.summary is not None and session.summarized_until >= summarized_until):
+            return
+        size = sys.getsizeof(summary) - (sys.getsizeof(session.summary) if session.summary is not None else 0)
+        session.summary = summary
+        session.summarized_until = summarized_until
+        session.size += size
+        self.memory_bytes += size
+
+    def delete_session(self, session_id: str) -> bool:
+        return self._remove(session_id)
+
+    def list_sessions(self) -> List[str]:
+        return list(self.sessions)
+
+    def expire_sessions(self, cutoff: float) -> int:
+        expired = 0
+        while self._expiry and self._expiry[0][0] < cutoff:
+            _, seq, session_id = heapq.heappop(self._expiry)
+            session = self.sessions.get(session_id)
+            if session is None or session.expiry_seq != seq:
+                # 会话已删除（或删除后重新创建，有新的条目）
+                continue
+            if session.updated_at >= cutoff:
+                self._schedule_expiry(session_id, session)
+                continue
+            self._remove(session_id)
+            expired += 1
+        self.expirations += expired
+        return expired
+
+    def get_preferences(self, user_id: str) -> Dict[str, Any]:
+        return dict(self.preferences.get(user_id, {}))
+
+    def update_preferences(self, user_id: str, preferences: Dict[str, Any]):
+        self.preferences.setdefault(user_id, {}).update(preferences)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sessions": len(self.sessions),
+            "users": len(self.user_sessions),
+            "messages": self.message_count,
+            "languages": _prefixed(self.language_counts, ""),
+            "user_preferences": len(self.preferences),
+            "memory_bytes": self.memory_bytes,
+            "max_memory_bytes": self.max_bytes
+        }
+
+class SQLiteMemoryStore(MemoryStore):
+    """SQLite存储（WAL模式，同一主机上的多个worker进程共享）
+
+    - sessions:         每个会话一行，message_count 随追加递增，裁剪时不需要统计消息数
+    - messages:         每条消息一行，按 (session_id, id) 索引，超出长度时在同一事务中按id删除最旧的消息
+    - session_counters: 每个会话按 role:<角色> / lang:<语言> 的消息数
+    - counters:         全局计数（sessions、messages、users、user_preferences、lang:<语言>）
+    - user_sessions:    每个用户的会话数（引用计数，归零时删除并减少 users）
+    - summaries:        每个会话的滚动摘要
+    - preferences:      每个 (user_id, key) 一行，值为JSON
+    计数器与数据在同一事务中更新，多个worker进程看到一致的统计。
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        super().__init__()
+        self.db_path = db_path or settings.MEMORY_SQLITE_PATH
+
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # 连接在事件循环与线程池之间共享，用锁串行化；其他进程的写入由SQLite文件锁协调
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                user_id TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                message_count INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS idx_sessions_updated ON sessions(updated_at);
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                timestamp REAL NOT NULL,
+                language TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_messages_session ON messages(session_id, id);
+            CREATE TABLE IF NOT EXISTS session_counters (
+                session_id TEXT NOT NULL,
+                name TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (session_id, name)
+            );
+            CREATE TABLE IF NOT EXISTS counters (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS user_sessions (
+                user_id TEXT PRIMARY KEY,
+                sessions INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS summaries (
+                session_id TEXT PRIMARY KEY,
+                summary TEXT NOT NULL,
+                summarized_until REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS preferences (
+                user_id TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                PRIMARY KEY (user_id, key)
+            );
+        """)
+        self._conn.commit()
+        with self._lock, self._conn:
+            # 先取得写锁再检查：多个worker同时启动时只有一个重建计数器，其余看到已重建的结果
+            self._conn.execute("BEGIN IMMEDIATE")
+            if self._conn.execute("SELECT COUNT(*) FROM counters").fetchone()[0] == 0:
+                self._rebuild_counters()
+
+    def _rebuild_counters(self):
+        """由数据重建所有计数器（新建数据库或由没有计数器的旧版本升级时执行一次）"""
+        self._conn.execute("DELETE FROM session_counters")
+        self._conn.execute("DELETE FROM user_sessions")
+        self._conn.execute("""
+            INSERT INTO session_counters (session_id, name, count)
+            SELECT session_id, 'role:' || role, COUNT(*) FROM messages GROUP BY session_id, role
+            UNION ALL
+            SELECT session_id, 'lang:' || language, COUNT(*) FROM messages WHERE language IS NOT NULL GROUP BY session_id, language
+        """)
+        self._conn.execute("""
+            INSERT INTO user_sessions (user_id, sessions)
+            SELECT user_id, COUNT(*) FROM sessions WHERE user_id IS NOT NULL GROUP BY user_id
+        """)
+        self._conn.execute("""
+            INSERT INTO counters (name, value)
+            SELECT 'sessions', COUNT(*) FROM sessions
+            UNION ALL SELECT 'messages', COUNT(*) FROM messages
+            UNION ALL SELECT 'users', COUNT(*) FROM user_sessions
+            UNION ALL SELECT 'user_preferences', COUNT(DISTINCT user_id) FROM preferences
+            UNION ALL SELECT 'lang:' || language, COUNT(*) FROM messages WHERE language IS NOT NULL GROUP BY language
+        """)
+
+    def _bump(self, name: str, delta: int):
+        self._conn.execute(
+            "INSERT INTO counters (name, value) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (name, delta)
+        )
+
+    def _count(self, session_id: str, role: str, language: Optional[str], delta: int):
+        for name in _counter_names(role, language):
+            self._conn.execute(
+                """INSERT INTO session_counters (session_id, name, count) VALUES (?, ?, ?)
+                   ON CONFLICT(session_id, name) DO UPDATE SET count = count + excluded.count""",
+                (session_id, name, delta)
+            )
+        if language:
+            self._bump(f"lang:{language}", delta)
+        self._bump("messages", delta)
+
+    def _add_user_session(self, user_id: str, delta: int):
+        self._conn.execute(
+            """INSERT INTO user_sessions (user_id, sessions) VALUES (?, ?)
+               ON CONFLICT(user_id) DO UPDATE SET sessions = sessions + excluded.sessions""",
+            (user_id, delta)
+        )
+        sessions = self._conn.execute("SELECT sessions FROM user_sessions WHERE user_id = ?", (user_id,)).fetchone()[0]
+        if sessions == 0:
+            self._conn.execute("DELETE FROM user_sessions WHERE user_id = ?", (user_id,))
+            self._bump("users", -1)
+        elif sessions == delta:
+            self._bump("users", 1)
+
+    def _delete_session(self, session_id: str, user_id: Optional[str], message_count: int):
+        for name, count in self._conn.execute(
+            "SELECT name, count FROM session_counters WHERE session_id = ? AND name LIKE 'lang:%'", (session_id,)
+        ).fetchall():
+            self._bump(name, -count)
+        self._bump("messages", -message_count)
+        self._bump("sessions", -1)
+        if user_id:
+            self._add_user_session(user_id, -1)
+        self._conn.execute("DELETE FROM session_counters WHERE session_id = ?", (session_id,))
+        self._conn.execute("DELETE FROM summaries WHERE session_id = ?", (session_id,))
+        self._conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+        self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def append_message(self, session_id: str, user_id: Optional[str], record: MessageRecord, max_length: int,
+                       fold: Optional[Folder] = None) -> List[MessageRecord]:
+        dropped: List[MessageRecord] = []
+        with self._lock, self._conn:
+            created = self._conn.execute(
+                """INSERT OR IGNORE INTO sessions (session_id, user_id, created_at, updated_at, message_count)
+                   VALUES (?, ?, ?, ?, 0)""",
+                (session_id, user_id, record.timestamp, record.timestamp)
+            ).rowcount
+            if created:
+                self._bump("sessions", 1)
+                if user_id:
+                    self._add_user_session(user_id, 1)
+            self._conn.execute(
+                "UPDATE sessions SET updated_at = ?, message_count = message_count + 1 WHERE session_id = ?",
+                (record.timestamp, session_id)
+            )
+            self._conn.execute(
+                "INSERT INTO messages (session_id, role, content, timestamp, language) VALUES (?, ?, ?, ?, ?)",
+                (session_id, record.role, record.content, record.timestamp, record.language)
+            )
+            self._count(session_id, record.role, record.language, 1)
+            message_count = self._conn.execute(
+                "SELECT message_count FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()[0]
+            if message_count > max_length:
+                rows = self._conn.execute(
+                    "SELECT id, role, content, timestamp, language FROM messages WHERE session_id = ? ORDER BY id LIMIT ?",
+                    (session_id, message_count - max_length)
+                ).fetchall()
+                self._conn.executemany("DELETE FROM messages WHERE id = ?", [(row[0],) for row in rows])
+                dropped = [MessageRecord(*row[1:]) for row in rows]
+                for old in dropped:
+                    self._count(session_id, old.role, old.language, -1)
+                self._conn.execute("UPDATE sessions SET message_count = ? WHERE session_id = ?", (max_length, session_id))
+                if fold is not None:
+                    summary = self._conn.execute(
+                        "SELECT summary, summarized_until FROM summaries WHERE session_id = ?", (session_id,)
+                    ).fetchone() or (None, 0.0)
+                    folded = self._fold(*summary, dropped, fold)
+                    if folded is not None:
+                        self._set_summary(session_id, *folded)
+        return dropped
+
+    def get_messages(self, session_id: str, limit: Optional[int] = None) -> List[MessageRecord]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT role, content, timestamp, language FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT ?",
+                (session_id, limit or -1)
+            ).fetchall()
+        return [MessageRecord(*row) for row in reversed(rows)]
+
+    def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT user_id, created_at, updated_at FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"session_id": session_id, "user_id": row[0], "created_at": row[1], "updated_at": row[2]}
+
+    def session_stats(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT user_id, created_at, updated_at, message_count FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            counters = dict(self._conn.execute(
+                "SELECT name, count FROM session_counters WHERE session_id = ?", (session_id,)
+            ).fetchall())
+            last = self._conn.execute(
+                "SELECT content FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT 1", (session_id,)
+            ).fetchone()
+        return {
+            "session_id": session_id, "user_id": row[0], "created_at": row[1], "updated_at": row[2],
+            "messages": row[3],
+            "roles": _prefixed(counters, "role:"),
+            "languages": _prefixed(counters, "lang:"),
+            "last_message": last[0] if last else None
+        }
+
+    def get_summary(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT summary, summarized_until FROM summaries WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"summary": row[0], "summarized_until": row[1]}
+
+    def _set_summary(self, session_id: str, summary: str, summarized_until: float):
+        self._conn.execute(
+            """INSERT INTO summaries (session_id, summary, summarized_until)
+               SELECT ?, ?, ? WHERE EXISTS (SELECT 1 FROM sessions WHERE session_id = ?)
+               ON CONFLICT(session_id) DO UPDATE SET
+                   summary = excluded.summary, summarized_until = excluded.summarized_until
+               WHERE excluded.summarized_until > summaries.summarized_until""",
+            (session_id, summary, summarized_until, session_id)
+        )
+
+    def set_summary(self, session_id: str, summary: str, summarized_until: float):
+        with self._lock, self._conn:
+            self._set_summary(session_id, summary, summarized_until)
+
+    def delete_session(self, session_id: str) -> bool:
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT user_id, message_count FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if row is None:
+                return False
+            self._delete_session(session_id, *row)
+            return True
+
+    def list_sessions(self) -> List[str]:
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT session_id FROM sessions")]
+
+    def expire_sessions(self, cutoff: float) -> int:
+        # 按 updated_at 索引只访问过期的会话
+        with self._lock, self._conn:
+            expired = self._conn.execute(
+                "SELECT session_id, user_id, message_count FROM sessions WHERE updated_at < ?", (cutoff,)
+            ).fetchall()
+            for row in expired:
+                self._delete_session(*row)
+        self.expirations += len(expired)
+        return len(expired)
+
+    def get_preferences(self, user_id: str) -> Dict[str, Any]:
+        with self._lock:
+            rows = self._conn.execute("SELECT key, value FROM preferences WHERE user_id = ?", (user_id,)).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def update_preferences(self, user_id: str, preferences: Dict[str, Any]):
+        if not preferences:
+            return
+        with self._lock, self._conn:
+            if self._conn.execute("SELECT 1 FROM preferences WHERE user_id = ? LIMIT 1", (user_id,)).fetchone() is None:
+                self._bump("user_preferences", 1)
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO preferences (user_id, key, value) VALUES (?, ?, ?)",
+                [(user_id, key, json.dumps(value, ensure_ascii=False)) for key, value in preferences.items()]
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self._conn.execute("SELECT name, value FROM counters").fetchall())
+        return {
+            "sessions": counters.get("sessions", 0),
+            "users": counters.get("users", 0),
+            "messages": counters.get("messages", 0),
+            "languages": _prefixed(counters, "lang:"),
+            "user_preferences": counters.get("user_preferences", 0)
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class RedisMemoryStore(MemoryStore):
+    """Redis存储（多主机部署共享）
+
+    - {prefix}session:{id}     会话信息与计数（hash: created_at、updated_at、user_id、messages、role:*、lang:*，
+                               以及滚动摘要 summary、summarized_until）
+    - {prefix}messages:{id}    消息列表（list，每条消息一个JSON，RPUSH追加后LTRIM保留最新的消息）
+    - {prefix}sessions         会话按最后更新时间排序（sorted set），用于查找过期会话
+    - {prefix}stats            全局计数（hash: sessions、messages、lang:*）
+    - {prefix}user_sessions    每个用户的会话数（hash，归零时删除；HLEN即用户数）
+    - {prefix}prefs:{user}     用户偏好（hash，每个键一个JSON值）
+    - {prefix}pref_users       有偏好的用户（set）
+    追加消息在 WATCH/MULTI/EXEC 事务中执行：读取将被丢弃的消息后，追加、裁剪与计数调整一起提交，
+    多个worker并发追加同一会话时不会重复或遗漏计数调整。
+    """
+
+    def __init__(self, url: Optional[str] = None, prefix: Optional[str] = None, client=None):
+        if client is None:
+            import redis
+            # RESP2 兼容不支持 HELLO 的旧版本服务端
+            client = redis.Redis.from_url(url or settings.REDIS_URL, decode_responses=True, protocol=2)
+        super().__init__()
+        self.client = client
+        self.prefix = prefix if prefix is not None else settings.MEMORY_REDIS_PREFIX
+
+    def _key(self, kind: str, name: str = "") -> str:
+        return f"{self.prefix}{kind}:{name}" if name else f"{self.prefix}{kind}"
+
+    def _count(self, pipe, session_key: str, role: str, language: Optional[str], delta: int):
+        for name in _counter_names(role, language):
+            pipe.hincrby(session_key, name, delta)
+        pipe.hincrby(session_key, "messages", delta)
+        if language:
+            pipe.hincrby(self._key("stats"), f"lang:{language}", delta)
+        pipe.hincrby(self._key("stats"), "messages", delta)
+
+    def append_message(self, session_id: str, user_id: Optional[str], record: MessageRecord, max_length: int,
+                       fold: Optional[Folder] = None) -> List[MessageRecord]:
+        from redis.exceptions import WatchError
+
+        session_key = self._key("session", session_id)
+        messages_key = self._key("messages", session_id)
+        value = json.dumps(record.to_dict(), ensure_ascii=False)
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    # WATCH 后读取本次追加会被LTRIM丢弃的最旧消息（未写满时为空）、会话是否存在与滚动摘要；
+                    # 其他worker在提交前修改了该会话时EXEC失败并重试，丢弃的消息与计数调整总是对应同一个列表状态
+                    pipe.watch(messages_key, session_key)
+                    dropped = [MessageRecord.from_dict(json.loads(old)) for old in pipe.lrange(messages_key, 0, -max_length)]
+                    created = not pipe.hexists(session_key, "created_at")
+                    folded = None
+                    if dropped and fold is not None:
+                        summary, summarized_until = pipe.hmget(session_key, "summary", "summarized_until")
+                        folded = self._fold(summary, float(summarized_until or 0), dropped, fold)
+                    pipe.multi()
+                    pipe.rpush(messages_key, value)
+                    pipe.ltrim(messages_key, -max_length, -1)
+                    if created:
+                        pipe.hset(session_key, "created_at", record.timestamp)
+                        pipe.hincrby(self._key("stats"), "sessions", 1)
+                        if user_id:
+                            pipe.hset(session_key, "user_id", user_id)
+                            pipe.hincrby(self._key("user_sessions"), user_id, 1)
+                    pipe.hset(session_key, "updated_at", record.timestamp)
+                    pipe.zadd(self._key("sessions"), {session_id: record.timestamp})
+                    self._count(pipe, session_key, record.role, record.language, 1)
+                    for old in dropped:
+                        self._count(pipe, session_key, old.role, old.language, -1)
+                    if folded is not None:
+                        pipe.hset(session_key, mapping={"summary": folded[0], "summarized_until": folded[1]})
+                    pipe.execute()
+                    return dropped
+                except WatchError:
+                    continue
+
+    def get_messages(self, session_id: str, limit: Optional[int] = None) -> List[MessageRecord]:
+        values = self.client.lrange(self._key("messages", session_id), -limit if limit else 0, -1)
+        return [MessageRecord.from_dict(json.loads(value)) for value in values]
+
+    @staticmethod
+    def _session_info(session_id: str, session: Dict[str, str]) -> Dict[str, Any]:
+        return {
+            "session_id": session_id,
+            "user_id": session.get("user_id"),
+            "created_at": float(session["created_at"]),
+            "updated_at": float(session["updated_at"])
+        }
+
+    def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        session = self.client.hgetall(self._key("session", session_id))
+        if not session:
+            return None
+        return self._session_info(session_id, session)
+
+    def session_stats(self, session_id: str) -> Optional[Dict[str, Any]]:
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hgetall(self._key("session", session_id))
+        pipe.lindex(self._key("messages", session_id), -1)
+        session, last = pipe.execute()
+        if not session:
+            return None
+        return {
+            **self._session_info(session_id, session),
+            "messages": int(session.get("messages", 0)),
+            "roles": _prefixed(session, "role:"),
+            "languages": _prefixed(session, "lang:"),
+            "last_message": json.loads(last)["content"] if last else None
+        }
+
+    def get_summary(self, session_id: str) -> Optional[Dict[str, Any]]:
+        summary, summarized_until = self.client.hmget(self._key("session", session_id), "summary", "summarized_until")
+        if summary is None:
+            return None
+        return {"summary": summary, "summarized_until": float(summarized_until)}
+
+    def set_summary(self, session_id: str, summary: str, summarized_until: float):
+        session_key = self._key("session", session_id)
+        created_at, current = self.client.hmget(session_key, "created_at", "summarized_until")
+        if created_at is None or (current is not None and float(current) >= summarized_until):
+            return
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hset(session_key, mapping={"summary": summary, "summarized_until": summarized_until})
+        pipe.hexists(session_key, "created_at")
+        if not pipe.execute()[1]:
+            # 写入前会话被其他worker删除：不留下只有摘要的会话
+            self.client.delete(session_key)
+
+    def _delete_sessions(self, session_ids: List[str]) -> int:
+        """删除会话并减少计数；多个worker同时删除时只由从有序集合中删除成功的一方减少计数"""
+        pipe = self.client.pipeline(transaction=False)
+        for session_id in session_ids:
+            pipe.zrem(self._key("sessions"), session_id)
+        owned = [session_id for session_id, removed in zip(session_ids, pipe.execute()) if int(removed)]
+        if not owned:
+            return 0
+
+        pipe = self.client.pipeline(transaction=False)
+        for session_id in owned:
+            pipe.hgetall(self._key("session", session_id))
+            pipe.delete(self._key("session", session_id), self._key("messages", session_id))
+        sessions = pipe.execute()[0::2]
+
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hincrby(self._key("stats"), "sessions", -len(owned))
+        for session in sessions:
+            pipe.hincrby(self._key("stats"), "messages", -int(session.get("messages", 0)))
+            for language, count in _prefixed(session, "lang:").items():
+                pipe.hincrby(self._key("stats"), f"lang:{language}", -count)
+        # 用户会话数的减少放在最后，按位置取回减少后的值
+        users = [session["user_id"] for session in sessions if session.get("user_id")]
+        for user_id in users:
+            pipe.hincrby(self._key("user_sessions"), user_id, -1)
+        results = pipe.execute()
+        remaining = results[len(results) - len(users):]
+        empty = [user_id for user_id, count in zip(users, remaining) if int(count) <= 0]
+        if empty:
+            self.client.hdel(self._key("user_sessions"), *empty)
+        return len(owned)
+
+    def delete_session(self, session_id: str) -> bool:
+        return self._delete_sessions([session_id]) > 0
+
+    def list_sessions(self) -> List[str]:
+        return list(self.client.zrange(self._key("sessions"), 0, -1))
+
+    def expire_sessions(self, cutoff: float) -> int:
+        session_ids = self.client.zrangebyscore(self._key("sessions"), "-inf", f"({cutoff}")
+        if not session_ids:
+            return 0
+        expired = self._delete_sessions(list(session_ids))
+        self.expirations += expired
+        return expired
+
+    def get_preferences(self, user_id: str) -> Dict[str, Any]:
+        values = self.client.hgetall(self._key("prefs", user_id))
+        return {key: json.loads(value) for key, value in values.items()}
+
+    def update_preferences(self, user_id: str, preferences: Dict[str, Any]):
+        if not preferences:
+            return
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hset(self._key("prefs", user_id), mapping={
+            key: json.dumps(value, ensure_ascii=False) for key, value in preferences.items()
+        })
+        pipe.sadd(self._key("pref_users"), user_id)
+        pipe.execute()
+
+    def stats(self) -> Dict[str, Any]:
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hgetall(self._key("stats"))
+        pipe.hlen(self._key("user_sessions"))
+        pipe.scard(self._key("pref_users"))
+        counters, users, user_preferences = pipe.execute()
+        return {
+            "sessions": int(counters.get("sessions", 0)),
+            "users": int(users),
+            "messages": int(counters.get("messages", 0)),
+            "languages": _prefixed(counters, "lang:"),
+            "user_preferences": int(user_preferences)
+        }
+
+    def close(self):
+        self.client.close()
+
+def create_memory_store(backend: Optional[str] = None) -> MemoryStore:
+    """根据配置创建记忆存储，持久化后端不可用时回退到进程内存储"""
+    backend = backend or settings.MEMORY_BACKEND
+    try:
+        if backend == "sqlite":
+            return SQLiteMemoryStore()
+        if backend == "redis":
+            store = RedisMemoryStore()
+            store.client.ping()
+            return store
+    except Exception as e:
+        print(f"初始化记忆存储 {backend} 失败: {e}，使用进程内存储")
+        return InMemoryStore()
+    if backend != "memory":
+        print(f"不支持的记忆存储后端: {backend}，使用进程内存储")
+    return InMemoryStore()
@@ -1,81 +1,192 @@
-import chromadb
-from chromadb.config import Settings
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings
-from langchain_community.embeddings import OllamaEmbeddings
 from langchain_community.vectorstores import Chroma
 from langchain.schema import Document
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable, Iterable
 import json
 import os
 import time
+import asyncio
+import threading
+from contextlib import contextmanager
 from ..config import settings
 from ..models.knowledge import KnowledgeItem, SearchResult, SearchRequest, SearchResponse
+from .embedding_service import EmbeddingBackend, create_embedding_backend
+from .keyword_index import BM25Index, reciprocal_rank_fusion
+from .reranker import Reranker, create_reranker
+from .context_assembler import ContextAssembler
+from .language_service import language_service
+from .vector_store import VectorStore, CollectionAlias, create_vector_store
+from ..utils.cache import TTLCache
+from ..utils.helpers import normalize_query
+from ..utils.chunking import create_text_splitter, item_content_hash, build_chunks
 
 class RAGService:
     """RAG检索增强服务"""
     
-    def __init__(self):
-        # 根据配置选择embedding模型
-        if settings.USE_OLLAMA_EMBEDDING:
-            self.embeddings = OllamaEmbeddings(
-                model=settings.OLLAMA_EMBEDDING_MODEL,
-                base_url=settings.OLLAMA_BASE_URL
-            )
-        else:
-            self.embeddings = OpenAIEmbeddings(
-                openai_api_key=settings.OPENAI_API_KEY,
-                openai_api_base=settings.OPENAI_BASE_URL,
-                model=settings.OPENAI_EMBEDDING_MODEL
-            )
+    def __init__(self, embedding_backend: Optional[EmbeddingBackend] = None,
+                 persist_directory: Optional[str] = None,
+                 collection_name: Optional[str] = None,
+                 vector_store: Optional[VectorStore] = None,
+                 vector_store_factory: Optional[Callable[[str], VectorStore]] = None,
+                 reranker: Optional[Reranker] = None):
+        # 根据配置选择embedding后端（向量由服务自行计算后传给ChromaDB）
+        self.embedding_backend = embedding_backend or create_embedding_backend()
+        self.collection_name = collection_name or settings.CHROMA_COLLECTION_NAME
+        persist_directory = persist_directory or settings.CHROMA_PERSIST_DIRECTORY
         
-        # 初始化ChromaDB
-        self.chroma_client = chromadb.PersistentClient(
-            path=settings.CHROMA_PERSIST_DIRECTORY
+        # 按集合名创建向量存储（chroma 或 numpy，由配置选择），重建知识库时用于创建新版本
+        self.vector_store_factory = vector_store_factory or (
+            lambda name: create_vector_store(persist_directory=persist_directory, collection_name=name)
         )
+        # 集合别名：collection_name 指向当前生效的版本 collection_name_vN（没有别名时直接使用 collection_name）
+        self.alias = CollectionAlias(os.path.join(persist_directory, "aliases.json"), self.collection_name)
+        self._alias_mtime = self.alias.mtime()
+        self._reload_lock = threading.Lock()
+        
+        active_collection = self.collection_name
+        if vector_store is None:
+            active_collection = self.alias.read()["current"] or self.collection_name
+            vector_store = self.vector_store_factory(active_collection)
+        
+        # 当前生效的 (向量存储, BM25索引, 集合名)，切换版本时整体替换，检索时读取一次快照
+        # BM25倒排索引与向量集合同步维护（进程内，启动时从集合重建）
+        self._active = (vector_store, self._build_keyword_index(vector_store), active_collection)
+        # 正在使用各快照的检索与写入数：切换后旧快照在最后一个使用者结束时关闭
+        self._active_lock = threading.Lock()
+        self._active_users: Dict[int, int] = {}
         
-        # 创建或获取集合
-        self.collection = self.chroma_client.get_or_create_collection(
-            name=settings.CHROMA_COLLECTION_NAME
+        # 查询向量缓存与检索结果缓存
+        # 知识库版本号参与检索缓存键，知识库变化后旧结果不会再被命中
+        self.knowledge_version = 0
+        self.query_embedding_cache = TTLCache(
+            max_size=settings.RAG_CACHE_MAX_SIZE,
+            ttl=settings.RAG_CACHE_TTL
         )
+        self.search_cache = TTLCache(
+            max_size=settings.RAG_CACHE_MAX_SIZE,
+            ttl=settings.RAG_CACHE_TTL
+        )
+        # 知识库变化时需要同步失效的外部缓存（如语义回答缓存）
+        self._invalidation_listeners: List[Callable[[], None]] = []
+        
+        # 可选的重排序阶段（首次需要时才创建，避免未启用时加载模型）
+        self._reranker = reranker
+        self.rerank_stats = {"reranked": 0, "skipped_budget": 0, "rerank_ms": 0.0}
+        # 重排序与上下文组装的统计在线程池中更新，共用一把锁
+        self._stats_lock = threading.Lock()
         
-        # 文本分割器
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,  # 可以外置
-            chunk_overlap=200,  # 可以外置
-            separators=["\n\n", "\n", "。", "！", "？", ".", "!", "?"]
+        # 按token预算组装检索上下文
+        self.context_assembler = ContextAssembler(lock=self._stats_lock)
+        
+        # 文本分割器（分块大小与重叠见配置 CHUNK_SIZE / CHUNK_OVERLAP，并行入库的分块进程使用相同的参数）
+        self.chunk_size = settings.CHUNK_SIZE
+        self.chunk_overlap = settings.CHUNK_OVERLAP
+        self.text_splitter = create_text_splitter(self.chunk_size, self.chunk_overlap)
+    
+    @property
+    def vector_store(self) -> VectorStore:
+        """当前生效版本的向量存储"""
+        return self._active[0]
+    
+    @property
+    def keyword_index(self) -> BM25Index:
+        """当前生效版本的BM25索引"""
+        return self._active[1]
+    
+    @property
+    def active_collection(self) -> str:
+        """当前生效版本的集合名"""
+        return self._active[2]
+    
+    @contextmanager
+    def _use_active(self):
+        """取得当前生效版本的快照 (向量存储, BM25索引, 集合名)，使用期间切换版本时不会关闭该快照的存储"""
+        with self._active_lock:
+            active = self._active
+            self._active_users[id(active)] = self._active_users.get(id(active), 0) + 1
+        try:
+            yield active
+        finally:
+            with self._active_lock:
+                remaining = self._active_users[id(active)] - 1
+                if remaining:
+                    self._active_users[id(active)] = remaining
+                else:
+                    del self._active_users[id(active)]
+                retired = not remaining and active is not self._active
+            if retired:
+                self._close_snapshot(active)
+    
+    def _swap_active(self, active: tuple):
+        """切换当前生效的快照；旧快照没有使用者时立即关闭，否则由最后一个使用者关闭"""
+        with self._active_lock:
+            previous = self._active
+            self._active = active
+            in_use = id(previous) in self._active_users
+        if not in_use:
+            self._close_snapshot(previous)
+    
+    def _close_snapshot(self, active: tuple):
+        """落盘并关闭切换前版本的向量存储（释放文件句柄与内存映射）"""
+        try:
+            active[0].close()
+        except Exception as e:
+            print(f"关闭旧版本 {active[2]} 失败: {e}")
+    
+    def _build_keyword_index(self, vector_store: VectorStore) -> BM25Index:
+        """从向量集合重建BM25索引"""
+        keyword_index = BM25Index()
+        if settings.RETRIEVAL_MODE == "vector":
+            return keyword_index
+        try:
+            stored = vector_store.get()
+            keyword_index.add(stored["ids"], stored["documents"], stored["metadatas"])
+        except Exception as e:
+            print(f"重建关键词索引失败: {e}")
+        return keyword_index
+    
+    def _item_hash(self, item: KnowledgeItem) -> str:
+        """知识条目的内容哈希（入库相关的字段变化时才会改变）"""
+        return item_content_hash(item)
+    
+    def _build_chunks(self, knowledge_items: List[KnowledgeItem]) -> tuple:
+        """将知识条目切分为分块，返回 (ids, documents, metadatas)"""
+        return build_chunks(knowledge_items, self.text_splitter)
+    
+    def _write_chunks(self, active: tuple, ids: List[str], documents: List[str], metadatas: List[Dict[str, Any]]):
+        """计算向量并写入（覆盖）快照 active 的向量存储与关键词索引"""
+        # 分批计算向量后批量添加到向量数据库
+        embeddings = self.embedding_backend.embed_documents(documents)
+        self._store_chunks(active, ids, documents, embeddings, metadatas)
+    
+    def store_chunks(self, ids: List[str], documents: List[str], embeddings: List[List[float]],
+                     metadatas: List[Dict[str, Any]]):
+        """写入已计算好向量的分块（不触发缓存失效，由调用方在写入结束后统一处理）"""
+        with self._use_active() as active:
+            self._store_chunks(active, ids, documents, embeddings, metadatas)
+    
+    def _store_chunks(self, active: tuple, ids: List[str], documents: List[str], embeddings: List[List[float]],
+                      metadatas: List[Dict[str, Any]]):
+        vector_store, keyword_index, _ = active
+        vector_store.add(
+            ids=ids,
+            documents=documents,
+            embeddings=embeddings,
+            metadatas=metadatas
         )
+        # 纯向量检索模式不维护关键词索引（与启动时是否重建保持一致）
+        if settings.RETRIEVAL_MODE != "vector":
+            keyword_index.add(ids, documents, metadatas)
     
     def add_knowledge(self, knowledge_items: List[KnowledgeItem]) -> bool:
         """添加知识库内容"""
         try:
-            documents = []
-            metadatas = []
-            ids = []
+            ids, documents, metadatas = self._build_chunks(knowledge_items)
             
-            for item in knowledge_items:
-                # 文本分割  
-                chunks = self.text_splitter.split_text(item.content)
-                
-                for i, chunk in enumerate(chunks):
-                    doc_id = f"{item.id}_chunk_{i}"
-                    documents.append(chunk)
-                    metadatas.append({
-                        "source_id": item.id,
-                        "title": item.title or "",
-                        "category": item.category,
-                        "language": item.language,
-                        "chunk_index": i
-                    })
-                    ids.append(doc_id)
-            
-            # 批量添加到向量数据库
             if documents:
-                self.collection.add(
-                    documents=documents,
-                    metadatas=metadatas,
-                    ids=ids
-                )
+                with self._use_active() as active:
+                    self._write_chunks(active, ids, documents, metadatas)
+                    active[0].flush()
+                self._invalidate_caches()
             
             return True
             
@@ -83,79 +194,596 @@ class RAGService:
             print(f"添加知识库失败: {e}")
             return False
     
-    def search(self, search_request: SearchRequest) -> SearchResponse:
-        """搜索相关内容"""
+    def sync_knowledge(self, knowledge_items: List[KnowledgeItem]) -> Dict[str, Any]:
+        """增量同步知识库，使其与给定的知识条目一致
+
+        按条目内容哈希比较：新增条目写入，变化的条目覆盖写入并删除多余的旧分块，
+        已不存在的条目删除，未变化的条目不做任何处理（不重新计算向量）。
+        返回各类变化的数量与每个阶段的耗时；失败时返回包含 error 的结果。
+        """
+        timings: Dict[str, float] = {}
+        summary: Dict[str, Any] = {
+            "added": 0, "updated": 0, "deleted": 0, "unchanged": 0,
+            "chunks_written": 0, "chunks_deleted": 0, "timings": timings
+        }
+        
         try:
-            start_time = time.time()
-            
-            # 构建查询
-            query = search_request.query
+            # 整个同步使用同一版本的快照，期间切换版本时写入不会进入新版本
+            with self._use_active() as active:
+                vector_store, keyword_index, _ = active
+                # 读取现有分块: source_id -> (内容哈希集合, 分块ID列表)
+                phase_start = time.perf_counter()
+                existing: Dict[str, tuple] = {}
+                stored = vector_store.get()
+                for doc_id, metadata in zip(stored["ids"], stored["metadatas"]):
+                    hashes, chunk_ids = existing.setdefault(metadata.get("source_id", ""), (set(), []))
+                    hashes.add(metadata.get("content_hash"))
+                    chunk_ids.append(doc_id)
+                timings["scan_s"] = time.perf_counter() - phase_start
+                
+                # 比较内容哈希
+                phase_start = time.perf_counter()
+                changed_items = []
+                stale_ids = []
+                incoming_ids = set()
+                for item in knowledge_items:
+                    incoming_ids.add(item.id)
+                    if item.id not in existing:
+                        summary["added"] += 1
+                        changed_items.append(item)
+                    elif existing[item.id][0] != {self._item_hash(item)}:
+                        summary["updated"] += 1
+                        changed_items.append(item)
+                    else:
+                        summary["unchanged"] += 1
+                
+                ids, documents, metadatas = self._build_chunks(changed_items)
+                new_ids = set(ids)
+                changed_ids = {item.id for item in changed_items}
+                for source_id, (_, chunk_ids) in existing.items():
+                    if source_id not in incoming_ids:
+                        summary["deleted"] += 1
+                        stale_ids.extend(chunk_ids)
+                    elif source_id in changed_ids:
+                        # 分块数变少时删除多余的旧分块
+                        stale_ids.extend(doc_id for doc_id in chunk_ids if doc_id not in new_ids)
+                timings["diff_s"] = time.perf_counter() - phase_start
+                
+                # 写入新增和变化的分块
+                phase_start = time.perf_counter()
+                if documents:
+                    self._write_chunks(active, ids, documents, metadatas)
+                summary["chunks_written"] = len(ids)
+                timings["upsert_s"] = time.perf_counter() - phase_start
+                
+                # 删除过期分块
+                phase_start = time.perf_counter()
+                if stale_ids:
+                    vector_store.delete(stale_ids)
+                    keyword_index.remove(stale_ids)
+                summary["chunks_deleted"] = len(stale_ids)
+                timings["delete_s"] = time.perf_counter() - phase_start
+                
+                if documents or stale_ids:
+                    vector_store.flush()
+                    self._invalidate_caches()
+                return summary
             
-            # 构建过滤条件
-            where_filter = {}
-            if search_request.category:
-                where_filter["category"] = search_request.category
-            if search_request.language:
-                where_filter["language"] = search_request.language
+        except Exception as e:
+            print(f"同步知识库失败: {e}")
+            summary["error"] = str(e)
+            return summary
+    
+    def reload_knowledge(self, knowledge_items: Iterable[KnowledgeItem],
+                         min_document_count: Optional[int] = None, **pipeline_options) -> Dict[str, Any]:
+        """蓝绿重建知识库
+
+        在新版本集合 collection_name_vN 中完整导入知识条目（期间检索继续使用当前版本），
+        校验新版本的文档数后原子地切换到新版本，旧版本保留用于回滚，
+        按切换顺序只保留最近 KNOWLEDGE_KEEP_VERSIONS 个版本（切换前的当前版本总是保留）。
+        重建期间对当前版本的写入（add_knowledge / sync_knowledge）不会进入新版本。
+        返回入库统计信息与版本信息；失败时保留当前版本，结果中包含 error。
+        """
+        from .ingestion import IngestionPipeline
+        
+        if not self._reload_lock.acquire(blocking=False):
+            return {"error": "已有知识库重建任务在进行"}
+        try:
+            state = self.alias.read()
+            if state["current"] is None and self.vector_store.count() > 0:
+                # 未版本化的旧集合作为第一个可回滚的版本
+                state["versions"] = [self.active_collection]
+            version_name = f"{self.collection_name}_v{state['next_version']}"
+            state["next_version"] += 1
             
-            # 执行搜索
-            results = self.collection.query(
-                query_texts=[query],
-                n_results=search_request.top_k,
-                where=where_filter if where_filter else None
+            staging = RAGService(
+                embedding_backend=self.embedding_backend,
+                collection_name=version_name,
+                vector_store=self.vector_store_factory(version_name),
+                vector_store_factory=self.vector_store_factory
             )
+            stats = IngestionPipeline(service=staging, **pipeline_options).run(knowledge_items)
+            stats["version"] = version_name
             
-            # 处理搜索结果
-            search_results = []
-            if results['documents'] and results['documents'][0]:
-                for i, doc in enumerate(results['documents'][0]):
-                    search_result = SearchResult(
-                        content=doc,
-                        score=results['distances'][0][i] if results['distances'] else 0.0,
-                        source=results['metadatas'][0][i]['source_id'] if results['metadatas'] else "",
-                        metadata=results['metadatas'][0][i] if results['metadatas'] else {}
-                    )
-                    search_results.append(search_result)
+            # 校验新版本：写入的分块全部可见，且不少于最小文档数
+            document_count = staging.vector_store.count()
+            stats["document_count"] = document_count
+            min_document_count = settings.KNOWLEDGE_MIN_DOCUMENTS if min_document_count is None else min_document_count
+            if "error" not in stats and document_count != stats["chunks_written"]:
+                stats["error"] = f"新版本文档数 {document_count} 与写入分块数 {stats['chunks_written']} 不一致"
+            elif "error" not in stats and document_count < min_document_count:
+                stats["error"] = f"新版本文档数 {document_count} 少于 {min_document_count}"
+            if "error" in stats:
+                print(f"知识库重建失败，保留当前版本 {self.active_collection}: {stats['error']}")
+                staging.vector_store.drop()
+                self.alias.write(state)
+                return stats
             
-            processing_time = time.time() - start_time
+            # 切换：一次赋值替换 (向量存储, BM25索引, 集合名)，进行中的检索继续使用旧快照
+            self._swap_active((staging.vector_store, staging.keyword_index, version_name))
+            previous = state["current"]
+            if previous in state["versions"]:
+                # 切换前的当前版本（可能是回滚后的旧版本）排在新版本之前：
+                # 回滚时回到它，本次切换也不会删除它（其他进程可能仍在使用）
+                state["versions"].remove(previous)
+                state["versions"].append(previous)
+            state["versions"].append(version_name)
+            keep_versions = max(2, settings.KNOWLEDGE_KEEP_VERSIONS)
+            expired = state["versions"][:-keep_versions]
+            state["versions"] = state["versions"][-keep_versions:]
+            state["current"] = version_name
+            self.alias.write(state)
+            self._alias_mtime = self.alias.mtime()
+            self._invalidate_caches()
             
-            return SearchResponse(
-                results=search_results,
-                total_count=len(search_results),
-                query=query,
-                processing_time=processing_time
-            )
-            
-        except Exception as e:
-            print(f"搜索失败: {e}")
-            return SearchResponse(
-                results=[],
-                total_count=0,
-                query=search_request.query,
-                processing_time=0.0
+            for name in expired:
+                try:
+                    self.vector_store_factory(name).drop()
+                except Exception as e:
+                    print(f"删除旧版本 {name} 失败: {e}")
+            stats["versions"] = state["versions"]
+            stats["dropped_versions"] = expired
+            return stats
+        finally:
+            self._reload_lock.release()
+    
+    def _activate_version(self, name: str):
+        """打开指定版本并切换为当前版本"""
+        vector_store = self.vector_store_factory(name)
+        self._swap_active((vector_store, self._build_keyword_index(vector_store), name))
+        self._invalidate_caches()
+    
+    def rollback_knowledge(self) -> bool:
+        """回滚到上一个保留的版本"""
+        with self._reload_lock:
+            try:
+                state = self.alias.read()
+                versions = state["versions"]
+                if state["current"] not in versions or versions.index(state["current"]) == 0:
+                    print("没有可回滚的旧版本")
+                    return False
+                previous = versions[versions.index(state["current"]) - 1]
+                self._activate_version(previous)
+                state["current"] = previous
+                self.alias.write(state)
+                self._alias_mtime = self.alias.mtime()
+                return True
+            except Exception as e:
+                print(f"回滚知识库失败: {e}")
+                return False
+    
+    def refresh_active_version(self) -> bool:
+        """别名被其他进程（如 init_data.py）切换后，切换到别名当前指向的版本
+
+        只比较别名文件的修改时间，由后台任务定期调用，不在检索路径上执行。
+        返回是否发生了切换。
+        """
+        mtime = self.alias.mtime()
+        if mtime == self._alias_mtime:
+            return False
+        with self._reload_lock:
+            try:
+                self._alias_mtime = mtime
+                current = self.alias.read()["current"]
+                if not current or current == self.active_collection:
+                    return False
+                self._activate_version(current)
+                print(f"知识库已切换到版本 {current}")
+                return True
+            except Exception as e:
+                print(f"切换知识库版本失败: {e}")
+                return False
+    
+    def add_invalidation_listener(self, listener: Callable[[], None]):
+        """注册知识库变化时的回调"""
+        self._invalidation_listeners.append(listener)
+    
+    def _invalidate_caches(self):
+        """知识库内容变化时使检索结果缓存及外部缓存失效"""
+        self.knowledge_version += 1
+        self.search_cache.clear()
+        for listener in self._invalidation_listeners:
+            try:
+                listener()
+            except Exception as e:
+                print(f"缓存失效回调失败: {e}")
+    
+    def embed_query(self, query: str) -> List[float]:
+        """计算查询向量（带缓存）"""
+        return self.embed_queries([query])[0]
+    
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """批量计算查询向量（带缓存，未命中的查询一次性批量计算）"""
+        if not settings.RAG_CACHE_ENABLED:
+            return self.embedding_backend.embed_queries(queries)
+        
+        model_name = self.embedding_backend.model_name
+        embeddings: List[Optional[List[float]]] = []
+        missing: Dict[str, List[int]] = {}
+        for i, query in enumerate(queries):
+            cache_key = (model_name, normalize_query(query))
+            embedding = self.query_embedding_cache.get(cache_key)
+            embeddings.append(embedding)
+            if embedding is None:
+                missing.setdefault(query, []).append(i)
+        
+        if missing:
+            computed = self.embedding_backend.embed_queries(list(missing.keys()))
+            for (query, indices), embedding in zip(missing.items(), computed):
+                self.query_embedding_cache.set((model_name, normalize_query(query)), embedding)
+                for i in indices:
+                    embeddings[i] = embedding
+        
+        return embeddings
+    
+    def _search_filters(self, search_request: SearchRequest) -> tuple:
+        """检索请求的过滤条件: (分类, 语言, 最低价格, 最高价格, 品牌, 特性)"""
+        return (
+            search_request.category,
+            search_request.language,
+            search_request.min_price,
+            search_request.max_price,
+            search_request.brand,
+            tuple(sorted(search_request.features)) if search_request.features else None
+        )
+    
+    @property
+    def reranker(self) -> Reranker:
+        if self._reranker is None:
+            self._reranker = create_reranker()
+        return self._reranker
+    
+    def _should_rerank(self, search_request: SearchRequest) -> bool:
+        return settings.RERANK_ENABLED if search_request.rerank is None else search_request.rerank
+    
+    def _search_cache_key(self, search_request: SearchRequest, knowledge_version: int) -> tuple:
+        """检索结果缓存键: (知识库版本, 检索模式, 规范化查询, 过滤条件, top_k, 是否重排序)"""
+        return (
+            knowledge_version,
+            settings.RETRIEVAL_MODE,
+            normalize_query(search_request.query),
+            self._search_filters(search_request),
+            search_request.top_k,
+            self._should_rerank(search_request)
+        )
+    
+    def _build_where(self, filters: tuple) -> Optional[Dict[str, Any]]:
+        """构建过滤条件（向量存储与关键词索引共用的格式）"""
+        category, language, min_price, max_price, brand, features = filters
+        where_filter: Dict[str, Any] = {}
+        if category:
+            where_filter["category"] = category
+        if language:
+            where_filter["language"] = language
+        if min_price is not None or max_price is not None:
+            where_filter["price"] = {}
+            if min_price is not None:
+                where_filter["price"]["$gte"] = min_price
+            if max_price is not None:
+                where_filter["price"]["$lte"] = max_price
+        if brand:
+            where_filter["brand"] = brand
+        if features:
+            where_filter["features"] = {"$contains": list(features)}
+        return where_filter if where_filter else None
+    
+    def _to_search_results(self, results: Dict[str, Any], index: int) -> List[SearchResult]:
+        """将向量库第index个查询的返回值转换为SearchResult列表"""
+        search_results = []
+        if results['documents'] and results['documents'][index]:
+            for i, doc in enumerate(results['documents'][index]):
+                search_result = SearchResult(
+                    content=doc,
+                    # 余弦距离转换为[0, 1]区间的相似度
+                    score=self._distance_to_score(results['distances'][index][i]) if results['distances'] else 0.0,
+                    source=results['metadatas'][index][i]['source_id'] if results['metadatas'] else "",
+                    metadata=results['metadatas'][index][i] if results['metadatas'] else {}
+                )
+                search_results.append(search_result)
+        return search_results
+    
+    def search(self, search_request: SearchRequest) -> SearchResponse:
+        """搜索相关内容"""
+        return self.search_batch([search_request])[0]
+    
+    def search_batch(self, search_requests: List[SearchRequest]) -> List[SearchResponse]:
+        """批量搜索相关内容
+
+        相同的查询（规范化后）只检索一次；未命中缓存的查询按过滤条件分组，
+        每组只向向量数据库发起一次批量查询。返回结果与输入顺序一致。
+        """
+        # 先读版本号再取快照（切换时先替换 _active 再递增版本号），旧版本的结果不会以新版本号缓存
+        # 本次检索始终使用同一版本的向量存储与BM25索引，检索结束前切换版本时不会关闭该版本
+        knowledge_version = self.knowledge_version
+        with self._use_active() as (vector_store, keyword_index, _):
+            return self._search_batch(search_requests, knowledge_version, vector_store, keyword_index)
+    
+    def _search_batch(self, search_requests: List[SearchRequest], knowledge_version: int,
+                      vector_store: VectorStore, keyword_index: BM25Index) -> List[SearchResponse]:
+        start_time = time.time()
+        responses: List[Optional[SearchResponse]] = [None] * len(search_requests)
+        
+        # 命中检索结果缓存时直接返回，其余按缓存键去重
+        pending: Dict[tuple, List[int]] = {}
+        for i, search_request in enumerate(search_requests):
+            cache_key = self._search_cache_key(search_request, knowledge_version)
+            if settings.RAG_CACHE_ENABLED:
+                cached_response = self.search_cache.get(cache_key)
+                if cached_response is not None:
+                    responses[i] = cached_response.model_copy(update={
+                        "query": search_request.query,
+                        "processing_time": time.time() - start_time
+                    })
+                    continue
+            pending.setdefault(cache_key, []).append(i)
+        
+        # 按 (过滤条件, top_k, 是否重排序) 分组
+        groups: Dict[tuple, List[tuple]] = {}
+        for cache_key in pending:
+            groups.setdefault(cache_key[3:], []).append(cache_key)
+        
+        retrieval_mode = settings.RETRIEVAL_MODE
+        for (filters, top_k, rerank), cache_keys in groups.items():
+            group_start = time.time()
+            where = self._build_where(filters)
+            queries = [search_requests[pending[cache_key][0]].query for cache_key in cache_keys]
+            try:
+                # 重排序时先召回 RERANK_TOP_N 个候选；混合检索时每路多召回一些候选再融合
+                retrieve_k = max(top_k, settings.RERANK_TOP_N) if rerank else top_k
+                candidate_k = retrieve_k * settings.HYBRID_CANDIDATE_MULTIPLIER if retrieval_mode == "hybrid" else retrieve_k
+                
+                # 检索单元 (查询序号, 文本, 语言)：每个查询本身为一个单元；
+                # 混合语言的查询另外拆分为各语言的子查询，每个子查询只检索对应语言
+                units: List[tuple] = []
+                for index, query in enumerate(queries):
+                    units.append((index, query, None))
+                    units.extend((index, text, language) for language, text in self._split_query(query, filters) or [])
+                
+                # 执行批量向量搜索
+                unit_results = [([], []) for _ in units]
+                if retrieval_mode != "keyword":
+                    unit_results = self._vector_search_units(vector_store, units, where, candidate_k)
+                
+                ranked_lists: List[List[tuple]] = [[] for _ in queries]
+                for (index, text, language), (search_results, vector_ids) in zip(units, unit_results):
+                    if retrieval_mode != "vector":
+                        # 关键词检索（过滤条件在打分前生效，子查询只检索对应语言）
+                        unit_where = {**(where or {}), "language": language} if language else where
+                        keyword_hits = keyword_index.search(text, top_k=candidate_k, where=unit_where)
+                        search_results = self._fuse_results(search_results, vector_ids, keyword_hits, retrieve_k)
+                    ranked_lists[index].append((language, search_results[:retrieve_k]))
+                
+                # 每个请求的重排序延迟预算计入本组共享的检索耗时与自身的重排序，
+                # 不计入同一批中其他组或其他查询的检索与重排序
+                retrieval_time = time.time() - group_start
+                for index, cache_key in enumerate(cache_keys):
+                    search_results = ranked_lists[index][0][1]
+                    if len(ranked_lists[index]) > 1:
+                        search_results = self._fuse_subqueries(ranked_lists[index], retrieve_k)
+                    cacheable = True
+                    if rerank:
+                        request = search_requests[pending[cache_key][0]]
+                        search_results, cacheable = self._rerank(
+                            queries[index], search_results, top_k, time.time() - retrieval_time,
+                            request.rerank_budget_ms
+                        )
+                    search_response = SearchResponse(
+                        results=search_results,
+                        total_count=len(search_results),
+                        query=queries[index],
+                        processing_time=time.time() - start_time
+                    )
+                    # 因超出延迟预算跳过重排序的结果不缓存
+                    if settings.RAG_CACHE_ENABLED and cacheable:
+                        self.search_cache.set(cache_key, search_response)
+                    for i in pending[cache_key]:
+                        responses[i] = search_response.model_copy(update={"query": search_requests[i].query})
+                
+            except Exception as e:
+                print(f"搜索失败: {e}")
+                for cache_key in cache_keys:
+                    for i in pending[cache_key]:
+                        responses[i] = SearchResponse(
+                            results=[],
+                            total_count=0,
+                            query=search_requests[i].query,
+                            processing_time=0.0
+                        )
+        
+        return responses
+    
+    def _split_query(self, query: str, filters: tuple) -> Optional[List[tuple]]:
+        """混合语言查询拆分为 [(语言, 子查询)]；未启用、已指定语言过滤或不是混合语言时返回None"""
+        if not settings.MULTI_QUERY_RETRIEVAL or filters[1] or not language_service.is_mixed_language(query):
+            return None
+        subqueries = language_service.split_by_language(query)
+        return subqueries if len(subqueries) > 1 else None
+    
+    def _vector_search_units(self, vector_store: VectorStore, units: List[tuple],
+                             where: Optional[Dict[str, Any]], candidate_k: int) -> List[tuple]:
+        """批量向量检索所有检索单元，返回每个单元的 (SearchResult列表, 文档ID列表)
+
+        完整的查询一次批量查询；各语言的子查询按语言分组，每组一次批量查询，
+        语言过滤条件在向量打分前生效。
+        """
+        outputs = [([], []) for _ in units]
+        embeddings = self.embed_queries([text for _, text, _ in units])
+        by_language: Dict[Optional[str], List[int]] = {}
+        for i, (_, _, language) in enumerate(units):
+            by_language.setdefault(language, []).append(i)
+        
+        for language, positions in by_language.items():
+            results = vector_store.query(
+                query_embeddings=[embeddings[i] for i in positions],
+                n_results=candidate_k,
+                where={**(where or {}), "language": language} if language else where
             )
+            for position, i in enumerate(positions):
+                outputs[i] = (self._to_search_results(results, position), results['ids'][position])
+        return outputs
     
-    def get_relevant_context(self, query: str, top_k: int = 5) -> str:
-        """获取相关上下文（用于Agent）"""
-        search_request = SearchRequest(query=query, top_k=top_k)
-        search_response = self.search(search_request)
+    def _fuse_subqueries(self, ranked_lists: List[tuple], top_k: int) -> List[SearchResult]:
+        """用倒数排名融合合并完整查询与各语言子查询的结果
+
+        ranked_lists 为 [(子查询语言, 结果)]，第一个为完整查询（语言为None）。
+        先融合各语言子查询并截取前 top_k 个，再与完整查询的结果按相同权重融合：
+        子查询补充完整查询漏掉的另一语言的数据，不会把完整查询排在前面的结果挤出去。
+        分数取该分块在各列表中的最高分，命中的子查询语言记录在metadata的 subquery_languages 中。
+        """
+        candidates: Dict[tuple, SearchResult] = {}
+        languages: Dict[tuple, List[str]] = {}
+        id_lists = []
+        for language, results in ranked_lists:
+            ids = []
+            for result in results:
+                key = (result.source, result.metadata.get("chunk_index"))
+                if key not in candidates or result.score > candidates[key].score:
+                    candidates[key] = result
+                hit_languages = languages.setdefault(key, [])
+                if language:
+                    hit_languages.append(language)
+                ids.append(key)
+            id_lists.append(ids)
         
+        subquery_ids = [key for key, _ in reciprocal_rank_fusion(id_lists[1:], k=settings.RRF_K)[:top_k]]
+        fused = []
+        for key, _ in reciprocal_rank_fusion([id_lists[0], subquery_ids], k=settings.RRF_K)[:top_k]:
+            fused.append(candidates[key].model_copy(update={
+                "metadata": {**candidates[key].metadata, "subquery_languages": languages[key]}
+            }))
+        return fused
+    
+    def _fuse_results(self, vector_results: List[SearchResult], vector_ids: List[str],
+                      keyword_hits: List[Dict[str, Any]], top_k: int) -> List[SearchResult]:
+        """用倒数排名融合合并向量检索与关键词检索结果
+
+        融合分数按两路都排第一时的最大值归一化到[0, 1]；
+        两路各自的分数记录在metadata的 vector_score / bm25_score 中。
+        """
+        candidates: Dict[str, SearchResult] = {}
+        ranked_lists = []
+        
+        for doc_id, result in zip(vector_ids, vector_results):
+            candidates[doc_id] = result.model_copy(update={
+                "metadata": {**result.metadata, "vector_score": result.score}
+            })
+        if vector_ids:
+            ranked_lists.append(vector_ids)
+        
+        keyword_ids = []
+        for hit in keyword_hits:
+            doc_id = hit["id"]
+            if doc_id in candidates:
+                candidates[doc_id].metadata["bm25_score"] = hit["score"]
+            else:
+                candidates[doc_id] = SearchResult(
+                    content=hit["document"],
+                    score=0.0,
+                    source=hit["metadata"].get("source_id", ""),
+                    metadata={**hit["metadata"], "bm25_score": hit["score"]}
+                )
+            keyword_ids.append(doc_id)
+        if keyword_ids:
+            ranked_lists.append(keyword_ids)
+        
+        max_score = len(ranked_lists) / (settings.RRF_K + 1)
+        fused = []
+        for doc_id, score in reciprocal_rank_fusion(ranked_lists, k=settings.RRF_K)[:top_k]:
+            fused.append(candidates[doc_id].model_copy(update={"score": min(1.0, score / max_score)}))
+        return fused
+    
+    def _rerank(self, query: str, results: List[SearchResult], top_k: int, start_time: float,
+                budget_ms: Optional[float] = None) -> tuple:
+        """重排序候选并保留前 top_k 个，返回 (结果, 是否完成重排序)
+
+        检索耗时已超过延迟预算时跳过重排序，直接按检索顺序截断。
+        最终分数为重排序分数与检索分数的加权和，两者分别记录在metadata的 rerank_score / retrieval_score 中。
+        """
+        budget_ms = settings.RERANK_LATENCY_BUDGET_MS if budget_ms is None else budget_ms
+        if (time.time() - start_time) * 1000 > budget_ms:
+            with self._stats_lock:
+                self.rerank_stats["skipped_budget"] += 1
+            return results[:top_k], False
+        
+        rerank_start = time.perf_counter()
+        rerank_scores = self.reranker.score(
+            query, [f"{result.metadata.get('title', '')} {result.content}" for result in results]
+        )
+        weight = settings.RERANK_WEIGHT
+        reranked = [
+            result.model_copy(update={
+                "score": min(1.0, max(0.0, weight * rerank_score + (1 - weight) * result.score)),
+                "metadata": {**result.metadata, "rerank_score": rerank_score, "retrieval_score": result.score}
+            })
+            for result, rerank_score in zip(results, rerank_scores)
+        ]
+        reranked.sort(key=lambda result: result.score, reverse=True)
+        with self._stats_lock:
+            self.rerank_stats["reranked"] += 1
+            self.rerank_stats["rerank_ms"] += (time.perf_counter() - rerank_start) * 1000
+        return reranked[:top_k], True
+    
+    def _distance_to_score(self, distance: float) -> float:
+        """将余弦距离转换为相似度分数"""
+        return min(1.0, max(0.0, 1.0 - distance))
+    
+    async def asearch(self, search_request: SearchRequest) -> SearchResponse:
+        """异步搜索相关内容（ChromaDB为同步客户端，放到线程池中执行）"""
+        return await asyncio.to_thread(self.search, search_request)
+    
+    def _format_context(self, search_response: SearchResponse) -> str:
+        """将检索结果按token预算组装为Agent使用的上下文（去重、合并相邻分块）"""
         if search_response.results:
-            context_parts = []
-            for result in search_response.results:
-                context_parts.append(f"内容: {result.content}\n来源: {result.source}")
-            
-            return "\n\n".join(context_parts)
+            context, _ = self.context_assembler.assemble(search_response.results)
+            return context
         
         return ""
     
+    def get_relevant_context(self, query: str, top_k: int = 5) -> str:
+        """获取相关上下文（用于Agent）"""
+        search_request = SearchRequest(query=query, top_k=top_k)
+        return self._format_context(self.search(search_request))
+    
+    def get_relevant_contexts(self, queries: List[str], top_k: int = 5) -> List[str]:
+        """批量获取相关上下文（一次批量检索，结果与输入顺序一致）"""
+        search_requests = [SearchRequest(query=query, top_k=top_k) for query in queries]
+        return [self._format_context(response) for response in self.search_batch(search_requests)]
+    
+    async def aget_relevant_context(self, query: str, top_k: int = 5) -> str:
+        """异步获取相关上下文（用于Agent）"""
+        return await asyncio.to_thread(self.get_relevant_context, query, top_k)
+    
+    async def aget_relevant_contexts(self, queries: List[str], top_k: int = 5) -> List[str]:
+        """异步批量获取相关上下文"""
+        return await asyncio.to_thread(self.get_relevant_contexts, queries, top_k)
+    
     def clear_knowledge(self) -> bool:
         """清空知识库"""
         try:
-            self.chroma_client.delete_collection(settings.CHROMA_COLLECTION_NAME)
-            self.collection = self.chroma_client.create_collection(
-                name=settings.CHROMA_COLLECTION_NAME
-            )
+            with self._use_active() as (vector_store, keyword_index, _):
+                vector_store.clear()
+                keyword_index.clear()
+            self._invalidate_caches()
             return True
         except Exception as e:
             print(f"清空知识库失败: {e}")
@@ -164,11 +792,28 @@ class RAGService:
     def get_collection_info(self) -> Dict[str, Any]:
         """获取集合信息"""
         try:
-            count = self.collection.count()
+            with self._use_active() as (vector_store, keyword_index, active_collection):
+                count = vector_store.count()
+                vector_store_stats = vector_store.get_stats()
+            with self._stats_lock:
+                rerank_stats = dict(self.rerank_stats)
+                context_stats = dict(self.context_assembler.stats)
             return {
-                "collection_name": settings.CHROMA_COLLECTION_NAME,
+                "collection_name": self.collection_name,
+                "active_collection": active_collection,
+                "collection_versions": self.alias.read()["versions"],
+                "vector_store": vector_store.name,
+                "vector_store_stats": vector_store_stats,
                 "document_count": count,
-                "embedding_model": settings.OPENAI_EMBEDDING_MODEL
+                "embedding_model": self.embedding_backend.model_name,
+                "retrieval_mode": settings.RETRIEVAL_MODE,
+                "keyword_index_size": len(keyword_index),
+                "embedding_cache": self.embedding_backend.get_cache_stats(),
+                "knowledge_version": self.knowledge_version,
+                "query_embedding_cache": self.query_embedding_cache.get_stats(),
+                "search_cache": self.search_cache.get_stats(),
+                "rerank": {"enabled": settings.RERANK_ENABLED, **rerank_stats},
+                "context": {"max_tokens": self.context_assembler.max_tokens, **context_stats}
             }
         except Exception as e:
             return {"error": str(e)}
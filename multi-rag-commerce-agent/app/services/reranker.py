@@ -0,0 +1,63 @@
+from typing import List, Optional
+import math
+from ..config import settings
+from .keyword_index import tokenize
+
+class Reranker:
+    """重排序器基类：为 (查询, 候选文档) 打分，分数在[0, 1]区间，越大越相关"""
+
+    name = "base"
+
+    def score(self, query: str, documents: List[str]) -> List[float]:
+        raise NotImplementedError
+
+class LexicalOverlapReranker(Reranker):
+    """词项重叠重排序（默认，无需模型）
+
+    分数为查询词项（与BM25相同的中日韩感知分词）在文档中出现的比例，
+    较长的词项（型号、完整单词）权重更高。
+    """
+
+    name = "lexical"
+
+    def score(self, query: str, documents: List[str]) -> List[float]:
+        query_terms = set(tokenize(query))
+        if not query_terms:
+            return [0.0] * len(documents)
+        weights = {term: math.log(1 + len(term)) for term in query_terms}
+        total = sum(weights.values())
+        scores = []
+        for document in documents:
+            document_terms = set(tokenize(document))
+            scores.append(sum(weight for term, weight in weights.items() if term in document_terms) / total)
+        return scores
+
+class CrossEncoderReranker(Reranker):
+    """本地交叉编码器重排序（需要安装 sentence-transformers）"""
+
+    name = "cross_encoder"
+
+    def __init__(self, model_name: Optional[str] = None):
+        from sentence_transformers import CrossEncoder
+
+        self.model_name = model_name or settings.RERANK_MODEL
+        self.model = CrossEncoder(self.model_name)
+
+    def score(self, query: str, documents: List[str]) -> List[float]:
+        if not documents:
+            return []
+        logits = self.model.predict([(query, document) for document in documents])
+        # 模型输出为logit，转换到[0, 1]
+        return [1.0 / (1.0 + math.exp(-float(logit))) for logit in logits]
+
+def create_reranker(name: Optional[str] = None) -> Reranker:
+    """根据配置创建重排序器，本地模型不可用时回退到词项重叠"""
+    name = name or settings.RERANKER
+    if name == "cross_encoder":
+        try:
+            return CrossEncoderReranker()
+        except Exception as e:
+            print(f"加载交叉编码器失败: {e}，使用词项重叠重排序")
+    elif name != "lexical":
+        print(f"不支持的重排序器: {name}，使用词项重叠重排序")
+    return LexicalOverlapReranker()
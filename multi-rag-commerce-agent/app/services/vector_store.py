@@ -0,0 +1,693 @@
+from typing import List, Dict, Any, Optional, Sequence, Callable
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import numpy as np
+from ..config import settings
+from ..utils.metadata_filter import (
+    RANGE_OPERATORS, split_multi_value, contains_values
+)
+
+class VectorStore:
+    """向量存储基类
+
+    统一 RAGService 使用的存储接口。query 的返回值与 ChromaDB 的格式一致：
+    {"ids": [[...]], "documents": [[...]], "metadatas": [[...]], "distances": [[...]]}，
+    距离为余弦距离。where 的格式见 metadata_matches：{字段: 值}、{字段: {"$in": [...]}}、
+    {字段: {"$gte": x, "$lte": y}}（数值范围）、{字段: {"$contains": 值或值列表}}（多值字段），
+    多个字段之间为“且”。
+    """
+
+    name = "base"
+
+    def add(self, ids: List[str], documents: List[str], embeddings: List[List[float]],
+            metadatas: List[Dict[str, Any]]):
+        """写入文档（ID已存在时覆盖）"""
+        raise NotImplementedError
+
+    def query(self, query_embeddings: List[List[float]], n_results: int,
+              where: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """批量向量检索"""
+        raise NotImplementedError
+
+    def get(self, ids: Optional[List[str]] = None,
+            where: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """读取文档，返回 {"ids", "documents", "metadatas"}"""
+        raise NotImplementedError
+
+    def delete(self, ids: List[str]):
+        """删除文档"""
+        raise NotImplementedError
+
+    def count(self) -> int:
+        """文档数量"""
+        raise NotImplementedError
+
+    def flush(self):
+        """将尚未持久化的写入落盘（默认每次写入即持久化）"""
+
+    def close(self):
+        """落盘并释放资源"""
+        self.flush()
+
+    def clear(self):
+        """清空存储"""
+        raise NotImplementedError
+
+    def drop(self):
+        """删除整个存储（集合/目录），之后实例不可再使用"""
+        raise NotImplementedError
+
+    def get_stats(self) -> Dict[str, Any]:
+        """存储统计信息"""
+        return {"backend": self.name, "count": self.count()}
+
+class ChromaVectorStore(VectorStore):
+    """ChromaDB 向量存储"""
+
+    name = "chroma"
+
+    def __init__(self, persist_directory: str, collection_name: str):
+        import chromadb
+
+        self.collection_name = collection_name
+        self.client = chromadb.PersistentClient(path=persist_directory)
+        self.collection = self._get_or_create_collection()
+        self._backfill_value_keys()
+
+    def _get_or_create_collection(self):
+        """创建或获取集合（不挂载ChromaDB默认的embedding函数，使用余弦距离）"""
+        return self.client.get_or_create_collection(
+            name=self.collection_name,
+            metadata={"hnsw:space": "cosine"},
+            embedding_function=None
+        )
+
+    # ChromaDB 的元数据值不支持列表：多值字段的每个值另存为布尔键 "<字段>:<值>"，
+    # $contains 条件转换为这些键上的等值条件，由 ChromaDB 在向量打分前过滤
+    MULTI_VALUE_FIELDS = ("features",)
+    BACKFILL_BATCH_SIZE = 1000
+
+    def _backfill_value_keys(self):
+        """由没有布尔键的旧版本写入的集合: 打开时为已有文档补写一次"""
+        for field in self.MULTI_VALUE_FIELDS:
+            sample = self.collection.get(where={field: {"$ne": ""}}, limit=1, include=["metadatas"])
+            if not sample["ids"] or any(key.startswith(f"{field}:") for key in sample["metadatas"][0]):
+                continue
+            total = self.collection.count()
+            for offset in range(0, total, self.BACKFILL_BATCH_SIZE):
+                batch = self.collection.get(limit=self.BACKFILL_BATCH_SIZE, offset=offset, include=["metadatas"])
+                self.collection.update(ids=batch["ids"],
+                                       metadatas=[self._with_value_keys(metadata) for metadata in batch["metadatas"]])
+            print(f"集合 {self.collection_name} 已为 {total} 条文档补写多值字段索引键")
+
+    def _with_value_keys(self, metadata: Dict[str, Any], previous: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """加上多值字段的布尔键；覆盖写入时 ChromaDB 合并新旧元数据，旧值中不再包含的键写为False"""
+        expanded = dict(metadata)
+        for key in (previous or {}):
+            if self._is_value_key(key):
+                expanded[key] = False
+        for field in self.MULTI_VALUE_FIELDS:
+            for value in split_multi_value(metadata.get(field)):
+                expanded[f"{field}:{value}"] = True
+        return expanded
+
+    def _is_value_key(self, key: str) -> bool:
+        return any(key.startswith(f"{field}:") for field in self.MULTI_VALUE_FIELDS)
+
+    def _without_value_keys(self, metadatas: List[Optional[Dict[str, Any]]]) -> List[Optional[Dict[str, Any]]]:
+        return [
+            {key: value for key, value in metadata.items() if not self._is_value_key(key)} if metadata else metadata
+            for metadata in metadatas
+        ]
+
+    def _to_chroma_where(self, where: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """转换为 ChromaDB 的 where
+
+        ChromaDB 的 where 只允许一个顶层条件、每个条件一个运算符，
+        多个字段或范围的上下界需要用 $and 组合；$contains 的每个值转换为布尔键上的等值条件。
+        """
+        conditions = []
+        for field, condition in (where or {}).items():
+            if isinstance(condition, dict):
+                for name, value in condition.items():
+                    if name == "$contains":
+                        conditions.extend({f"{field}:{item}": True} for item in contains_values(value))
+                    else:
+                        conditions.append({field: {name: value}})
+            else:
+                conditions.append({field: condition})
+        if len(conditions) <= 1:
+            return conditions[0] if conditions else None
+        return {"$and": conditions}
+
+    def add(self, ids, documents, embeddings, metadatas):
+        found = self.collection.get(ids=ids, include=["metadatas"])
+        previous = dict(zip(found["ids"], found["metadatas"]))
+        metadatas = [self._with_value_keys(metadata, previous.get(id_)) for id_, metadata in zip(ids, metadatas)]
+        self.collection.upsert(ids=ids, documents=documents, embeddings=embeddings, metadatas=metadatas)
+
+    def query(self, query_embeddings, n_results, where=None):
+        results = self.collection.query(
+            query_embeddings=query_embeddings,
+            n_results=n_results,
+            where=self._to_chroma_where(where)
+        )
+        results["metadatas"] = [self._without_value_keys(metadatas) for metadatas in results["metadatas"]]
+        return results
+
+    def get(self, ids=None, where=None):
+        results = self.collection.get(ids=ids, where=self._to_chroma_where(where),
+                                      include=["documents", "metadatas"])
+        results["metadatas"] = self._without_value_keys(results["metadatas"])
+        return results
+
+    def delete(self, ids):
+        if ids:
+            self.collection.delete(ids=ids)
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def clear(self):
+        self.client.delete_collection(self.collection_name)
+        self.collection = self._get_or_create_collection()
+
+    def drop(self):
+        self.client.delete_collection(self.collection_name)
+
+class NumpyVectorStore(VectorStore):
+    """基于内存映射float32矩阵的向量存储
+
+    - vectors.f32: 归一化后的向量（行主序，按行追加，容量不足时扩展文件）
+    - columns.npz: 每行的有效标记和元数据索引列
+    - records.db:  行号到ID、文档内容、元数据的映射（SQLite）
+    - store.json:  维度、容量、行数与过滤字段的值编码表
+    写入只更新内存中的列数据并写入内存映射，列数据与头信息在 flush()/close() 时才落盘，
+    分批导入时不会每批重写整个列文件。
+    元数据索引：
+    - 分类型字段（分类、语言、品牌）：每行一个整数编码，按值生成位掩码
+    - 数值字段（价格）：每行一个数值，范围条件在按值排序的数组上二分查找
+    - 多值字段（特性）：(值编码, 行号) 倒排对，包含条件按值取出行号
+    检索时先用过滤条件的位掩码确定候选行，再只对候选行做矩阵乘法计算相似度，
+    用 argpartition 取 top-k。过滤越严格，需要打分的行越少。适合中小规模的知识库，启动时只需映射文件。
+    """
+
+    name = "numpy"
+    FILTER_FIELDS = ("category", "language", "brand")
+    RANGE_FIELDS = ("price",)
+    MULTI_VALUE_FIELDS = ("features",)
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.RLock()
+        self._dirty = False
+        self._open()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _open(self):
+        self._conn = sqlite3.connect(self._path("records.db"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS records (
+                row INTEGER PRIMARY KEY,
+                id TEXT NOT NULL UNIQUE,
+                document TEXT NOT NULL,
+                metadata TEXT NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+        header = {}
+        if os.path.exists(self._path("store.json")):
+            with open(self._path("store.json"), "r", encoding="utf-8") as f:
+                header = json.load(f)
+        self.dimension = header.get("dimension", 0)
+        self._capacity = header.get("capacity", 0)
+        self._size = header.get("size", 0)
+        self._vocab: Dict[str, List[Any]] = header.get("vocab", {})
+        for field in self.FILTER_FIELDS + self.MULTI_VALUE_FIELDS:
+            self._vocab.setdefault(field, [])
+        self._vocab_index = {
+            field: {value: code for code, value in enumerate(values)}
+            for field, values in self._vocab.items()
+        }
+
+        if self._capacity > 0:
+            self._vectors = np.memmap(self._path("vectors.f32"), dtype=np.float32, mode="r+",
+                                      shape=(self._capacity, self.dimension))
+            columns = np.load(self._path("columns.npz"))
+            # 列文件可能比头信息新（写入头信息前崩溃），只取头信息记录的容量
+            self._alive = columns["alive"][:self._capacity]
+            self._codes = columns["codes"][:self._capacity]
+            self._numbers = (columns["numbers"][:self._capacity] if "numbers" in columns
+                             else self._empty_numbers(self._capacity))
+            self._postings = columns["postings"] if "postings" in columns else np.zeros((0, 3), dtype=np.int32)
+            # 旧版本的存储缺少新增的分类型字段，这些行按“无值”编码
+            missing_fields = self.FILTER_FIELDS[self._codes.shape[1]:]
+            if missing_fields:
+                self._codes = np.concatenate([
+                    self._codes,
+                    np.array([[self._encode(field, None) for field in missing_fields]] * self._capacity,
+                             dtype=np.int32).reshape(self._capacity, len(missing_fields))
+                ], axis=1)
+        else:
+            self._vectors = np.zeros((0, self.dimension), dtype=np.float32)
+            self._alive = np.zeros(0, dtype=bool)
+            self._codes = np.zeros((0, len(self.FILTER_FIELDS)), dtype=np.int32)
+            self._numbers = self._empty_numbers(0)
+            # 多值字段倒排对: (字段序号, 值编码, 行号)
+            self._postings = np.zeros((0, 3), dtype=np.int32)
+        # 上次落盘时SQLite已提交但头信息未写入的行（写入中途崩溃）不属于存储
+        if self._conn.execute("SELECT 1 FROM records WHERE row >= ? LIMIT 1", (self._size,)).fetchone():
+            self._conn.execute("DELETE FROM records WHERE row >= ?", (self._size,))
+            self._conn.commit()
+        self._count = int(self._alive[:self._size].sum())
+        self._masks: Dict[tuple, np.ndarray] = {}
+        self._sorted: Dict[str, tuple] = {}
+
+    def _empty_numbers(self, rows: int) -> np.ndarray:
+        return np.full((rows, len(self.RANGE_FIELDS)), np.nan, dtype=np.float64)
+
+    def _write_file(self, name: str, write: Callable[[Any], None]):
+        """先写临时文件再 os.replace，崩溃时不会留下写了一半的文件"""
+        path = self._path(name)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            write(f)
+        os.replace(temp_path, path)
+
+    def _save(self):
+        """持久化向量、记录、列数据和头信息
+
+        顺序为 向量 -> 记录 -> 列数据 -> 头信息：头信息最后写入，
+        重新打开时以头信息中的行数与容量为准。
+        """
+        if isinstance(self._vectors, np.memmap):
+            self._vectors.flush()
+        self._conn.commit()
+        self._write_file("columns.npz", lambda f: np.savez(
+            f, alive=self._alive, codes=self._codes, numbers=self._numbers, postings=self._postings
+        ))
+        header = json.dumps({
+            "dimension": self.dimension,
+            "capacity": self._capacity,
+            "size": self._size,
+            "vocab": self._vocab
+        }, ensure_ascii=False)
+        self._write_file("store.json", lambda f: f.write(header.encode("utf-8")))
+        self._dirty = False
+
+    def flush(self):
+        """将上次落盘后的写入持久化"""
+        with self._lock:
+            if self._dirty:
+                self._save()
+
+    def close(self):
+        """落盘后关闭SQLite连接并释放内存映射"""
+        with self._lock:
+            self.flush()
+            self._conn.close()
+            if isinstance(self._vectors, np.memmap):
+                self._vectors.flush()
+            self._vectors = np.zeros((0, self.dimension), dtype=np.float32)
+
+    def _reserve(self, rows: int):
+        """保证至少有 rows 行容量（行主序存储，扩容只需在文件末尾追加）"""
+        if rows <= self._capacity:
+            return
+        capacity = max(rows, self._capacity * 2, 1024)
+        if isinstance(self._vectors, np.memmap):
+            self._vectors.flush()
+        del self._vectors
+        with open(self._path("vectors.f32"), "ab") as f:
+            f.truncate(capacity * self.dimension * 4)
+        self._vectors = np.memmap(self._path("vectors.f32"), dtype=np.float32, mode="r+",
+                                  shape=(capacity, self.dimension))
+        self._alive = np.concatenate([self._alive, np.zeros(capacity - self._capacity, dtype=bool)])
+        self._codes = np.concatenate([
+            self._codes, np.full((capacity - self._capacity, len(self.FILTER_FIELDS)), -1, dtype=np.int32)
+        ])
+        self._numbers = np.concatenate([self._numbers, self._empty_numbers(capacity - self._capacity)])
+        self._capacity = capacity
+
+    def _encode(self, field: str, value: Any) -> int:
+        """过滤字段的值编码为整数"""
+        index = self._vocab_index[field]
+        if value not in index:
+            index[value] = len(self._vocab[field])
+            self._vocab[field].append(value)
+        return index[value]
+
+    def _normalize(self, vectors: Sequence[Sequence[float]]) -> np.ndarray:
+        matrix = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def _lookup_rows(self, ids: List[str]) -> Dict[str, int]:
+        """查询ID对应的行号"""
+        rows = {}
+        for start in range(0, len(ids), 500):
+            part = ids[start:start + 500]
+            placeholders = ",".join("?" * len(part))
+            for doc_id, row in self._conn.execute(
+                f"SELECT id, row FROM records WHERE id IN ({placeholders})", part
+            ):
+                rows[doc_id] = row
+        return rows
+
+    def add(self, ids, documents, embeddings, metadatas):
+        if not ids:
+            return
+        vectors = self._normalize(embeddings)
+        with self._lock:
+            if self.dimension == 0:
+                self.dimension = vectors.shape[1]
+                self._vectors = np.zeros((0, self.dimension), dtype=np.float32)
+            if vectors.shape[1] != self.dimension:
+                raise ValueError(f"向量维度不一致: {vectors.shape[1]} != {self.dimension}")
+
+            # 已存在的ID原地覆盖，新ID追加到末尾
+            existing = self._lookup_rows(list(ids))
+            rows = []
+            next_row = self._size
+            for doc_id in ids:
+                if doc_id in existing:
+                    rows.append(existing[doc_id])
+                else:
+                    existing[doc_id] = next_row
+                    rows.append(next_row)
+                    next_row += 1
+            self._reserve(next_row)
+
+            rows_array = np.asarray(rows)
+            self._vectors[rows_array] = vectors
+            self._alive[rows_array] = True
+            for column, field in enumerate(self.FILTER_FIELDS):
+                self._codes[rows_array, column] = [self._encode(field, metadata.get(field)) for metadata in metadatas]
+            for column, field in enumerate(self.RANGE_FIELDS):
+                self._numbers[rows_array, column] = [self._to_number(metadata.get(field)) for metadata in metadatas]
+            self._write_postings(rows_array, metadatas)
+            self._size = next_row
+            self._count = int(self._alive[:self._size].sum())
+            self._masks.clear()
+            self._sorted.clear()
+            self._on_rows_written(rows_array, vectors)
+
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO records (row, id, document, metadata) VALUES (?, ?, ?, ?)",
+                [
+                    (row, doc_id, document, json.dumps(metadata, ensure_ascii=False))
+                    for row, doc_id, document, metadata in zip(rows, ids, documents, metadatas)
+                ]
+            )
+            self._dirty = True
+
+    @staticmethod
+    def _to_number(value: Any) -> float:
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return float(value)
+        return np.nan
+
+    def _write_postings(self, rows: np.ndarray, metadatas: List[Dict[str, Any]]):
+        """更新多值字段的倒排对（覆盖写入的行先移除旧的倒排对）"""
+        if self._postings.size and rows.min() < self._size:
+            self._postings = self._postings[~np.isin(self._postings[:, 2], rows)]
+        pairs = [
+            (column, self._encode(field, value), row)
+            for row, metadata in zip(rows.tolist(), metadatas)
+            for column, field in enumerate(self.MULTI_VALUE_FIELDS)
+            for value in set(split_multi_value(metadata.get(field)))
+        ]
+        if pairs:
+            self._postings = np.concatenate([self._postings, np.asarray(pairs, dtype=np.int32)])
+
+    def _on_rows_written(self, rows: np.ndarray, vectors: np.ndarray):
+        """向量写入后的回调（供近似索引增量更新）"""
+
+    def get_stats(self) -> Dict[str, Any]:
+        """存储统计信息"""
+        return {
+            "backend": self.name,
+            "count": self._count,
+            "dimension": self.dimension,
+            "vector_bytes": self._count * self.dimension * 4
+        }
+
+    def _field_mask(self, field: str, value: Any) -> np.ndarray:
+        """单个过滤条件的位掩码（缓存到下次写入）"""
+        key = (field, value)
+        if key not in self._masks:
+            code = self._vocab_index[field].get(value)
+            column = self.FILTER_FIELDS.index(field)
+            if code is None:
+                self._masks[key] = np.zeros(self._size, dtype=bool)
+            else:
+                self._masks[key] = self._codes[:self._size, column] == code
+        return self._masks[key]
+
+    def _sorted_index(self, field: str) -> tuple:
+        """数值字段按值排序的 (行号, 值) 数组（缓存到下次写入）"""
+        if field not in self._sorted:
+            column = self._numbers[:self._size, self.RANGE_FIELDS.index(field)]
+            valid = np.flatnonzero(~np.isnan(column))
+            order = valid[np.argsort(column[valid], kind="stable")]
+            self._sorted[field] = (order, column[order])
+        return self._sorted[field]
+
+    def _range_mask(self, field: str, condition: Any) -> np.ndarray:
+        """数值范围条件的位掩码（在排序数组上二分查找）"""
+        if not isinstance(condition, dict):
+            condition = {"$gte": condition, "$lte": condition}
+        unknown = set(condition) - set(RANGE_OPERATORS)
+        if unknown:
+            raise ValueError(f"不支持的范围条件: {field} {unknown}")
+        order, values = self._sorted_index(field)
+        start, end = 0, len(values)
+        if "$gte" in condition:
+            start = max(start, int(np.searchsorted(values, condition["$gte"], side="left")))
+        if "$gt" in condition:
+            start = max(start, int(np.searchsorted(values, condition["$gt"], side="right")))
+        if "$lte" in condition:
+            end = min(end, int(np.searchsorted(values, condition["$lte"], side="right")))
+        if "$lt" in condition:
+            end = min(end, int(np.searchsorted(values, condition["$lt"], side="left")))
+        mask = np.zeros(self._size, dtype=bool)
+        if start < end:
+            mask[order[start:end]] = True
+        return mask
+
+    def _contains_mask(self, field: str, condition: Any) -> np.ndarray:
+        """多值字段包含条件的位掩码（多个值时全部包含）"""
+        if not isinstance(condition, dict) or set(condition) != {"$contains"}:
+            raise ValueError(f"多值字段只支持 $contains 条件: {field}")
+        column = self.MULTI_VALUE_FIELDS.index(field)
+        mask = np.ones(self._size, dtype=bool)
+        for value in contains_values(condition["$contains"]):
+            key = (field, value)
+            if key not in self._masks:
+                code = self._vocab_index[field].get(value)
+                value_mask = np.zeros(self._size, dtype=bool)
+                if code is not None:
+                    matched = (self._postings[:, 0] == column) & (self._postings[:, 1] == code)
+                    value_mask[self._postings[matched, 2]] = True
+                self._masks[key] = value_mask
+            mask &= self._masks[key]
+        return mask
+
+    def _mask(self, where: Optional[Dict[str, Any]]) -> np.ndarray:
+        """有效行与所有过滤条件的位掩码"""
+        mask = self._alive[:self._size].copy()
+        for field, condition in (where or {}).items():
+            if field in self.RANGE_FIELDS:
+                field_mask = self._range_mask(field, condition)
+            elif field in self.MULTI_VALUE_FIELDS:
+                field_mask = self._contains_mask(field, condition)
+            elif field not in self.FILTER_FIELDS:
+                raise ValueError(f"不支持的过滤字段: {field}")
+            elif isinstance(condition, dict) and "$in" in condition:
+                field_mask = np.zeros(self._size, dtype=bool)
+                for value in condition["$in"]:
+                    field_mask |= self._field_mask(field, value)
+            else:
+                field_mask = self._field_mask(field, condition)
+            mask &= field_mask
+        return mask
+
+    def _fetch(self, rows: List[int]) -> Dict[int, tuple]:
+        """按行号读取 (ID, 文档, 元数据)"""
+        records = {}
+        for start in range(0, len(rows), 500):
+            part = rows[start:start + 500]
+            placeholders = ",".join("?" * len(part))
+            for row, doc_id, document, metadata in self._conn.execute(
+                f"SELECT row, id, document, metadata FROM records WHERE row IN ({placeholders})", part
+            ):
+                records[row] = (doc_id, document, json.loads(metadata))
+        return records
+
+    def _top_k(self, scores: np.ndarray, k: int) -> np.ndarray:
+        """返回分数最高的k个位置（降序）"""
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.argsort(-scores[top])]
+
+    def _search_rows(self, queries: np.ndarray, mask: np.ndarray, n_results: int) -> List[tuple]:
+        """精确检索，返回每个查询的 (行号列表, 相似度数组)"""
+        candidates = None if mask.all() else np.flatnonzero(mask)
+        candidate_count = self._size if candidates is None else candidates.size
+        k = min(n_results, candidate_count)
+        if k == 0:
+            return [([], np.zeros(0, dtype=np.float32)) for _ in queries]
+
+        if candidates is not None and candidates.size * 4 > self._size:
+            # 候选行占比较大时，对整个矩阵打分再屏蔽非候选行，比复制候选行更快
+            scores = queries @ self._vectors[:self._size].T
+            scores[:, ~mask] = -np.inf
+            candidates = None
+        else:
+            # 没有过滤时直接使用整个矩阵，避免复制
+            matrix = self._vectors[:self._size] if candidates is None else self._vectors[candidates]
+            scores = queries @ matrix.T
+
+        top_rows = []
+        for query_scores in scores:
+            top = self._top_k(query_scores, k)
+            rows = top if candidates is None else candidates[top]
+            top_rows.append((rows.tolist(), query_scores[top]))
+        return top_rows
+
+    def query(self, query_embeddings, n_results, where=None):
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        with self._lock:
+            if self.dimension == 0:
+                for key in results:
+                    results[key] = [[] for _ in query_embeddings]
+                return results
+
+            top_rows = self._search_rows(self._normalize(query_embeddings), self._mask(where), n_results)
+            records = self._fetch(sorted({row for rows, _ in top_rows for row in rows}))
+
+        for rows, top_scores in top_rows:
+            # 记录已删除但列数据尚未落盘（写入中途崩溃）的行不返回
+            if any(row not in records for row in rows):
+                kept = [position for position, row in enumerate(rows) if row in records]
+                rows, top_scores = [rows[position] for position in kept], top_scores[kept]
+            results["ids"].append([records[row][0] for row in rows])
+            results["documents"].append([records[row][1] for row in rows])
+            results["metadatas"].append([records[row][2] for row in rows])
+            results["distances"].append([float(1.0 - score) for score in top_scores])
+        return results
+
+    def get(self, ids=None, where=None):
+        with self._lock:
+            if ids is not None:
+                rows = sorted(self._lookup_rows(list(ids)).values())
+            else:
+                rows = np.flatnonzero(self._mask(where)).tolist()
+            records = self._fetch(rows)
+
+        ordered = [records[row] for row in rows if row in records]
+        return {
+            "ids": [record[0] for record in ordered],
+            "documents": [record[1] for record in ordered],
+            "metadatas": [record[2] for record in ordered]
+        }
+
+    def delete(self, ids):
+        if not ids:
+            return
+        with self._lock:
+            rows = list(self._lookup_rows(list(ids)).values())
+            if not rows:
+                return
+            self._alive[np.asarray(rows)] = False
+            self._count -= len(rows)
+            self._masks.clear()
+            self._conn.executemany("DELETE FROM records WHERE row = ?", [(row,) for row in rows])
+            self._dirty = True
+
+    def count(self) -> int:
+        return self._count
+
+    def clear(self):
+        with self._lock:
+            self._conn.close()
+            del self._vectors
+            shutil.rmtree(self.directory, ignore_errors=True)
+            os.makedirs(self.directory, exist_ok=True)
+            self._dirty = False
+            self._open()
+
+    def drop(self):
+        with self._lock:
+            self._conn.close()
+            del self._vectors
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+class CollectionAlias:
+    """集合别名（蓝绿切换）
+
+    别名文件记录别名当前指向的版本和保留的版本列表（由旧到新）。
+    写入时先写临时文件再 os.replace，读取方不会读到写了一半的内容；
+    其他进程通过文件修改时间发现切换。
+    """
+
+    def __init__(self, path: str, alias: str):
+        self.path = path
+        self.alias = alias
+        self._lock = threading.Lock()
+
+    def mtime(self) -> float:
+        try:
+            return os.path.getmtime(self.path)
+        except OSError:
+            return 0.0
+
+    def _read_all(self) -> Dict[str, Any]:
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def read(self) -> Dict[str, Any]:
+        """读取别名状态: {"current": 当前版本或None, "versions": [...], "next_version": 下一个版本号}"""
+        state = self._read_all().get(self.alias, {})
+        return {
+            "current": state.get("current"),
+            "versions": list(state.get("versions", [])),
+            "next_version": state.get("next_version", 1)
+        }
+
+    def write(self, state: Dict[str, Any]):
+        """原子地更新别名状态"""
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            aliases = self._read_all()
+            aliases[self.alias] = state
+            temp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(aliases, f, ensure_ascii=False, indent=2)
+            os.replace(temp_path, self.path)
+
+def create_vector_store(backend: Optional[str] = None, persist_directory: Optional[str] = None,
+                        collection_name: Optional[str] = None) -> VectorStore:
+    """根据配置创建向量存储"""
+    backend = backend or settings.VECTOR_STORE_BACKEND
+    persist_directory = persist_directory or settings.CHROMA_PERSIST_DIRECTORY
+    collection_name = collection_name or settings.CHROMA_COLLECTION_NAME
+
+    if backend == "chroma":
+        return ChromaVectorStore(persist_directory, collection_name)
+    if backend == "numpy":
+        return NumpyVectorStore(os.path.join(persist_directory, "numpy", collection_name))
+    if backend == "ivfpq":
+        from .ivfpq_store import IVFPQVectorStore
+        return IVFPQVectorStore(os.path.join(persist_directory, "ivfpq", collection_name))
+    raise ValueError(f"不支持的向量存储后端: {backend}")
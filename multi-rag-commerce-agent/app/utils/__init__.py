@@ -2,6 +2,8 @@ from .helpers import (
     generate_session_id,
     generate_user_id,
     hash_text,
+    hash_content,
+    normalize_query,
     safe_json_dumps,
     safe_json_loads,
     format_timestamp,
@@ -14,14 +16,18 @@ from .helpers import (
     is_valid_filename,
     format_file_size,
     retry_on_failure,
+    format_sse_event,
     create_error_response,
-    create_success_response
+    create_success_response,
+    run_sync
 )
 
 __all__ = [
     "generate_session_id",
     "generate_user_id", 
     "hash_text",
+    "hash_content",
+    "normalize_query",
     "safe_json_dumps",
     "safe_json_loads",
     "format_timestamp",
@@ -34,6 +40,8 @@ __all__ = [
     "is_valid_filename",
     "format_file_size",
     "retry_on_failure",
+    "format_sse_event",
     "create_error_response",
-    "create_success_response"
+    "create_success_response",
+    "run_sync"
 ] 
\ No newline at end of file
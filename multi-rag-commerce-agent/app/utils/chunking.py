@@ -0,0 +1,85 @@
+from typing import List, Dict, Any, Optional, Tuple
+import json
+import time
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from ..config import settings
+from .helpers import hash_content
+from .metadata_filter import join_multi_value
+
+# 分割符：段落、换行、中英文句末标点
+SEPARATORS = ["\n\n", "\n", "。", "！", "？", ".", "!", "?"]
+
+# 分块元数据的结构版本，参与内容哈希；结构变化后增量同步会重写所有分块
+CHUNK_SCHEMA_VERSION = 2
+
+def create_text_splitter(chunk_size: Optional[int] = None, chunk_overlap: Optional[int] = None) -> RecursiveCharacterTextSplitter:
+    """创建文本分割器"""
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size or settings.CHUNK_SIZE,
+        chunk_overlap=chunk_overlap if chunk_overlap is not None else settings.CHUNK_OVERLAP,
+        separators=SEPARATORS
+    )
+
+def item_content_hash(item) -> str:
+    """知识条目的内容哈希（入库相关的字段变化时才会改变）"""
+    return hash_content(json.dumps({
+        "schema": CHUNK_SCHEMA_VERSION,
+        "content": item.content,
+        "title": item.title or "",
+        "category": item.category,
+        "language": item.language,
+        "metadata": item.metadata or {}
+    }, ensure_ascii=False, sort_keys=True, default=str))
+
+def structured_metadata(metadata: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """从条目元数据中提取可过滤的结构化字段：价格（数值）、品牌、特性（多值）"""
+    metadata = metadata or {}
+    fields: Dict[str, Any] = {}
+    price = metadata.get("price")
+    if isinstance(price, (int, float)) and not isinstance(price, bool):
+        fields["price"] = float(price)
+    if metadata.get("brand"):
+        fields["brand"] = str(metadata["brand"])
+    if isinstance(metadata.get("features"), list) and metadata["features"]:
+        fields["features"] = join_multi_value(metadata["features"])
+    return fields
+
+def build_chunks(items: List[Any], text_splitter: RecursiveCharacterTextSplitter) -> Tuple[List[str], List[str], List[Dict[str, Any]]]:
+    """将知识条目切分为分块，返回 (ids, documents, metadatas)"""
+    documents = []
+    metadatas = []
+    ids = []
+    
+    for item in items:
+        # 文本分割  
+        chunks = text_splitter.split_text(item.content)
+        content_hash = item_content_hash(item)
+        filter_fields = structured_metadata(item.metadata)
+        
+        for i, chunk in enumerate(chunks):
+            doc_id = f"{item.id}_chunk_{i}"
+            documents.append(chunk)
+            metadatas.append({
+                "source_id": item.id,
+                "title": item.title or "",
+                "category": item.category,
+                "language": item.language,
+                "chunk_index": i,
+                "content_hash": content_hash,
+                **filter_fields
+            })
+            ids.append(doc_id)
+    
+    return ids, documents, metadatas
+
+# 进程池中每个工作进程复用的分割器
+_worker_splitters: Dict[tuple, RecursiveCharacterTextSplitter] = {}
+
+def split_items(items: List[Any], chunk_size: int, chunk_overlap: int) -> tuple:
+    """进程池任务：切分一组条目，返回 (ids, documents, metadatas, 耗时秒)"""
+    start_time = time.perf_counter()
+    key = (chunk_size, chunk_overlap)
+    if key not in _worker_splitters:
+        _worker_splitters[key] = create_text_splitter(chunk_size, chunk_overlap)
+    ids, documents, metadatas = build_chunks(items, _worker_splitters[key])
+    return ids, documents, metadatas, time.perf_counter() - start_time
@@ -1,9 +1,15 @@
 import uuid
 import hashlib
 import json
-from typing import Dict, Any, Optional
+import asyncio
+import threading
+from typing import Dict, Any, Optional, Awaitable
 from datetime import datetime
 
+# 同步封装使用的后台事件循环（惰性创建，进程内共享）
+_sync_loop: Optional[asyncio.AbstractEventLoop] = None
+_sync_loop_lock = threading.Lock()
+
 def generate_session_id() -> str:
     """生成会话ID"""
     return str(uuid.uuid4())
@@ -16,6 +22,15 @@ def hash_text(text: str) -> str:
     """对文本进行哈希"""
     return hashlib.md5(text.encode('utf-8')).hexdigest()
 
+def hash_content(text: str) -> str:
+    """对文本内容进行SHA-256哈希（用于内容寻址的缓存键）"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def normalize_query(text: str) -> str:
+    """规范化查询文本（用于缓存键）：统一大小写、合并空白、去掉结尾标点"""
+    normalized = " ".join(text.lower().split())
+    return normalized.rstrip("？?！!。.，,；;～~ ")
+
 def safe_json_dumps(obj: Any) -> str:
     """安全的JSON序列化"""
     try:
@@ -126,6 +141,10 @@ def retry_on_failure(func, max_retries: int = 3, delay: float = 1.0):
     
     return wrapper
 
+def format_sse_event(event: str, data: Any) -> str:
+    """格式化Server-Sent Events消息"""
+    return f"event: {event}\ndata: {safe_json_dumps(data)}\n\n"
+
 def create_error_response(message: str, error_code: str = "UNKNOWN_ERROR") -> Dict[str, Any]:
     """创建错误响应"""
     return {
@@ -144,4 +163,27 @@ def create_success_response(data: Any, message: str = "Success") -> Dict[str, An
         "message": message,
         "data": data,
         "timestamp": datetime.now().isoformat()
-    } 
\ No newline at end of file
+    } 
+
+def _get_sync_loop() -> asyncio.AbstractEventLoop:
+    """获取后台事件循环（不存在时创建）"""
+    global _sync_loop
+    with _sync_loop_lock:
+        if _sync_loop is None or _sync_loop.is_closed():
+            _sync_loop = asyncio.new_event_loop()
+            thread = threading.Thread(
+                target=_sync_loop.run_forever,
+                name="sync-bridge-loop",
+                daemon=True
+            )
+            thread.start()
+        return _sync_loop
+
+def run_sync(coro: Awaitable[Any]) -> Any:
+    """在同步代码中运行协程并返回结果
+
+    协程统一提交到同一个后台事件循环，避免每次调用都新建事件循环，
+    使异步客户端（如OpenAI连接池）始终绑定在同一个循环上。
+    """
+    future = asyncio.run_coroutine_threadsafe(coro, _get_sync_loop())
+    return future.result()
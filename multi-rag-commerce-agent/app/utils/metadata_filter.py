@@ -0,0 +1,58 @@
+from typing import List, Dict, Any, Optional
+import operator
+
+# 多值字段（如商品特性）在分块元数据中以分隔符拼接为字符串存储（ChromaDB 的元数据值不支持列表）
+MULTI_VALUE_SEPARATOR = "|"
+
+# 数值范围条件
+RANGE_OPERATORS = {
+    "$gt": operator.gt,
+    "$gte": operator.ge,
+    "$lt": operator.lt,
+    "$lte": operator.le
+}
+
+def normalize_value(value: Any) -> str:
+    """多值字段中单个值的规范化形式（忽略大小写与首尾空白）"""
+    return str(value).strip().lower()
+
+def split_multi_value(value: Any) -> List[str]:
+    """将多值字段（分隔符拼接的字符串或列表）拆分为规范化的值列表"""
+    if not value:
+        return []
+    values = value.split(MULTI_VALUE_SEPARATOR) if isinstance(value, str) else value
+    return [normalize_value(item) for item in values if str(item).strip()]
+
+def join_multi_value(values: List[Any]) -> str:
+    """将多值字段拼接为元数据中存储的字符串"""
+    return MULTI_VALUE_SEPARATOR.join(
+        str(value).replace(MULTI_VALUE_SEPARATOR, " ").strip() for value in values if str(value).strip()
+    )
+
+def contains_values(condition: Any) -> List[str]:
+    """$contains 条件的值（单个值或列表，列表表示全部包含）"""
+    return [normalize_value(value) for value in (condition if isinstance(condition, (list, tuple)) else [condition])]
+
+def metadata_matches(metadata: Dict[str, Any], where: Optional[Dict[str, Any]]) -> bool:
+    """判断元数据是否满足过滤条件
+
+    where 为 {字段: 值}、{字段: {"$in": [...]}}、{字段: {"$gte": x, "$lte": y}}（数值范围）
+    或 {字段: {"$contains": 值或值列表}}（多值字段包含），多个字段之间为“且”。
+    """
+    for field, condition in (where or {}).items():
+        value = metadata.get(field)
+        if not isinstance(condition, dict):
+            if value != condition:
+                return False
+            continue
+        if "$in" in condition and value not in condition["$in"]:
+            return False
+        if "$contains" in condition:
+            present = set(split_multi_value(value))
+            if not all(item in present for item in contains_values(condition["$contains"])):
+                return False
+        for name, compare in RANGE_OPERATORS.items():
+            if name in condition:
+                if not isinstance(value, (int, float)) or isinstance(value, bool) or not compare(value, condition[name]):
+                    return False
+    return True
@@ -0,0 +1,85 @@
+from typing import Optional
+import math
+import re
+import threading
+from ..config import settings
+
+# 近似计数：中日韩字符各计1个token，其余按词计数（长词每4个字符计1个）
+_APPROX_PATTERN = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯]|[A-Za-z0-9]+|[^\sA-Za-z0-9]")
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+def _load_encoding():
+    """在持有 _encoding_lock 时加载tiktoken编码（只尝试一次）"""
+    global _encoding, _encoding_loaded
+    if _encoding_loaded:
+        return
+    try:
+        import tiktoken
+        _encoding = tiktoken.get_encoding(settings.TOKENIZER_ENCODING)
+    except Exception as e:
+        print(f"加载tiktoken编码失败: {e}，使用近似token计数")
+    finally:
+        _encoding_loaded = True
+
+def load_encoding():
+    """加载tiktoken编码（可能需要下载编码文件，应在启动时于线程中调用），返回编码或None"""
+    with _encoding_lock:
+        _load_encoding()
+    return _encoding
+
+def get_encoding():
+    """tiktoken编码（未在启动时加载则首次使用时加载）
+
+    其他线程正在加载时不等待，返回None使用近似计数，请求不会被编码文件的下载阻塞。
+    """
+    if _encoding_loaded:
+        return _encoding
+    if not _encoding_lock.acquire(blocking=False):
+        return None
+    try:
+        _load_encoding()
+    finally:
+        _encoding_lock.release()
+    return _encoding
+
+def count_tokens(text: str) -> int:
+    """统计文本的token数"""
+    if not text:
+        return 0
+    encoding = get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return sum(
+        math.ceil(len(token) / 4) if token[0].isascii() and token[0].isalnum() else 1
+        for token in _APPROX_PATTERN.findall(text)
+    )
+
+def truncate_to_tokens(text: str, max_tokens: int, suffix: str = "…") -> str:
+    """截断文本使其不超过 max_tokens 个token（被截断时追加 suffix）"""
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+    budget = max_tokens - count_tokens(suffix)
+    if budget <= 0:
+        return ""
+    encoding = get_encoding()
+    if encoding is not None:
+        tokens = encoding.encode(text, disallowed_special=())
+        # 截断处可能切开多字节字符，逐个回退直到解码结果不再超出预算
+        truncated = encoding.decode(tokens[:budget])
+        while truncated and count_tokens(truncated) > budget:
+            truncated = truncated[:-1]
+        return truncated + suffix
+
+    # 近似计数时按字符二分查找最长前缀
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count_tokens(text[:middle]) <= budget:
+            low = middle
+        else:
+            high = middle - 1
+    return text[:low] + suffix
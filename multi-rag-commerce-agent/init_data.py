@@ -4,7 +4,6 @@
 用于加载示例数据到向量数据库
 """
 
-import json
 import os
 import sys
 from pathlib import Path
@@ -13,84 +12,60 @@ from pathlib import Path
 project_root = Path(__file__).parent
 sys.path.insert(0, str(project_root))
 
-from app.models.knowledge import KnowledgeItem
 from app.services.rag_service import rag_service
+from app.services.ingestion import reload_files, iter_file_items
 from app.config import settings
 
-def load_json_data(file_path: str) -> list:
-    """加载JSON数据文件"""
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except Exception as e:
-        print(f"加载文件 {file_path} 失败: {e}")
-        return []
+def print_sync_summary(summary: dict):
+    """打印增量同步的变化与各阶段耗时"""
+    print(f"新增: {summary['added']} 条, 更新: {summary['updated']} 条, "
+          f"删除: {summary['deleted']} 条, 未变化: {summary['unchanged']} 条")
+    print(f"写入分块: {summary['chunks_written']}, 删除分块: {summary['chunks_deleted']}")
+    phase_names = {"scan_s": "读取现有数据", "diff_s": "比较差异", "upsert_s": "写入", "delete_s": "删除"}
+    for key, name in phase_names.items():
+        if key in summary["timings"]:
+            print(f"  {name}: {summary['timings'][key] * 1000:.1f}ms")
 
-def convert_to_knowledge_items(data: list) -> list:
-    """将JSON数据转换为KnowledgeItem对象"""
-    knowledge_items = []
-    
-    for item in data:
-        try:
-            knowledge_item = KnowledgeItem(
-                id=item['id'],
-                content=item['content'],
-                title=item.get('title', ''),
-                category=item['category'],
-                language=item['language'],
-                metadata=item.get('metadata', {})
-            )
-            knowledge_items.append(knowledge_item)
-        except Exception as e:
-            print(f"转换数据项失败: {e}")
-            continue
-    
-    return knowledge_items
+def init_knowledge_base(incremental: bool = False, data_files: list = None):
+    """初始化知识库
 
-def init_knowledge_base():
-    """初始化知识库"""
+    数据文件（JSON数组或JSONL）逐条流式读取，默认为 data/faq.json 与 data/products.json。
+    默认在新版本集合中完整重建后原子切换（旧版本保留用于回滚），
+    incremental 为 True 时按内容哈希增量同步当前版本。
+    """
     print("开始初始化知识库...")
     
     # 数据文件路径
     data_dir = project_root / "data"
-    faq_file = data_dir / "faq.json"
-    products_file = data_dir / "products.json"
+    data_files = [Path(file_path) for file_path in (data_files or [data_dir / "faq.json", data_dir / "products.json"])]
     
     # 检查文件是否存在
-    if not faq_file.exists():
-        print(f"FAQ文件不存在: {faq_file}")
-        return False
-    
-    if not products_file.exists():
-        print(f"商品文件不存在: {products_file}")
-        return False
-    
-    # 加载数据
-    print("加载FAQ数据...")
-    faq_data = load_json_data(faq_file)
-    print(f"加载了 {len(faq_data)} 条FAQ数据")
-    
-    print("加载商品数据...")
-    products_data = load_json_data(products_file)
-    print(f"加载了 {len(products_data)} 条商品数据")
-    
-    # 转换为KnowledgeItem
-    print("转换数据格式...")
-    faq_items = convert_to_knowledge_items(faq_data)
-    product_items = convert_to_knowledge_items(products_data)
-    
-    all_items = faq_items + product_items
-    print(f"总共 {len(all_items)} 条数据待处理")
-    
-    # 清空现有知识库
-    print("清空现有知识库...")
-    rag_service.clear_knowledge()
-    
-    # 添加到向量数据库
-    print("添加到向量数据库...")
-    success = rag_service.add_knowledge(all_items)
+    for data_file in data_files:
+        if not data_file.exists():
+            print(f"数据文件不存在: {data_file}")
+            return False
+    
+    if incremental:
+        # 增量同步：只处理新增、变化和已删除的条目
+        print("增量同步知识库...")
+        all_items = list(iter_file_items(data_files))
+        print(f"总共 {len(all_items)} 条数据待处理")
+        summary = rag_service.sync_knowledge(all_items)
+        print_sync_summary(summary)
+        if "error" in summary:
+            print("知识库同步失败！")
+            return False
+        print(f"知识库信息: {rag_service.get_collection_info()}")
+        return True
     
-    if success:
+    # 在新版本集合中流式读取、分块、计算向量并分批写入，校验后切换别名（服务中的检索不受影响）
+    print("流式导入新版本向量集合...")
+    stats = reload_files(data_files)
+    if "error" not in stats:
+        print(f"导入 {stats['items']} 条数据（跳过 {stats['skipped']} 条无效记录），"
+              f"{stats['chunks_written']} 个分块，耗时 {stats['elapsed_s']:.2f}s，"
+              f"{stats['chunks_per_s']:.1f} 分块/秒")
+        print(f"已切换到版本 {stats['version']}，保留版本: {stats['versions']}")
         print("知识库初始化成功！")
         
         # 获取知识库信息
@@ -137,8 +112,10 @@ def main():
         print("请创建 .env 文件并设置您的 OpenAI API 密钥")
         return False
     
-    # 初始化知识库
-    if init_knowledge_base():
+    # 初始化知识库（--sync 为增量同步模式，其余参数为数据文件路径）
+    args = sys.argv[1:]
+    data_files = [arg for arg in args if not arg.startswith("--")]
+    if init_knowledge_base(incremental="--sync" in args, data_files=data_files):
         # 测试搜索功能
         test_search()
         print("\n数据初始化完成！")
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+近似最近邻索引基准测试脚本
+离线对比 IVF-PQ 与精确检索（numpy 暴力检索）的 recall@k、查询延迟与常驻内存
+
+数据为高斯混合生成的归一化向量（模拟按品类聚集的商品向量），
+精确检索的 top-k 作为标准答案，扫描不同 nprobe 与是否精确重排的组合。
+
+用法: python tests/benchmark/bench_ann_index.py [向量数，默认200000] [维度，默认384] [查询数，默认100]
+"""
+
+import sys
+import time
+import tempfile
+import statistics
+from pathlib import Path
+
+import numpy as np
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.services.vector_store import NumpyVectorStore
+from app.services.ivfpq_store import IVFPQVectorStore
+
+TOP_K = 10
+BATCH_SIZE = 10000
+
+def generate(size: int, dimension: int, seed: int, clusters: int = 1000) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = np.random.default_rng(42).standard_normal((clusters, dimension)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, size)] + rng.standard_normal((size, dimension), dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def fill(store, vectors: np.ndarray) -> float:
+    start_time = time.perf_counter()
+    for start in range(0, len(vectors), BATCH_SIZE):
+        batch = vectors[start:start + BATCH_SIZE]
+        ids = [f"doc_{start + i}" for i in range(len(batch))]
+        metadatas = [{"category": "product", "language": "zh"} for _ in ids]
+        store.add(ids, ids, batch.tolist(), metadatas)
+    return time.perf_counter() - start_time
+
+def run_queries(store, queries: np.ndarray):
+    """返回 (每个查询的行号列表, 单次延迟列表ms)"""
+    results, latencies = [], []
+    for query in queries:
+        start_time = time.perf_counter()
+        ids = store.query([query.tolist()], n_results=TOP_K)["ids"][0]
+        latencies.append((time.perf_counter() - start_time) * 1000)
+        results.append({int(doc_id.split("_")[1]) for doc_id in ids})
+    return results, latencies
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    dimension = int(sys.argv[2]) if len(sys.argv) > 2 else 384
+    query_count = int(sys.argv[3]) if len(sys.argv) > 3 else 100
+
+    vectors = generate(size, dimension, seed=0)
+    queries = generate(query_count, dimension, seed=1)
+    # 标准答案：精确的 top-k
+    ground_truth = [set(np.argsort(-(vectors @ query))[:TOP_K].tolist()) for query in queries]
+
+    with tempfile.TemporaryDirectory() as directory:
+        exact = NumpyVectorStore(str(Path(directory) / "exact"))
+        fill(exact, vectors)
+        ann = IVFPQVectorStore(str(Path(directory) / "ivfpq"), train_threshold=size)
+        build_time = fill(ann, vectors)
+        stats = ann.get_stats()
+
+        index_bytes = stats["code_bytes"] + ann._centroids.nbytes + ann._codebooks.nbytes
+        print("=" * 78)
+        print(f"IVF-PQ 基准测试（{size} 条 {dimension} 维向量，{query_count} 次查询，recall@{TOP_K}）")
+        print(f"nlist={stats['nlist']}  m={stats['m']}  写入+训练 {build_time:.1f}s")
+        print(f"常驻内存: 原始向量 {stats['vector_bytes'] / 2**20:.1f}MB -> "
+              f"IVF-PQ编码+码本 {index_bytes / 2**20:.1f}MB")
+        print("=" * 78)
+
+        _, latencies = run_queries(exact, queries)
+        print(f"{'exact':<18} recall=100.00%  p50={statistics.median(latencies):7.2f}ms")
+
+        for refine_factor in (0, 4):
+            for nprobe in (1, 2, 4, 8, 16, 32, 64):
+                ann.nprobe = nprobe
+                ann.refine_factor = refine_factor
+                results, latencies = run_queries(ann, queries)
+                recall = statistics.mean(len(found & truth) / TOP_K for found, truth in zip(results, ground_truth))
+                print(f"nprobe={nprobe:<3} refine={refine_factor}  recall={recall:7.2%}  "
+                      f"p50={statistics.median(latencies):7.2f}ms")
+
+if __name__ == "__main__":
+    main()
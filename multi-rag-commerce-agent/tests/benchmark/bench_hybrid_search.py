@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+混合检索基准测试脚本
+在 data/faq.json 与 data/products.json 上对比 vector / keyword / hybrid 三种检索模式的召回率与延迟
+
+- 精确名称查询：每条数据的标题（商品名、型号）
+- 自然语言查询：人工标注的常见问题
+向量使用离线的哈希向量后端，结果可复现。
+
+用法: python tests/benchmark/bench_hybrid_search.py [轮数]
+"""
+
+import sys
+import time
+import tempfile
+import statistics
+from pathlib import Path
+
+# 添加项目根目录和测试目录到Python路径
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+sys.path.insert(0, str(project_root / "tests"))
+
+from app.config import settings
+from app.models.knowledge import SearchRequest
+from app.services.rag_service import RAGService
+from app.services.embedding_service import HashingEmbeddingBackend
+from test_rag_service import load_sample_items
+
+# (查询, 期望来源)
+NATURAL_QUERIES = [
+    ("退货政策是什么？", "faq_002"),
+    ("可以用什么方式付款？", "faq_003"),
+    ("配送到德国要多久？", "faq_011"),
+    ("怎么联系客服？", "faq_005"),
+    ("有没有库存？", "faq_015"),
+    ("How do I return an item?", "faq_007"),
+    ("Which payment methods do you accept?", "faq_008"),
+    ("Do you ship to Germany?", "faq_012"),
+    ("What is the warranty period?", "faq_009"),
+    ("智能手表续航多久？", "product_001"),
+    ("降噪耳机", "product_002"),
+    ("heart rate monitoring watch", "product_003"),
+    ("noise cancelling earbuds battery", "product_004"),
+    ("充电宝容量", "product_005"),
+    ("power bank capacity", "product_006"),
+]
+
+# 中英混合查询 (查询, 期望来源)：每条有中文与英文两条相关数据
+MIXED_QUERIES = [
+    ("智能手表有什么功能？What features does the smart watch have?", ("product_001", "product_003")),
+    ("退货政策是什么？How do I return an item?", ("faq_002", "faq_007")),
+    ("充电宝容量多大？How big is the power bank?", ("product_005", "product_006")),
+    ("可以用什么方式付款？Which payment methods do you accept?", ("faq_003", "faq_008")),
+    ("配送到德国要多久？Do you ship to Germany?", ("faq_011", "faq_012")),
+    ("降噪耳机续航多久？How long does the earbuds battery last?", ("product_002", "product_004")),
+]
+
+def mixed_recall(service: RAGService, mode: str, multi_query: bool, top_k: int) -> float:
+    """混合语言查询的召回率（命中的相关数据占比）"""
+    settings.RETRIEVAL_MODE = mode
+    original_multi_query = settings.MULTI_QUERY_RETRIEVAL
+    settings.MULTI_QUERY_RETRIEVAL = multi_query
+    found = 0
+    for query, expected_sources in MIXED_QUERIES:
+        service.search_cache.clear()
+        sources = {result.source for result in service.search(SearchRequest(query=query, top_k=top_k)).results}
+        found += len(sources & set(expected_sources))
+    settings.MULTI_QUERY_RETRIEVAL = original_multi_query
+    return found / sum(len(expected_sources) for _, expected_sources in MIXED_QUERIES)
+
+def run_mode(service: RAGService, mode: str, queries: list, top_k: int, rounds: int):
+    """返回 (recall@1, recall@k, 单次延迟列表ms)"""
+    settings.RETRIEVAL_MODE = mode
+    hits_at_1 = hits_at_k = 0
+    latencies = []
+    for round_index in range(rounds):
+        for query, expected_source in queries:
+            service.search_cache.clear()
+            start_time = time.perf_counter()
+            response = service.search(SearchRequest(query=query, top_k=top_k))
+            latencies.append((time.perf_counter() - start_time) * 1000)
+            if round_index == 0:
+                sources = [result.source for result in response.results]
+                hits_at_1 += sources[:1] == [expected_source]
+                hits_at_k += expected_source in sources
+    return hits_at_1 / len(queries), hits_at_k / len(queries), latencies
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    top_k = 3
+    items = load_sample_items()
+    title_queries = [(item.title, item.id) for item in items]
+
+    with tempfile.TemporaryDirectory() as persist_directory:
+        service = RAGService(
+            embedding_backend=HashingEmbeddingBackend(),
+            persist_directory=persist_directory,
+            collection_name="bench_hybrid"
+        )
+        service.add_knowledge(items)
+
+        print("=" * 72)
+        print(f"混合检索基准测试（{len(items)} 条数据, top_k={top_k}, {rounds} 轮, "
+              f"向量模型 {service.embedding_backend.model_name}）")
+        print("=" * 72)
+        for name, queries in (("精确名称", title_queries), ("自然语言", NATURAL_QUERIES)):
+            print(f"\n{name}查询（{len(queries)} 条）")
+            for mode in ("vector", "keyword", "hybrid"):
+                recall_1, recall_k, latencies = run_mode(service, mode, queries, top_k, rounds)
+                print(f"  {mode:<8} recall@1={recall_1:.2%}  recall@{top_k}={recall_k:.2%}  "
+                      f"p50={statistics.median(latencies):.2f}ms  "
+                      f"p95={statistics.quantiles(latencies, n=20)[-1]:.2f}ms")
+
+        print(f"\n中英混合查询（{len(MIXED_QUERIES)} 条，MULTI_QUERY_RETRIEVAL 关闭 -> 开启）")
+        for mode in ("vector", "hybrid"):
+            recalls = [
+                f"recall@{k}={mixed_recall(service, mode, False, k):.2%} -> {mixed_recall(service, mode, True, k):.2%}"
+                for k in (2, top_k)
+            ]
+            print(f"  {mode:<8} " + "  ".join(recalls))
+
+if __name__ == "__main__":
+    main()
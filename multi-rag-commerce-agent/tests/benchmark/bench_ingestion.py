@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+流式入库基准测试脚本
+对比一次性加载（json.load + add_knowledge）与流式管道在不同数据量下的内存峰值与吞吐
+每种方式在独立的子进程中运行，内存峰值取进程的最大常驻内存（ru_maxrss）。
+
+使用哈希向量后端与 numpy 向量存储（向量写入内存映射文件），检索模式设为 vector，
+以排除常驻内存的BM25索引（其大小本身与知识库规模成正比）。
+
+用法: python tests/benchmark/bench_ingestion.py [记录数列表，默认 10000,50000,200000]
+"""
+
+import sys
+import json
+import time
+import tempfile
+import resource
+import subprocess
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.config import settings
+from app.services.rag_service import RAGService
+from app.services.vector_store import NumpyVectorStore
+from app.services.embedding_service import HashingEmbeddingBackend
+from app.services.ingestion import ingest_files, iter_file_items
+
+def write_feed(path: Path, count: int):
+    """生成JSON数组格式的商品数据"""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("[\n")
+        for i in range(count):
+            record = {
+                "id": f"product_{i}",
+                "title": f"商品 {i}",
+                "content": f"商品 {i} 支持快速配送与30天无理由退货。" * 4,
+                "category": "product",
+                "language": "zh" if i % 2 else "en",
+                "metadata": {"price": i % 500, "brand": f"brand_{i % 50}"}
+            }
+            f.write(("," if i else "") + json.dumps(record, ensure_ascii=False) + "\n")
+        f.write("]\n")
+
+def create_service(directory: str) -> RAGService:
+    return RAGService(
+        embedding_backend=HashingEmbeddingBackend(dimension=128),
+        persist_directory=directory,
+        vector_store=NumpyVectorStore(str(Path(directory) / "vectors"))
+    )
+
+def run(mode: str, feed: str, directory: str) -> dict:
+    """在当前（子）进程中执行一种入库方式"""
+    settings.RETRIEVAL_MODE = "vector"
+    settings.EMBEDDING_CACHE_ENABLED = False
+    service = create_service(directory)
+    start_time = time.perf_counter()
+    if mode == "load_all":
+        service.add_knowledge(list(iter_file_items([feed])))
+    else:
+        ingest_files([feed], service=service, progress_interval=0)
+    return {
+        "elapsed_s": time.perf_counter() - start_time,
+        "chunks": service.vector_store.count(),
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    }
+
+def main():
+    counts = [int(count) for count in (sys.argv[1] if len(sys.argv) > 1 else "10000,50000,200000").split(",")]
+
+    print("=" * 70)
+    print("流式入库基准测试")
+    print("=" * 70)
+    for count in counts:
+        with tempfile.TemporaryDirectory() as directory:
+            feed = Path(directory) / "feed.json"
+            write_feed(feed, count)
+            print(f"\n{count} 条记录（文件 {feed.stat().st_size / 2**20:.1f}MB）")
+            for mode, label in (("load_all", "一次加载"), ("streaming", "流式")):
+                output = subprocess.run(
+                    [sys.executable, __file__, "--run", mode, str(feed), str(Path(directory) / mode)],
+                    capture_output=True, text=True, check=True
+                ).stdout
+                result = json.loads(output.strip().splitlines()[-1])
+                print(f"  {label:<8} 峰值内存 {result['max_rss_mb']:8.1f}MB  耗时 {result['elapsed_s']:7.1f}s  "
+                      f"{result['chunks'] / result['elapsed_s']:8.0f} 分块/秒")
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--run":
+        print(json.dumps(run(sys.argv[2], sys.argv[3], sys.argv[4])))
+    else:
+        main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+意图识别基准测试脚本
+基于 tests/test_intent_detection.py 中的用例，对比各意图引擎的准确率与延迟
+
+- keywords:   关键词匹配
+- classifier: 本地字符n-gram分类器
+- hybrid:     本地分类器 + 低置信度时调用LLM（LLM用固定延迟的假模型模拟，返回标注答案）
+
+用法: python tests/benchmark/bench_intent.py [模拟LLM延迟ms]
+"""
+
+import sys
+import time
+import statistics
+from pathlib import Path
+
+# 添加项目根目录和测试目录到Python路径
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+sys.path.insert(0, str(project_root / "tests"))
+
+from langchain.schema import AIMessage
+from app.config import settings
+from app.services.agent_service import agent_service
+from test_intent_detection import INTENT_TEST_CASES
+
+class OracleLLM:
+    """返回标注答案的假LLM，用于估算混合模式的延迟"""
+
+    def __init__(self, labels: dict, delay_ms: float):
+        self.labels = labels
+        self.delay_ms = delay_ms
+        self.calls = 0
+
+    def __call__(self, messages):
+        self.calls += 1
+        time.sleep(self.delay_ms / 1000)
+        prompt = messages[-1].content
+        for message, intent in self.labels.items():
+            if f"用户消息：{message}\n" in prompt:
+                return AIMessage(content=intent)
+        return AIMessage(content="business")
+
+def run_engine(engine: str, rounds: int = 20):
+    """运行指定引擎，返回(准确率, 单次延迟列表ms)"""
+    settings.INTENT_ENGINE = engine
+    latencies = []
+    correct = 0
+
+    for round_index in range(rounds):
+        for message, expected_intent in INTENT_TEST_CASES:
+            start_time = time.perf_counter()
+            detected_intent = agent_service._detect_intent(message)
+            latencies.append((time.perf_counter() - start_time) * 1000)
+            if round_index == 0:
+                correct += detected_intent == expected_intent
+
+    return correct / len(INTENT_TEST_CASES), latencies
+
+def main():
+    llm_delay_ms = float(sys.argv[1]) if len(sys.argv) > 1 else 300.0
+    oracle = OracleLLM(dict(INTENT_TEST_CASES), llm_delay_ms)
+    agent_service.llm = oracle
+
+    print("=" * 60)
+    print(f"意图识别基准测试（{len(INTENT_TEST_CASES)} 条用例，"
+          f"置信度阈值 {settings.INTENT_CONFIDENCE_THRESHOLD}，模拟LLM延迟 {llm_delay_ms:.0f}ms）")
+    print("=" * 60)
+
+    for engine in ("keywords", "classifier", "hybrid"):
+        oracle.calls = 0
+        rounds = 1 if engine == "hybrid" else 20
+        accuracy, latencies = run_engine(engine, rounds)
+        print(f"{engine:<10} 准确率={accuracy:.2%}  "
+              f"p50={statistics.median(latencies):.3f}ms  "
+              f"mean={statistics.mean(latencies):.3f}ms  "
+              f"LLM调用={oracle.calls}/{len(latencies)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+对话历史存储微基准测试脚本
+对比改动前的存储方式（每条消息一个pydantic Message，写满后切片复制列表）与
+环形缓冲区（__slots__ 消息记录 + deque(maxlen)，写满后原地丢弃最旧的消息）：
+- 追加吞吐（条/秒），历史写满后每次追加都需要丢弃最旧的消息
+- 每个会话占用的字节数（tracemalloc，包含消息文本）
+
+用法: python tests/benchmark/bench_memory_ring_buffer.py [会话数，默认 10000] [每个会话的消息数，默认 30]
+"""
+
+import sys
+import gc
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.config import settings
+from app.models.chat import Message, ConversationHistory
+from app.services.memory_service import MemoryService
+from app.services.memory_store import InMemoryStore
+
+class ListHistory:
+    """改动前的进程内存储方式"""
+
+    def __init__(self):
+        self.conversations = {}
+
+    def add_message(self, session_id, user_id, role, content, language=None):
+        if session_id not in self.conversations:
+            self.conversations[session_id] = ConversationHistory(session_id=session_id, user_id=user_id, messages=[])
+        self.conversations[session_id].messages.append(Message(role=role, content=content, language=language))
+        self.conversations[session_id].updated_at = datetime.now()
+        messages = self.conversations[session_id].messages
+        if len(messages) > settings.MAX_HISTORY_LENGTH:
+            self.conversations[session_id].messages = messages[-settings.MAX_HISTORY_LENGTH:]
+        return True
+
+def fill(memory, session_count: int, message_count: int, contents: list):
+    for turn in range(message_count):
+        role = "user" if turn % 2 == 0 else "assistant"
+        content = contents[turn]
+        for i in range(session_count):
+            memory.add_message(f"session_{i}", "user_1", role, content, "zh")
+
+def run(name: str, factory, session_count: int, message_count: int, contents: list):
+    memory = factory()
+    start_time = time.perf_counter()
+    fill(memory, session_count, message_count, contents)
+    elapsed = time.perf_counter() - start_time
+
+    del memory
+    gc.collect()
+    tracemalloc.start()
+    memory = factory()
+    fill(memory, session_count, message_count, contents)
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    print(f"  {name:<12} 追加 {session_count * message_count / elapsed:9.0f} 条/秒  每个会话 {used / session_count:8.0f} 字节")
+
+def main():
+    session_count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    message_count = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+    settings.MAX_HISTORY_LENGTH = 10
+    # 消息文本在各轮次之间共享，字节数主要反映每条消息的存储开销
+    contents = [f"第{turn}轮：请问这个商品的配送时间和退货政策是什么？" for turn in range(message_count)]
+
+    print("=" * 70)
+    print(f"对话历史微基准测试: {session_count} 个会话 x {message_count} 条消息（保留最新 {settings.MAX_HISTORY_LENGTH} 条）")
+    print("=" * 70)
+    run("pydantic列表", ListHistory, session_count, message_count, contents)
+    run("环形缓冲区", lambda: MemoryService(store=InMemoryStore()), session_count, message_count, contents)
+
+if __name__ == "__main__":
+    main()
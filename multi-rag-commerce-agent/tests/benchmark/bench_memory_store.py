@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+记忆存储后端基准测试脚本
+在进程内、SQLite与Redis后端上写入N个并发会话（每个会话交替追加消息），
+统计追加吞吐（开始与结束阶段分别统计，验证追加耗时不随会话数/历史长度增长）、读取历史延迟与统计接口耗时。
+
+未指定 --redis-url 时Redis后端连接测试用的本地Redis协议模拟服务器（Python实现，吞吐受模拟服务器限制）。
+
+用法: python tests/benchmark/bench_memory_store.py [会话数，默认 100000] [--redis-url=redis://localhost:6379/15]
+"""
+
+import sys
+import time
+import random
+import tempfile
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.config import settings
+from app.services.memory_service import MemoryService
+from app.services.memory_store import InMemoryStore, SQLiteMemoryStore, RedisMemoryStore
+from tests.test_memory_store import FakeRedisServer
+
+MESSAGES_PER_SESSION = 4
+
+def run(name: str, store, session_count: int):
+    service = MemoryService(store=store)
+    total = session_count * MESSAGES_PER_SESSION
+    window = max(1, total // 10)
+    rates = []
+
+    start_time = time.perf_counter()
+    window_start = start_time
+    appended = 0
+    # 按轮次交替写入所有会话，模拟同时进行的对话
+    for turn in range(MESSAGES_PER_SESSION):
+        role = "user" if turn % 2 == 0 else "assistant"
+        for i in range(session_count):
+            service.add_message(f"session_{i}", f"user_{i % 5000}", role,
+                                f"第{turn}轮：请问商品 {i} 的配送时间和退货政策？", "zh")
+            appended += 1
+            if appended % window == 0:
+                now = time.perf_counter()
+                rates.append(window / (now - window_start))
+                window_start = now
+    elapsed = time.perf_counter() - start_time
+
+    sample = random.Random(0).sample(range(session_count), min(1000, session_count))
+    read_start = time.perf_counter()
+    for i in sample:
+        assert len(service.get_conversation_history(f"session_{i}", limit=5)) == MESSAGES_PER_SESSION
+    read_ms = (time.perf_counter() - read_start) * 1000 / len(sample)
+
+    stats_start = time.perf_counter()
+    stats = service.get_memory_stats()
+    stats_ms = (time.perf_counter() - stats_start) * 1000
+    assert stats["total_conversations"] == session_count and stats["total_messages"] == total
+
+    print(f"  {name:<8} 追加 {total / elapsed:9.0f} 条/秒（开始 {rates[0]:9.0f}，结束 {rates[-1]:9.0f}）  "
+          f"读取 {read_ms:6.3f}ms/次  统计 {stats_ms:8.1f}ms")
+
+def main():
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--redis-url")]
+    session_count = int(args[0]) if args else 100000
+    redis_url = next((arg.split("=", 1)[1] for arg in sys.argv[1:] if arg.startswith("--redis-url=")), None)
+    settings.MAX_HISTORY_LENGTH = 10
+
+    print("=" * 70)
+    print(f"记忆存储基准测试: {session_count} 个会话 x {MESSAGES_PER_SESSION} 条消息")
+    print("=" * 70)
+
+    run("memory", InMemoryStore(), session_count)
+    with tempfile.TemporaryDirectory() as directory:
+        store = SQLiteMemoryStore(str(Path(directory) / "memory.db"))
+        run("sqlite", store, session_count)
+        store.close()
+
+    server = None
+    if redis_url is None:
+        server = FakeRedisServer()
+        redis_url = server.url
+    try:
+        store = RedisMemoryStore(url=redis_url, prefix=f"bench:{time.time()}:")
+        run("redis", store, session_count)
+        store.close()
+    finally:
+        if server:
+            server.shutdown()
+            server.server_close()
+
+if __name__ == "__main__":
+    main()
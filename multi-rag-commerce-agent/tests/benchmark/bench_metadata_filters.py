@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+元数据过滤基准测试脚本
+对比 numpy 向量存储在检索前过滤（元数据索引确定候选行后只对候选行打分）
+与检索后过滤（无过滤检索更多候选后在结果上逐条判断）的查询延迟与结果数量。
+
+元数据模拟50个品牌、0-1000的价格和20种特性（每个商品3种）。
+
+用法: python tests/benchmark/bench_metadata_filters.py [规模，默认 100000] [向量维度，默认384]
+"""
+
+import sys
+import time
+import tempfile
+import statistics
+from pathlib import Path
+
+import numpy as np
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.services.vector_store import NumpyVectorStore
+from app.utils.metadata_filter import metadata_matches, join_multi_value
+
+FEATURES = [f"feature_{i}" for i in range(20)]
+QUERY_COUNT = 50
+TOP_K = 10
+POST_FILTER_MULTIPLIER = 10
+BATCH_SIZE = 5000
+
+FILTERS = {
+    "无过滤": None,
+    "品牌 (2%)": {"brand": "brand_7"},
+    "价格区间 (10%)": {"price": {"$gte": 200, "$lte": 300}},
+    "特性包含 (15%)": {"features": {"$contains": "feature_3"}},
+    "品牌+价格 (0.2%)": {"brand": "brand_7", "price": {"$gte": 200, "$lte": 300}}
+}
+
+def build(store: NumpyVectorStore, size: int, dimension: int):
+    rng = np.random.default_rng(0)
+    for start in range(0, size, BATCH_SIZE):
+        count = min(BATCH_SIZE, size - start)
+        vectors = rng.standard_normal((count, dimension), dtype=np.float32)
+        ids = [f"doc_{start + i}" for i in range(count)]
+        metadatas = [
+            {
+                "category": "product",
+                "language": "zh",
+                "brand": f"brand_{(start + i) % 50}",
+                "price": float(rng.integers(0, 1000)),
+                "features": join_multi_value(list(rng.choice(FEATURES, 3, replace=False)))
+            }
+            for i in range(count)
+        ]
+        store.add(ids, ids, vectors.tolist(), metadatas)
+
+def timed(function) -> tuple:
+    start_time = time.perf_counter()
+    result = function()
+    return (time.perf_counter() - start_time) * 1000, result
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    dimension = int(sys.argv[2]) if len(sys.argv) > 2 else 384
+    queries = np.random.default_rng(1).standard_normal((QUERY_COUNT, dimension), dtype=np.float32).tolist()
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = NumpyVectorStore(directory)
+        build(store, size, dimension)
+
+        print("=" * 86)
+        print(f"元数据过滤基准测试: {size} 条向量, {dimension} 维, top_k={TOP_K}, "
+              f"检索后过滤召回 {TOP_K * POST_FILTER_MULTIPLIER} 条")
+        print("=" * 86)
+        print(f"{'过滤条件':<18} {'检索前过滤 p50':>14} {'p95':>8} {'结果数':>6}   "
+              f"{'检索后过滤 p50':>14} {'p95':>8} {'结果数':>6}")
+        for name, where in FILTERS.items():
+            # 预热位掩码与排序数组缓存（写入后首次查询时构建）
+            store.query([queries[0]], n_results=TOP_K, where=where)
+            pre, post = [], []
+            pre_counts, post_counts = [], []
+            for query in queries:
+                elapsed, results = timed(lambda: store.query([query], n_results=TOP_K, where=where))
+                pre.append(elapsed)
+                pre_counts.append(len(results["ids"][0]))
+
+                def post_filter():
+                    results = store.query([query], n_results=TOP_K * POST_FILTER_MULTIPLIER)
+                    return [doc_id for doc_id, metadata in zip(results["ids"][0], results["metadatas"][0])
+                            if metadata_matches(metadata, where)][:TOP_K]
+                elapsed, kept = timed(post_filter)
+                post.append(elapsed)
+                post_counts.append(len(kept))
+
+            def percentile(values, q):
+                return statistics.quantiles(values, n=100)[q - 1]
+            print(f"{name:<18} {statistics.median(pre):>12.2f}ms {percentile(pre, 95):>6.2f}ms "
+                  f"{statistics.mean(pre_counts):>6.1f}   {statistics.median(post):>12.2f}ms "
+                  f"{percentile(post, 95):>6.2f}ms {statistics.mean(post_counts):>6.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+并行入库基准测试脚本
+对比不同的分块进程数与向量计算并发批次数下各阶段的吞吐（分块/秒）。
+
+向量后端为哈希向量加上每批固定延迟，模拟远程向量接口（OpenAI/Ollama）的网络往返；
+分块进程池的加速取决于机器的CPU核数。
+
+用法: python tests/benchmark/bench_parallel_ingestion.py [记录数，默认 5000] [每批延迟毫秒，默认 200]
+"""
+
+import os
+import sys
+import time
+import tempfile
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.config import settings
+from app.models.knowledge import KnowledgeItem
+from app.services.rag_service import RAGService
+from app.services.vector_store import NumpyVectorStore
+from app.services.embedding_service import HashingEmbeddingBackend
+from app.services.ingestion import IngestionPipeline
+
+class RemoteLikeEmbeddingBackend(HashingEmbeddingBackend):
+    """每批增加固定延迟的哈希向量后端"""
+
+    def __init__(self, delay: float):
+        super().__init__(dimension=128)
+        self.delay = delay
+
+    def embed_documents(self, texts):
+        time.sleep(self.delay)
+        return super().embed_documents(texts)
+
+def generate_items(count: int):
+    for i in range(count):
+        yield KnowledgeItem(
+            id=f"product_{i}",
+            title=f"商品 {i}",
+            content=f"商品 {i} 支持快速配送与30天无理由退货。售后服务说明。" * (2 + i % 30),
+            category="product",
+            language="zh"
+        )
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    delay = (float(sys.argv[2]) if len(sys.argv) > 2 else 200) / 1000
+    settings.RETRIEVAL_MODE = "vector"
+    settings.EMBEDDING_CACHE_ENABLED = False
+    cpu_count = os.cpu_count() or 1
+    configurations = [(1, 1), (1, 4), (cpu_count, 4), (cpu_count, 8)]
+
+    print("=" * 90)
+    print(f"并行入库基准测试: {count} 条记录, 每批向量延迟 {delay * 1000:.0f}ms, CPU {cpu_count} 核")
+    print("=" * 90)
+    print(f"{'分块进程':>8} {'向量并发':>8} {'分块数':>8} {'耗时(s)':>8} {'总吞吐':>10} {'分块':>10} {'向量':>10} {'写入':>10}")
+    for split_workers, embed_concurrency in configurations:
+        with tempfile.TemporaryDirectory() as directory:
+            service = RAGService(
+                embedding_backend=RemoteLikeEmbeddingBackend(delay),
+                persist_directory=directory,
+                vector_store=NumpyVectorStore(str(Path(directory) / "vectors"))
+            )
+            stats = IngestionPipeline(
+                service=service, progress_interval=0,
+                split_workers=split_workers, embed_concurrency=embed_concurrency
+            ).run(generate_items(count))
+            rates = stats["stage_chunks_per_s"]
+            print(f"{split_workers:>8} {embed_concurrency:>8} {stats['chunks_written']:>8} {stats['elapsed_s']:>8.1f} "
+                  f"{stats['chunks_per_s']:>10.0f} {rates['split']:>10.0f} {rates['embed']:>10.0f} {rates['write']:>10.0f}")
+    print("\n各阶段吞吐 = 该阶段处理的分块数 / 该阶段累计耗时（并发阶段为所有工作线程耗时之和）")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+重排序精度基准测试脚本
+在示例FAQ与商品数据上，用一组带标注的查询比较重排序前后的 precision@1、recall@k、MRR 与额外延迟。
+
+每个查询标注了相关的知识条目（source_id）；使用确定性的哈希向量后端，结果可复现。
+分别在 vector 与 hybrid 两种检索模式下评估。
+
+用法: python tests/benchmark/bench_rerank.py [k，默认 3]
+"""
+
+import sys
+import time
+import tempfile
+import statistics
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.config import settings
+from app.models.knowledge import SearchRequest
+from app.services.rag_service import RAGService
+from app.services.embedding_service import HashingEmbeddingBackend
+from app.services.ingestion import iter_file_items
+
+# (查询, 相关的 source_id)
+LABELLED_QUERIES = [
+    ("退货政策是什么？", {"faq_002"}),
+    ("怎么退货退款", {"faq_002"}),
+    ("支持哪些支付方式？可以用支付宝吗", {"faq_003"}),
+    ("发货需要多长时间", {"faq_001", "faq_011"}),
+    ("可以寄到德国吗", {"faq_011"}),
+    ("客服电话是多少", {"faq_005"}),
+    ("商品有质量问题怎么办", {"faq_004"}),
+    ("智能手表能监测心率吗", {"product_001"}),
+    ("降噪蓝牙耳机续航多久", {"product_002"}),
+    ("充电宝容量多大", {"product_005"}),
+    ("怎么查询库存", {"faq_015"}),
+    ("What is your return policy?", {"faq_007"}),
+    ("Which payment methods do you accept?", {"faq_008"}),
+    ("Do you ship to Germany?", {"faq_012"}),
+    ("How long is the warranty?", {"faq_009"}),
+    ("How can I contact customer service?", {"faq_010"}),
+    ("Does the smart watch track fitness?", {"product_003"}),
+    ("noise cancelling earbuds battery life", {"product_004"}),
+    ("power bank capacity 20000mAh", {"product_006"}),
+    ("How do I use the product?", {"faq_014"}),
+]
+
+def evaluate(service: RAGService, rerank: bool, k: int) -> dict:
+    precisions, recalls, reciprocal_ranks, latencies = [], [], [], []
+    for query, relevant in LABELLED_QUERIES:
+        start_time = time.perf_counter()
+        response = service.search(SearchRequest(query=query, top_k=k, rerank=rerank))
+        latencies.append((time.perf_counter() - start_time) * 1000)
+        # 同一条目的多个分块只计一次
+        sources = list(dict.fromkeys(result.source for result in response.results))
+        precisions.append(1.0 if sources[:1] and sources[0] in relevant else 0.0)
+        recalls.append(len(set(sources[:k]) & relevant) / len(relevant))
+        rank = next((i + 1 for i, source in enumerate(sources) if source in relevant), None)
+        reciprocal_ranks.append(1.0 / rank if rank else 0.0)
+    return {
+        "precision": statistics.mean(precisions),
+        "recall": statistics.mean(recalls),
+        "mrr": statistics.mean(reciprocal_ranks),
+        "latency_ms": statistics.median(latencies)
+    }
+
+def main():
+    k = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    settings.RAG_CACHE_ENABLED = False
+    settings.RERANK_LATENCY_BUDGET_MS = 10000
+    data_dir = project_root / "data"
+    items = list(iter_file_items([data_dir / "faq.json", data_dir / "products.json"]))
+
+    print("=" * 78)
+    print(f"重排序精度: {len(LABELLED_QUERIES)} 个标注查询, 召回 {settings.RERANK_TOP_N} 个候选, "
+          f"重排序器 {settings.RERANKER}, k={k}")
+    print("=" * 78)
+    print(f"{'检索模式':<8} {'重排序':<6} {'precision@1':>12} {'recall@k':>10} {'MRR':>8} {'延迟p50':>10}")
+    for mode in ("vector", "hybrid"):
+        settings.RETRIEVAL_MODE = mode
+        with tempfile.TemporaryDirectory() as directory:
+            service = RAGService(
+                embedding_backend=HashingEmbeddingBackend(dimension=384),
+                persist_directory=directory,
+                collection_name="bench_rerank"
+            )
+            service.add_knowledge(items)
+            for rerank in (False, True):
+                result = evaluate(service, rerank, k)
+                print(f"{mode:<10} {'是' if rerank else '否':<8} {result['precision']:>10.3f} "
+                      f"{result['recall']:>10.3f} {result['mrr']:>8.3f} {result['latency_ms']:>8.2f}ms")
+
+if __name__ == "__main__":
+    main()
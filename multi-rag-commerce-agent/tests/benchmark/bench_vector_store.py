@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+向量存储基准测试脚本
+对比 chroma 与 numpy 两种向量存储在不同规模下的查询延迟、内存占用与冷启动时间
+
+- 冷启动：新进程中打开存储并完成第一次查询的时间
+- 内存：新进程完成查询后的常驻内存增量（RSS）与磁盘占用
+- 查询延迟：无过滤 / 语言过滤 两种情况下单次查询的 p50 / p95
+向量为随机生成的归一化向量，元数据模拟6个分类、2种语言。
+
+用法: python tests/benchmark/bench_vector_store.py [规模列表，默认 10000,100000,1000000] [向量维度，默认384]
+"""
+
+import os
+import sys
+import json
+import time
+import tempfile
+import subprocess
+import statistics
+from pathlib import Path
+
+import numpy as np
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.services.vector_store import ChromaVectorStore, NumpyVectorStore
+
+CATEGORIES = ["product", "shipping", "policy", "payment", "quality", "service"]
+LANGUAGES = ["zh", "en"]
+QUERY_COUNT = 50
+BATCH_SIZE = 5000
+
+def open_store(backend: str, directory: str):
+    if backend == "chroma":
+        return ChromaVectorStore(directory, "bench_vectors")
+    return NumpyVectorStore(directory)
+
+def rss_mb() -> float:
+    """当前进程的常驻内存（MB）"""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+def directory_size_mb(directory: str) -> float:
+    return sum(path.stat().st_size for path in Path(directory).rglob("*") if path.is_file()) / 1024 / 1024
+
+def build(backend: str, directory: str, size: int, dimension: int) -> float:
+    """写入 size 条随机向量，返回耗时（秒）"""
+    rng = np.random.default_rng(0)
+    store = open_store(backend, directory)
+    start_time = time.perf_counter()
+    for start in range(0, size, BATCH_SIZE):
+        count = min(BATCH_SIZE, size - start)
+        vectors = rng.standard_normal((count, dimension), dtype=np.float32)
+        ids = [f"doc_{start + i}" for i in range(count)]
+        metadatas = [
+            {"source_id": f"doc_{start + i}", "category": CATEGORIES[(start + i) % 6], "language": LANGUAGES[(start + i) % 2]}
+            for i in range(count)
+        ]
+        store.add(ids, [f"文档 {doc_id}" for doc_id in ids], vectors.tolist(), metadatas)
+    store.close()
+    return time.perf_counter() - start_time
+
+def measure(backend: str, directory: str, dimension: int) -> dict:
+    """在当前（新）进程中测量冷启动、查询延迟与内存"""
+    base_rss = rss_mb()
+    queries = np.random.default_rng(1).standard_normal((QUERY_COUNT, dimension), dtype=np.float32).tolist()
+
+    start_time = time.perf_counter()
+    store = open_store(backend, directory)
+    store.query([queries[0]], n_results=5)
+    cold_start = time.perf_counter() - start_time
+
+    latencies = {"none": [], "language": []}
+    for query in queries:
+        for name, where in (("none", None), ("language", {"language": "en"})):
+            start_time = time.perf_counter()
+            store.query([query], n_results=5, where=where)
+            latencies[name].append((time.perf_counter() - start_time) * 1000)
+
+    return {
+        "cold_start_s": cold_start,
+        "rss_mb": rss_mb() - base_rss,
+        "p50_ms": statistics.median(latencies["none"]),
+        "p95_ms": statistics.quantiles(latencies["none"], n=20)[-1],
+        "filtered_p50_ms": statistics.median(latencies["language"]),
+    }
+
+def main():
+    sizes = [int(size) for size in (sys.argv[1] if len(sys.argv) > 1 else "10000,100000,1000000").split(",")]
+    dimension = int(sys.argv[2]) if len(sys.argv) > 2 else 384
+
+    print("=" * 100)
+    print(f"向量存储基准测试（维度 {dimension}，每种情况 {QUERY_COUNT} 次查询，top_k=5）")
+    print("=" * 100)
+    print(f"{'规模':>9} {'后端':<7} {'写入(s)':>9} {'冷启动(s)':>10} {'RSS(MB)':>9} {'磁盘(MB)':>9} "
+          f"{'p50(ms)':>9} {'p95(ms)':>9} {'过滤p50(ms)':>12}")
+
+    for size in sizes:
+        for backend in ("chroma", "numpy"):
+            with tempfile.TemporaryDirectory() as directory:
+                build_time = build(backend, directory, size, dimension)
+                # 在新进程中测量，排除写入阶段的缓存与内存占用
+                output = subprocess.run(
+                    [sys.executable, __file__, "--measure", backend, directory, str(dimension)],
+                    capture_output=True, text=True, check=True
+                ).stdout
+                result = json.loads(output.strip().splitlines()[-1])
+                print(f"{size:>9} {backend:<7} {build_time:>9.1f} {result['cold_start_s']:>10.3f} "
+                      f"{result['rss_mb']:>9.1f} {directory_size_mb(directory):>9.1f} "
+                      f"{result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} {result['filtered_p50_ms']:>12.2f}")
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--measure":
+        print(json.dumps(measure(sys.argv[2], sys.argv[3], int(sys.argv[4]))))
+    else:
+        main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+语义回答缓存测试脚本
+"""
+
+import sys
+import time
+import asyncio
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from langchain.schema import AIMessage
+from app.config import settings
+from app.models.chat import ChatRequest
+from app.services.agent_service import agent_service
+from app.services.rag_service import rag_service
+from app.services.answer_cache import SemanticAnswerCache, answer_cache
+from app.services.embedding_service import HashingEmbeddingBackend
+
+backend = HashingEmbeddingBackend(dimension=256)
+
+class CountingLLM:
+    """统计回答生成次数的假LLM"""
+
+    def __init__(self):
+        self.generations = 0
+
+    async def ainvoke(self, messages):
+        if "只返回" in messages[-1].content:
+            return AIMessage(content="business")
+        self.generations += 1
+        return AIMessage(content=f"回答#{self.generations}")
+
+def fake_context(query: str, top_k: int = 5) -> str:
+    """固定返回退货政策来源的检索结果"""
+    return "内容: 我们提供30天无理由退货服务。\n来源: faq_002"
+
+def test_semantic_answer_cache():
+    """测试相似度阈值、来源匹配、容量与过期"""
+    cache = SemanticAnswerCache(max_entries=2, similarity_threshold=0.8, ttl=0.2)
+    question = "退货政策是什么？"
+    cache.store(backend.embed_query(question), question, "30天无理由退货", "zh", ["faq_002"])
+
+    hit = cache.lookup(backend.embed_query("退货政策是什么"), "zh", ["faq_002"])
+    print(f"相近问题: {hit}")
+    assert hit and hit["answer"] == "30天无理由退货"
+
+    # 语言或来源不同、问题不相近时不命中
+    assert cache.lookup(backend.embed_query(question), "en", ["faq_002"]) is None
+    assert cache.lookup(backend.embed_query(question), "zh", ["faq_001"]) is None
+    assert cache.lookup(backend.embed_query("智能手表续航多久？"), "zh", ["faq_002"]) is None
+
+    # 超出容量时淘汰最久未使用的条目
+    for text in ("配送要多久？", "支持哪些支付方式？"):
+        cache.store(backend.embed_query(text), text, "回答", "zh", ["faq_002"])
+    assert cache.get_stats()["evictions"] == 1
+    assert cache.lookup(backend.embed_query(question), "zh", ["faq_002"]) is None
+
+    # 过期后不命中
+    time.sleep(0.25)
+    assert cache.lookup(backend.embed_query("配送要多久？"), "zh", ["faq_002"]) is None
+    print(f"缓存统计: {cache.get_stats()}")
+
+def test_answer_cache_skips_llm_and_invalidates_on_reload():
+    """测试重复问题跳过LLM生成，知识库变化后缓存失效"""
+    original_llm = agent_service.llm
+    original_context = rag_service.get_relevant_context
+    original_embed = rag_service.embed_query
+    original_enabled = settings.ANSWER_CACHE_ENABLED
+
+    llm = CountingLLM()
+    agent_service.llm = llm
+    rag_service.get_relevant_context = fake_context
+    rag_service.embed_query = backend.embed_query
+    settings.ANSWER_CACHE_ENABLED = True
+    answer_cache.invalidate()
+
+    def ask(message: str):
+        return agent_service.process_chat(ChatRequest(
+            message=message,
+            session_id="answer_cache_session",
+            user_id="answer_cache_user"
+        ))
+
+    try:
+        first = ask("退货政策是什么？")
+        second = ask("退货政策是什么?")
+        print(f"首次: {first.response} {first.metadata['answer_cache']}")
+        print(f"再次: {second.response} {second.metadata['answer_cache']}")
+
+        assert llm.generations == 1
+        assert second.response == first.response
+        assert second.metadata["answer_cache"]["hit"] is True
+
+        # 知识库变化（通过RAG服务的失效回调）后重新生成
+        rag_service._invalidate_caches()
+        third = ask("退货政策是什么？")
+        assert third.metadata["answer_cache"]["hit"] is False
+        assert llm.generations == 2
+    finally:
+        agent_service.llm = original_llm
+        rag_service.get_relevant_context = original_context
+        rag_service.embed_query = original_embed
+        settings.ANSWER_CACHE_ENABLED = original_enabled
+        answer_cache.invalidate()
+
+if __name__ == "__main__":
+    test_semantic_answer_cache()
+    test_answer_cache_skips_llm_and_invalidates_on_reload()
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+异步聊天链路测试脚本
+使用慢速的假LLM和阻塞式检索模拟负载，验证并发请求是交叠执行而不是逐个排队
+"""
+
+import sys
+import time
+import asyncio
+from pathlib import Path
+
+import httpx
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from langchain.schema import AIMessage
+from app.main import app
+from app.config import settings
+from app.models.chat import ChatRequest
+from app.models.knowledge import SearchResponse
+from app.services.agent_service import agent_service
+from app.services.rag_service import rag_service
+
+# 模拟的LLM与检索延迟（秒）
+LLM_DELAY = 0.2
+RETRIEVAL_DELAY = 0.05
+CONCURRENT_REQUESTS = 8
+
+class FakeSlowLLM:
+    """慢速的假LLM：意图识别返回指定意图，其余返回固定回答"""
+
+    def __init__(self, delay: float = LLM_DELAY, intent: str = "business"):
+        self.delay = delay
+        self.intent = intent
+        self.calls = 0
+
+    def _reply(self, messages) -> AIMessage:
+        self.calls += 1
+        if "只返回" in messages[-1].content:
+            return AIMessage(content=self.intent)
+        return AIMessage(content="这是测试回答")
+
+    def __call__(self, messages):
+        time.sleep(self.delay)
+        return self._reply(messages)
+
+    async def ainvoke(self, messages):
+        await asyncio.sleep(self.delay)
+        return self._reply(messages)
+
+def fake_blocking_context(query: str, top_k: int = 5) -> str:
+    """模拟同步的ChromaDB查询（会阻塞调用线程）"""
+    time.sleep(RETRIEVAL_DELAY)
+    return f"内容: 关于{query}的知识\n来源: faq_001"
+
+async def _run_concurrent_requests(count: int) -> float:
+    """并发发送聊天请求，返回总耗时"""
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        start_time = time.perf_counter()
+        responses = await asyncio.gather(*[
+            client.post("/api/v1/chat", json={
+                "message": f"物流要多久？#{i}",
+                "user_id": "load_test_user",
+                "session_id": f"load_test_session_{i}"
+            })
+            for i in range(count)
+        ])
+        elapsed = time.perf_counter() - start_time
+
+    for response in responses:
+        assert response.status_code == 200, response.text
+        assert response.json()["response"] == "这是测试回答"
+        assert response.json()["sources"] == ["faq_001"]
+
+    return elapsed
+
+def test_concurrent_chat_requests_overlap():
+    """测试并发请求交叠执行"""
+    original_llm = agent_service.llm
+    original_context = rag_service.get_relevant_context
+    agent_service.llm = FakeSlowLLM()
+    rag_service.get_relevant_context = fake_blocking_context
+
+    try:
+        elapsed = asyncio.run(_run_concurrent_requests(CONCURRENT_REQUESTS))
+    finally:
+        agent_service.llm = original_llm
+        rag_service.get_relevant_context = original_context
+
+    # 串行执行的理论耗时：每个请求两次LLM调用 + 一次检索
+    serial_time = CONCURRENT_REQUESTS * (2 * LLM_DELAY + RETRIEVAL_DELAY)
+    print(f"并发请求数: {CONCURRENT_REQUESTS}")
+    print(f"实际耗时: {elapsed:.3f}s, 串行理论耗时: {serial_time:.3f}s")
+
+    assert elapsed < serial_time / 2, "并发请求没有交叠执行"
+
+def test_concurrent_search_requests_overlap():
+    """测试搜索接口在线程池中检索，并发请求交叠执行"""
+    def fake_blocking_search(search_request):
+        time.sleep(RETRIEVAL_DELAY)
+        return SearchResponse(results=[], total_count=0, query=search_request.query, processing_time=RETRIEVAL_DELAY)
+
+    async def run() -> float:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            start_time = time.perf_counter()
+            responses = await asyncio.gather(*[
+                client.post("/api/v1/search", json={"query": f"物流要多久？#{i}"})
+                for i in range(CONCURRENT_REQUESTS)
+            ])
+            elapsed = time.perf_counter() - start_time
+        for response in responses:
+            assert response.status_code == 200, response.text
+        return elapsed
+
+    original_search = rag_service.search
+    rag_service.search = fake_blocking_search
+    try:
+        elapsed = asyncio.run(run())
+    finally:
+        rag_service.search = original_search
+
+    serial_time = CONCURRENT_REQUESTS * RETRIEVAL_DELAY
+    print(f"并发搜索耗时: {elapsed:.3f}s, 串行理论耗时: {serial_time:.3f}s")
+    assert elapsed < serial_time / 2, "并发搜索请求没有交叠执行"
+
+def test_sync_wrapper():
+    """测试同步封装仍然可用"""
+    original_llm = agent_service.llm
+    original_context = rag_service.get_relevant_context
+    agent_service.llm = FakeSlowLLM(delay=0.0)
+    rag_service.get_relevant_context = fake_blocking_context
+
+    try:
+        chat_request = ChatRequest(
+            message="可以退货吗？",
+            session_id="sync_wrapper_session",
+            user_id="sync_wrapper_user"
+        )
+        # 连续调用两次，确认后台事件循环可以复用
+        for _ in range(2):
+            response = agent_service.process_chat(chat_request)
+            print(f"同步封装回复: {response.response}")
+            assert response.response == "这是测试回答"
+            assert response.sources == ["faq_001"]
+    finally:
+        agent_service.llm = original_llm
+        rag_service.get_relevant_context = original_context
+
+def test_speculative_retrieval():
+    """测试推测检索：业务意图复用并行检索结果，闲聊意图丢弃检索结果"""
+    original_llm = agent_service.llm
+    original_context = rag_service.get_relevant_context
+    original_speculative = settings.SPECULATIVE_RETRIEVAL
+    original_engine = settings.INTENT_ENGINE
+    rag_service.get_relevant_context = fake_blocking_context
+    # 使用LLM意图识别，才能体现意图识别与检索重叠带来的收益
+    settings.INTENT_ENGINE = "llm"
+
+    try:
+        totals = {}
+        for speculative in (False, True):
+            settings.SPECULATIVE_RETRIEVAL = speculative
+            agent_service.llm = FakeSlowLLM(delay=0.1)
+            response = agent_service.process_chat(ChatRequest(
+                message="物流要多久？",
+                session_id="speculative_session",
+                user_id="speculative_user"
+            ))
+            timings = response.metadata["timings"]
+            totals[speculative] = timings["total_ms"]
+            print(f"推测检索={speculative}: {timings}")
+
+            assert response.metadata["intent"] == "business"
+            assert response.metadata["speculative_retrieval"] == speculative
+            assert response.sources == ["faq_001"]
+            for stage in ("intent_ms", "retrieval_ms", "retrieval_wait_ms", "generation_ms", "total_ms"):
+                assert stage in timings
+
+        # 推测模式下检索与意图识别重叠，总耗时应节省大部分检索时间
+        assert totals[True] < totals[False] - RETRIEVAL_DELAY * 1000 / 2
+
+        # 闲聊意图：检索结果被丢弃
+        settings.SPECULATIVE_RETRIEVAL = True
+        agent_service.llm = FakeSlowLLM(delay=0.0, intent="chat")
+        response = agent_service.process_chat(ChatRequest(
+            message="你好",
+            session_id="speculative_session",
+            user_id="speculative_user"
+        ))
+        assert response.metadata["intent"] == "chat"
+        assert response.metadata["timings"]["retrieval_discarded"] is True
+        assert response.sources == []
+    finally:
+        agent_service.llm = original_llm
+        rag_service.get_relevant_context = original_context
+        settings.SPECULATIVE_RETRIEVAL = original_speculative
+        settings.INTENT_ENGINE = original_engine
+
+if __name__ == "__main__":
+    test_concurrent_chat_requests_overlap()
+    test_concurrent_search_requests_overlap()
+    test_sync_wrapper()
+    test_speculative_retrieval()
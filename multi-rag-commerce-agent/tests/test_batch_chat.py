@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+批量聊天测试脚本
+验证结果顺序、重复问题共用一次批量检索以及生成并发上限
+"""
+
+import sys
+import asyncio
+from pathlib import Path
+
+import httpx
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from langchain.schema import AIMessage
+from app.main import app
+from app.config import settings
+from app.models.chat import ChatRequest
+from app.services.agent_service import agent_service
+from app.services.rag_service import rag_service
+
+class ConcurrencyTrackingLLM:
+    """记录同时进行的生成数量的假LLM"""
+
+    def __init__(self, delay: float = 0.02):
+        self.delay = delay
+        self.active = 0
+        self.max_active = 0
+
+    async def ainvoke(self, messages):
+        prompt = messages[-1].content
+        if "只返回" in prompt:
+            return AIMessage(content="chat" if "你好" in prompt else "business")
+
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        await asyncio.sleep(self.delay)
+        self.active -= 1
+        return AIMessage(content=f"回答: {prompt.split('用户问题：')[-1].strip()}")
+
+class RecordingContexts:
+    """记录批量检索调用的假检索函数"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, queries, top_k: int = 5):
+        self.calls.append(list(queries))
+        return [f"内容: {query}\n来源: faq_{i:03d}" for i, query in enumerate(queries)]
+
+def _patch(llm, contexts):
+    originals = (agent_service.llm, rag_service.get_relevant_contexts, settings.INTENT_ENGINE)
+    agent_service.llm = llm
+    rag_service.get_relevant_contexts = contexts
+    settings.INTENT_ENGINE = "llm"
+    return originals
+
+def _restore(originals):
+    agent_service.llm, rag_service.get_relevant_contexts, settings.INTENT_ENGINE = originals
+
+def test_batch_shares_retrieval_and_bounds_concurrency():
+    """测试批量处理：顺序一致、重复问题只检索一次、并发受限"""
+    llm = ConcurrencyTrackingLLM()
+    contexts = RecordingContexts()
+    originals = _patch(llm, contexts)
+
+    messages = ["退货政策是什么？", "你好", "配送要多久？", "退货政策是什么？", "支持哪些支付方式？"] * 2
+    requests = [
+        ChatRequest(message=message, session_id=f"batch_session_{i}", user_id="batch_user")
+        for i, message in enumerate(messages)
+    ]
+
+    try:
+        responses = agent_service.process_batch(requests, max_concurrency=3)
+    finally:
+        _restore(originals)
+
+    for request, response in zip(requests, responses):
+        print(f"{request.message} -> {response.response} ({response.metadata.get('intent')})")
+
+    assert [response.session_id for response in responses] == [request.session_id for request in requests]
+    assert [response.metadata["intent"] for response in responses] == [
+        "chat" if message == "你好" else "business" for message in messages
+    ]
+    # 去重后的业务问题只做一次批量检索
+    assert contexts.calls == [["退货政策是什么？", "配送要多久？", "支持哪些支付方式？"]]
+    assert responses[0].sources == ["faq_000"]
+    assert responses[1].sources == []
+    assert llm.max_active <= 3
+    print(f"✅ 最大并发生成数: {llm.max_active}")
+
+def test_chat_batch_endpoint():
+    """测试 /api/v1/chat/batch 接口与批量上限"""
+    llm = ConcurrencyTrackingLLM(delay=0)
+    originals = _patch(llm, RecordingContexts())
+    original_max_size = settings.BATCH_MAX_SIZE
+
+    async def request(count: int):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/api/v1/chat/batch", json={"requests": [
+                {"message": f"商品{i}多少钱？", "user_id": "batch_api_user"} for i in range(count)
+            ]})
+
+    try:
+        settings.BATCH_MAX_SIZE = 4
+        response = asyncio.run(request(3))
+        rejected = asyncio.run(request(5))
+    finally:
+        settings.BATCH_MAX_SIZE = original_max_size
+        _restore(originals)
+
+    assert response.status_code == 200
+    data = response.json()
+    print(f"批量响应: {data['total_count']} 条, {data['processing_time']:.3f}s")
+    assert data["total_count"] == 3
+    assert all(item["session_id"] for item in data["responses"])
+    assert rejected.status_code == 400
+
+if __name__ == "__main__":
+    test_batch_shares_retrieval_and_bounds_concurrency()
+    test_chat_batch_endpoint()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+上下文组装测试脚本
+验证分块去重、相邻分块合并、按相关度填充token预算以及对话记忆上下文的token预算
+"""
+
+import sys
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.models.knowledge import SearchResult
+from app.services.context_assembler import ContextAssembler, merge_overlapping
+from app.services.memory_service import MemoryService
+from app.utils import tokens
+from app.utils.chunking import create_text_splitter
+from app.utils.tokens import count_tokens, truncate_to_tokens
+
+class CharacterEncoding:
+    """每个字符一个token的编码（代替需要联网下载的tiktoken编码文件）"""
+
+    def encode(self, text, disallowed_special=()):
+        return [ord(char) for char in text]
+
+    def decode(self, token_ids):
+        return "".join(chr(token_id) for token_id in token_ids)
+
+def make_results(source: str, chunks: list, score: float) -> list:
+    return [
+        SearchResult(content=chunk, score=score, source=source, metadata={"source_id": source, "chunk_index": i})
+        for i, chunk in enumerate(chunks)
+    ]
+
+def test_merge_adjacent_chunks():
+    """测试同一来源的相邻重叠分块合并后还原原文"""
+    text = "。".join(f"第{i}句说明商品的配送与售后政策" for i in range(40)) + "。"
+    chunks = create_text_splitter(chunk_size=120, chunk_overlap=40).split_text(text)
+    assert len(chunks) > 3
+
+    results = make_results("faq_001", chunks, 0.8)
+    # 检索结果顺序打乱并包含重复分块
+    shuffled = results[::-1] + results[:1]
+    context, stats = ContextAssembler(max_tokens=100000).assemble(shuffled)
+    assert stats["passages"] == 1 and stats["included_passages"] == 1
+    assert context == f"内容: {text}\n来源: faq_001"
+    assert stats["tokens_saved"] > 0 and stats["tokens_used"] < stats["tokens_raw"]
+
+    assert merge_overlapping("abcdef", "defgh") == "abcdefgh"
+    assert merge_overlapping("abc", "xyz") == "abc\nxyz"
+    print(f"✅ 相邻分块合并: {len(chunks)} 个分块, 节省 {stats['tokens_saved']} tokens")
+
+def test_budget_in_relevance_order():
+    """测试按相关度填充预算，放不下时截断并停止"""
+    results = (
+        make_results("low", ["低相关内容。" * 50], 0.2)
+        + make_results("high", ["高相关内容。" * 20], 0.9)
+        + make_results("middle", ["中等相关内容。" * 30], 0.5)
+    )
+    assembler = ContextAssembler(max_tokens=200)
+    context, stats = assembler.assemble(results)
+    print(f"预算组装统计: {stats}")
+    assert stats["tokens_used"] <= 200
+    assert context.index("来源: high") < context.index("来源: middle")
+    assert "来源: low" not in context
+    assert stats["truncated"] and stats["included_passages"] == 2
+    assert assembler.stats["assembled"] == 1 and assembler.stats["dropped_passages"] == 1
+
+    # 预算足够时全部放入且不截断
+    context, stats = ContextAssembler(max_tokens=100000).assemble(results)
+    assert stats["included_passages"] == 3 and not stats["truncated"]
+
+def test_tiktoken_counting():
+    """测试使用tiktoken编码时的计数与截断（替换为逐字符编码）"""
+    previous = (tokens._encoding, tokens._encoding_loaded)
+    tokens._encoding, tokens._encoding_loaded = CharacterEncoding(), True
+    try:
+        assert count_tokens("退货政策 policy") == 11
+        truncated = truncate_to_tokens("退货政策 return policy", 6)
+        assert truncated == "退货政策 …" and count_tokens(truncated) == 6
+        context, stats = ContextAssembler(max_tokens=60).assemble(make_results("faq_002", ["退货" * 100], 1.0))
+        assert stats["tokens_used"] == len(context) <= 60
+    finally:
+        tokens._encoding, tokens._encoding_loaded = previous
+
+def test_encoding_loading_does_not_block():
+    """测试其他线程正在加载编码时不等待，使用近似计数；加载只进行一次"""
+    previous = (tokens._encoding, tokens._encoding_loaded)
+    tokens._encoding, tokens._encoding_loaded = None, False
+    try:
+        with tokens._encoding_lock:
+            # 模拟启动时的加载线程持有锁
+            assert tokens.get_encoding() is None
+            assert count_tokens("退货政策 policy") == 6
+        tokens._encoding_loaded = True
+        tokens._encoding = CharacterEncoding()
+        assert tokens.load_encoding() is tokens._encoding
+        assert count_tokens("退货政策 policy") == 11
+    finally:
+        tokens._encoding, tokens._encoding_loaded = previous
+    print("✅ 编码加载不阻塞计数")
+
+def test_memory_context_budget():
+    """测试对话记忆上下文保留最新的消息并遵守token预算"""
+    memory = MemoryService()
+    for i in range(5):
+        memory.add_message("budget_session", "user_1", "user", f"第{i}个问题：" + "配送多久？" * 20)
+        memory.add_message("budget_session", "user_1", "assistant", f"第{i}个回答：" + "三到五天。" * 20)
+
+    unlimited = memory.get_context_for_session("budget_session", max_messages=10, max_tokens=100000)
+    limited = memory.get_context_for_session("budget_session", max_messages=10, max_tokens=150)
+    assert count_tokens(limited) <= 150 < count_tokens(unlimited)
+    # 保留的是最新的消息，且按时间顺序输出
+    assert limited.endswith(unlimited.split("\n")[-1])
+    assert "第0个问题" not in limited
+
+    # 单条消息超出预算时截断
+    single = memory.get_context_for_session("budget_session", max_messages=1, max_tokens=20)
+    assert 0 < count_tokens(single) <= 20
+    print("✅ 对话记忆上下文遵守token预算")
+
+if __name__ == "__main__":
+    test_merge_adjacent_chunks()
+    test_budget_in_relevance_order()
+    test_tiktoken_counting()
+    test_encoding_loading_does_not_block()
+    test_memory_context_budget()
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+滚动对话摘要测试脚本
+验证对话变长后较早的消息在后台压缩进会话摘要（假LLM / 抽取式），
+Agent的对话历史为摘要 + 最近的消息，且不超过token预算
+"""
+
+import sys
+import asyncio
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from langchain.schema import AIMessage
+from app.config import settings
+from app.models.chat import ChatRequest
+from app.services.memory_service import MemoryService, memory_service
+from app.services.memory_store import InMemoryStore
+from app.services.agent_service import agent_service
+from app.utils.tokens import count_tokens
+
+SUMMARY_SETTINGS = {
+    "MAX_HISTORY_LENGTH": 10,
+    "SUMMARY_TRIGGER_MESSAGES": 8,
+    "SUMMARY_KEEP_RECENT": 4,
+    "SUMMARY_MAX_TOKENS": 120,
+    "MEMORY_CONTEXT_MAX_TOKENS": 300
+}
+
+class FakeSummarizer:
+    """假的LLM摘要：记录每次调用的已有摘要与消息，可以暂停以验证摘要在后台进行"""
+
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.calls = []
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def __call__(self, previous: str, messages) -> str:
+        self.calls.append((previous, [msg.content for msg in messages]))
+        await self.release.wait()
+        if self.fail:
+            raise RuntimeError("LLM不可用")
+        return f"摘要{len(self.calls)}"
+
+def with_summary_settings(test):
+    def wrapper():
+        original = {name: getattr(settings, name) for name in SUMMARY_SETTINGS}
+        for name, value in SUMMARY_SETTINGS.items():
+            setattr(settings, name, value)
+        try:
+            test()
+        finally:
+            for name, value in original.items():
+                setattr(settings, name, value)
+    wrapper.__name__ = test.__name__
+    wrapper.__doc__ = test.__doc__
+    return wrapper
+
+async def add_turn(memory: MemoryService, session_id: str, turn: int):
+    await memory.aadd_message(session_id, "u1", "user", f"第{turn}个问题：订单{turn}什么时候发货？请尽快处理。", "zh")
+    await memory.aadd_message(session_id, "u1", "assistant", f"第{turn}个回答：订单{turn}预计明天发货。感谢耐心等待。", "zh")
+
+async def drain(memory: MemoryService):
+    while memory._summary_tasks:
+        await asyncio.gather(*memory._summary_tasks.values())
+
+@with_summary_settings
+def test_extractive_rolling_summary():
+    """测试抽取式滚动摘要：达到阈值后压缩较早的消息，长对话的上下文不再增长"""
+    memory = MemoryService(store=InMemoryStore())
+
+    async def run():
+        for turn in range(3):
+            await add_turn(memory, "s", turn)
+        await drain(memory)
+        assert memory.store.get_summary("s") is None
+        overview = memory.get_conversation_summary("s")
+        assert not overview["rolling"] and "用户: 第0个问题：订单0什么时候发货\n" in overview["summary"]
+
+        await add_turn(memory, "s", 3)
+        await drain(memory)
+        # 8条未总结的消息：较早的4条压缩进摘要，保留最近4条原文
+        summary = memory.store.get_summary("s")
+        assert summary["summary"].split("\n") == [
+            "用户: 第0个问题：订单0什么时候发货", "助手: 第0个回答：订单0预计明天发货",
+            "用户: 第1个问题：订单1什么时候发货", "助手: 第1个回答：订单1预计明天发货"
+        ]
+        context = memory.get_context_for_session("s")
+        assert context.startswith("对话摘要: 用户: 第0个问题") and "第1个回答：订单1预计明天发货。感谢" not in context
+        assert context.endswith("助手: 第3个回答：订单3预计明天发货。感谢耐心等待。")
+
+        sizes = []
+        for turn in range(4, 40):
+            await add_turn(memory, "s", turn)
+            await drain(memory)
+            context = memory.get_context_for_session("s")
+            sizes.append(count_tokens(context))
+            # 消息在被环形缓冲区丢弃之前已经压缩进摘要
+            summary, pending = memory._split_summarized("s")
+            assert len(pending) < settings.SUMMARY_TRIGGER_MESSAGES
+            assert f"第{turn - 2}个回答" in summary["summary"] or f"第{turn - 2}个回答" in context
+        assert max(sizes) <= settings.MEMORY_CONTEXT_MAX_TOKENS
+        assert count_tokens(memory.store.get_summary("s")["summary"]) <= settings.SUMMARY_MAX_TOKENS
+        assert "第0个问题" not in context and "第37个问题" in context
+
+        overview = memory.get_conversation_summary("s")
+        assert overview["rolling"] and overview["conversation_length"] == 10 and overview["pending_messages"] < 8
+
+    asyncio.run(run())
+    print("✅ 抽取式滚动摘要")
+
+@with_summary_settings
+def test_llm_summary_runs_in_background():
+    """测试LLM摘要在后台执行：不阻塞写入，同一会话同时只有一个摘要任务，新摘要基于已有摘要"""
+    summarizer = FakeSummarizer()
+    memory = MemoryService(store=InMemoryStore(), summarizer=summarizer)
+
+    async def run():
+        summarizer.release.clear()
+        for turn in range(4):
+            await add_turn(memory, "s", turn)
+        # 摘要任务已开始但未完成，写入没有等待它
+        await asyncio.sleep(0)
+        assert len(summarizer.calls) == 1 and "s" in memory._summary_tasks
+        assert memory.store.get_summary("s") is None
+        await add_turn(memory, "s", 4)
+        assert memory.schedule_summary("s") is None and len(memory._summary_tasks) == 1
+
+        summarizer.release.set()
+        await drain(memory)
+        assert memory.store.get_summary("s")["summary"] == "摘要1"
+        assert summarizer.calls[0] == ("", [
+            "第0个问题：订单0什么时候发货？请尽快处理。", "第0个回答：订单0预计明天发货。感谢耐心等待。",
+            "第1个问题：订单1什么时候发货？请尽快处理。", "第1个回答：订单1预计明天发货。感谢耐心等待。"
+        ])
+
+        # 下一次摘要在已有摘要的基础上合并新的较早消息
+        await add_turn(memory, "s", 5)
+        await drain(memory)
+        assert summarizer.calls[1][0] == "摘要1" and summarizer.calls[1][1][0].startswith("第2个问题")
+        assert memory.store.get_summary("s")["summary"] == "摘要2"
+        assert memory.get_context_for_session("s").startswith("对话摘要: 摘要2\n用户: 第4个问题")
+
+    asyncio.run(run())
+    print("✅ LLM摘要在后台执行")
+
+@with_summary_settings
+def test_slow_summary_does_not_lose_turns():
+    """测试后台摘要较慢时，将被丢弃的消息在写入时压缩进摘要，较晚完成的LLM摘要不覆盖更新的摘要"""
+    summarizer = FakeSummarizer()
+    memory = MemoryService(store=InMemoryStore(), summarizer=summarizer)
+
+    async def run():
+        summarizer.release.clear()
+        for turn in range(4):
+            await add_turn(memory, "s", turn)
+        await asyncio.sleep(0)
+        for turn in range(4, 10):
+            await add_turn(memory, "s", turn)
+        assert len(summarizer.calls) == 1 and "s" in memory._summary_tasks
+        # 后台摘要未完成，丢弃的第0~4轮已用抽取式摘要压缩（超出 SUMMARY_MAX_TOKENS 时去掉最早的行）
+        summary = memory.store.get_summary("s")
+        for turn in range(2, 5):
+            assert f"用户: 第{turn}个问题" in summary["summary"] and f"助手: 第{turn}个回答" in summary["summary"]
+        assert count_tokens(summary["summary"]) <= settings.SUMMARY_MAX_TOKENS
+        # 第5~9轮仍在历史中，尚未总结
+        _, pending = memory._split_summarized("s")
+        assert len(pending) == 10 and pending[0].content.startswith("第5个问题")
+
+        # LLM摘要只覆盖第0~1轮，晚于抽取式摘要完成时不写入
+        summarizer.release.set()
+        await drain(memory)
+        assert "摘要1" not in memory.store.get_summary("s")["summary"]
+        await add_turn(memory, "s", 10)
+        await drain(memory)
+        assert memory.store.get_summary("s")["summary"] == "摘要2"
+        # 下一次LLM摘要基于抽取式摘要（其中包括刚被丢弃的第5轮）
+        assert "助手: 第5个回答" in summarizer.calls[1][0]
+
+    asyncio.run(run())
+    print("✅ 后台摘要较慢时不丢失对话")
+
+@with_summary_settings
+def test_summary_falls_back_to_extractive():
+    """测试LLM摘要失败时使用抽取式摘要"""
+    summarizer = FakeSummarizer(fail=True)
+    memory = MemoryService(store=InMemoryStore(), summarizer=summarizer)
+
+    async def run():
+        for turn in range(4):
+            await add_turn(memory, "s", turn)
+        await drain(memory)
+        assert len(summarizer.calls) == 1
+        assert memory.store.get_summary("s")["summary"].startswith("用户: 第0个问题：订单0什么时候发货")
+
+        # 消息不足阈值时只有 force 才压缩
+        await add_turn(memory, "short", 0)
+        await drain(memory)
+        assert memory.store.get_summary("short") is None
+        assert not await memory.aupdate_summary("short")
+        settings.SUMMARY_KEEP_RECENT = 1
+        assert await memory.aupdate_summary("short", force=True)
+        assert memory.store.get_summary("short") is not None
+
+    asyncio.run(run())
+    print("✅ LLM失败时回退到抽取式摘要")
+
+@with_summary_settings
+def test_context_budget_with_summary():
+    """测试摘要 + 最近消息的上下文不超过token预算，摘要最多占一半"""
+    memory = MemoryService(store=InMemoryStore())
+    for turn in range(3):
+        memory.add_message("s", "u1", "user", f"第{turn}个问题：" + "配送多久？" * 30, "zh")
+        memory.add_message("s", "u1", "assistant", f"第{turn}个回答：" + "三到五天。" * 30, "zh")
+    messages = memory.store.get_messages("s")
+    memory.store.set_summary("s", "用户关心配送时效。" * 100, messages[1].timestamp)
+
+    for max_tokens in (60, 150, 300):
+        context = memory.get_context_for_session("s", max_tokens=max_tokens)
+        summary_line = context.split("\n")[0]
+        assert count_tokens(context) <= max_tokens
+        assert summary_line.startswith("对话摘要:") and count_tokens(summary_line) <= max_tokens // 2
+        # 最新的消息总是放入（超出预算时截断）
+        assert "第2个回答" in context
+    assert "第0个问题" not in memory.get_context_for_session("s", max_tokens=100000)
+    print("✅ 摘要与最近消息遵守token预算")
+
+@with_summary_settings
+def test_agent_summarizes_with_llm():
+    """测试Agent注册的LLM摘要与提示词中的对话历史"""
+    class FakeLLM:
+        def __init__(self):
+            self.prompts = []
+
+        async def ainvoke(self, messages):
+            self.prompts.append(messages[-1].content)
+            return AIMessage(content=" 用户询问订单0和1的发货时间，已答复明天发货。 ")
+
+    original_llm, original_summarizer = agent_service.llm, memory_service.summarizer
+    agent_service.llm = FakeLLM()
+    memory_service.summarizer = agent_service._asummarize_history
+    session_id = "summary_agent_session"
+    try:
+        async def run():
+            for turn in range(4):
+                await add_turn(memory_service, session_id, turn)
+            await drain(memory_service)
+
+        asyncio.run(run())
+        prompt = agent_service.llm.prompts[0]
+        assert "已有摘要：\n无" in prompt and "用户: 第1个问题：订单1什么时候发货？请尽快处理。" in prompt
+        assert "第2个问题" not in prompt
+        assert memory_service.store.get_summary(session_id)["summary"] == "用户询问订单0和1的发货时间，已答复明天发货。"
+
+        async def build():
+            timings = {}
+            request = ChatRequest(message="那订单2呢？", session_id=session_id)
+            prepared = await agent_service._aprepare_chat(request, "zh", timings, ("business", ""))
+            return agent_service._build_messages(request, prepared["context"], prepared["history"], "zh")
+
+        history = asyncio.run(build())[-1].content
+        assert "对话摘要: 用户询问订单0和1的发货时间" in history and "第3个回答" in history
+        assert "第0个问题" not in history
+    finally:
+        memory_service.clear_conversation(session_id)
+        agent_service.llm = original_llm
+        memory_service.summarizer = original_summarizer
+    print("✅ Agent使用LLM滚动摘要")
+
+if __name__ == "__main__":
+    test_extractive_rolling_summary()
+    test_llm_summary_runs_in_background()
+    test_slow_summary_does_not_lose_turns()
+    test_summary_falls_back_to_extractive()
+    test_context_budget_with_summary()
+    test_agent_summarizes_with_llm()
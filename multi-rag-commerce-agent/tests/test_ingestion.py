@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+流式入库测试脚本
+验证JSON数组/JSONL的增量读取、分批写入、背压与写入失败处理
+"""
+
+import os
+import sys
+import json
+import time
+import tempfile
+import threading
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.services.rag_service import RAGService
+from app.services.embedding_service import HashingEmbeddingBackend
+from app.services.ingestion import IngestionPipeline, iter_json_records, iter_knowledge_items, ingest_files
+from app.utils.chunking import create_text_splitter
+
+def generate_records(count: int) -> list:
+    return [
+        {
+            "id": f"item_{i}",
+            "title": f"商品 {i}",
+            "content": f"商品 {i} 的说明，支持\"快速\"配送。" + "详情。" * (i % 7),
+            "category": "product",
+            "language": "zh"
+        }
+        for i in range(count)
+    ]
+
+class SlowWriteService(RAGService):
+    """写入较慢、记录每批大小的RAG服务"""
+
+    def __init__(self, persist_directory: str, write_delay: float = 0.0, fail_after: int = None):
+        super().__init__(
+            embedding_backend=HashingEmbeddingBackend(dimension=64),
+            persist_directory=persist_directory,
+            collection_name="test_ingestion"
+        )
+        self.write_delay = write_delay
+        self.fail_after = fail_after
+        self.batch_sizes = []
+
+    def store_chunks(self, ids, documents, embeddings, metadatas):
+        if self.fail_after is not None and len(self.batch_sizes) >= self.fail_after:
+            raise RuntimeError("模拟写入失败")
+        time.sleep(self.write_delay)
+        self.batch_sizes.append(len(ids))
+        super().store_chunks(ids, documents, embeddings, metadatas)
+
+def test_iter_json_records():
+    """测试JSON数组与JSONL的增量读取（缓冲区小于单条记录）"""
+    records = generate_records(50) + [{"id": "嵌套", "content": "[1, 2]", "metadata": {"a": [1, {"b": "]"}]}}]
+
+    with tempfile.TemporaryDirectory() as directory:
+        array_path = os.path.join(directory, "feed.json")
+        with open(array_path, "w", encoding="utf-8") as f:
+            json.dump(records, f, ensure_ascii=False, indent=2)
+        jsonl_path = os.path.join(directory, "feed.jsonl")
+        with open(jsonl_path, "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n\n")
+
+        for path in (array_path, jsonl_path):
+            for buffer_size in (7, 65536):
+                assert list(iter_json_records(path, buffer_size=buffer_size)) == records
+
+        errors = []
+        items = list(iter_knowledge_items(iter_json_records(array_path), errors))
+        assert len(items) == 50 and len(errors) == 1
+        print("✅ JSON数组与JSONL增量读取正确")
+
+def test_pipeline_backpressure_and_batches():
+    """测试固定批大小写入、背压队列上限与进度报告"""
+    with tempfile.TemporaryDirectory() as persist_directory:
+        service = SlowWriteService(persist_directory, write_delay=0.01)
+        progress = []
+        pipeline = IngestionPipeline(
+            service=service, batch_size=16, queue_size=2,
+            progress_interval=0.01, progress_callback=progress.append
+        )
+        items = iter_knowledge_items(iter(generate_records(200)))
+        version_before = service.knowledge_version
+        stats = pipeline.run(items)
+        print(f"入库统计: {stats}")
+
+        assert "error" not in stats
+        assert stats["items"] == 200 and stats["chunks_written"] == service.vector_store.count()
+        assert max(service.batch_sizes) <= 16
+        assert stats["max_queue_depth"] <= 2
+        assert progress and progress[-1]["chunks_written"] <= stats["chunks_written"]
+        assert len(service.keyword_index) == stats["chunks_written"]
+        assert service.knowledge_version == version_before + 1
+
+def test_pipeline_write_failure():
+    """测试写入失败时停止读取并返回错误"""
+    with tempfile.TemporaryDirectory() as persist_directory:
+        service = SlowWriteService(persist_directory, fail_after=2)
+        consumed = []
+
+        def items():
+            for item in iter_knowledge_items(iter(generate_records(1000))):
+                consumed.append(item.id)
+                yield item
+
+        stats = IngestionPipeline(service=service, batch_size=10, queue_size=1, progress_interval=0).run(items())
+        assert stats["error"] == "模拟写入失败"
+        assert stats["chunks_written"] == 20
+        # 写入失败后不再继续读取全部数据
+        assert len(consumed) < 1000
+
+class SlowEmbeddingBackend(HashingEmbeddingBackend):
+    """模拟远程向量接口延迟并记录同时进行的批次数"""
+
+    def __init__(self, delay: float):
+        super().__init__(dimension=64)
+        self.delay = delay
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+        return super().embed_documents(texts)
+
+def test_pipeline_parallel_stages():
+    """测试进程池分块与并发向量计算的结果与串行一致，且并发数受限"""
+    records = generate_records(300)
+    for record in records[::10]:
+        record["content"] = "很长的商品说明。" * 300
+
+    with tempfile.TemporaryDirectory() as persist_directory:
+        serial = SlowWriteService(persist_directory + "/serial")
+        # 分块参数与配置不同：分块进程使用服务的参数而不是配置
+        serial.chunk_size, serial.chunk_overlap = 400, 50
+        serial.text_splitter = create_text_splitter(400, 50)
+        serial_stats = IngestionPipeline(
+            service=serial, batch_size=32, progress_interval=0, split_workers=1, embed_concurrency=1
+        ).run(iter_knowledge_items(iter(records)))
+
+        parallel = SlowWriteService(persist_directory + "/parallel")
+        parallel.embedding_backend = SlowEmbeddingBackend(delay=0.02)
+        parallel.chunk_size, parallel.chunk_overlap = 400, 50
+        parallel_stats = IngestionPipeline(
+            service=parallel, batch_size=32, progress_interval=0, split_workers=2, embed_concurrency=3
+        ).run(iter_knowledge_items(iter(records)))
+        print(f"并行入库统计: {parallel_stats['stage_chunks_per_s']}")
+
+        assert "error" not in parallel_stats
+        assert parallel_stats["chunks_written"] == serial_stats["chunks_written"] == parallel_stats["chunks_split"]
+        serial_data = serial.vector_store.get()
+        parallel_data = parallel.vector_store.get()
+        assert sorted(zip(serial_data["ids"], serial_data["documents"])) == sorted(zip(parallel_data["ids"], parallel_data["documents"]))
+        assert parallel.embedding_backend.max_active == parallel_stats["max_embed_in_flight"] == 3
+        assert set(parallel_stats["stage_chunks_per_s"]) == {"split", "embed", "write"}
+        assert all(rate > 0 for rate in parallel_stats["stage_chunks_per_s"].values())
+        # 默认在当前进程内分块
+        assert IngestionPipeline(service=serial).split_workers == 1
+        print("✅ 并行分块与并发向量计算结果一致")
+
+def test_ingest_files():
+    """测试导入示例数据文件"""
+    with tempfile.TemporaryDirectory() as persist_directory:
+        service = SlowWriteService(persist_directory)
+        stats = ingest_files(
+            [project_root / "data" / "faq.json", project_root / "data" / "products.json"],
+            service=service, progress_interval=0
+        )
+        assert stats["items"] == 21 and stats["skipped"] == 0
+        assert service.vector_store.count() == stats["chunks_written"]
+
+if __name__ == "__main__":
+    test_iter_json_records()
+    test_pipeline_backpressure_and_batches()
+    test_pipeline_write_failure()
+    test_pipeline_parallel_stages()
+    test_ingest_files()
@@ -0,0 +1,596 @@
+#!/usr/bin/env python3
+"""
+记忆存储后端测试脚本
+同一组用例分别在进程内、SQLite与Redis后端上运行；Redis后端连接本地的Redis协议模拟服务器
+"""
+
+import sys
+import json
+import asyncio
+import random
+import time
+import socket
+import tempfile
+import threading
+import socketserver
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.config import settings
+from app.services.memory_service import MemoryService
+from app.models.chat import Message
+from app.services.memory_store import (
+    InMemoryStore, SQLiteMemoryStore, RedisMemoryStore, MessageRecord, create_memory_store
+)
+
+class FakeRedisHandler(socketserver.StreamRequestHandler):
+    """RESP2协议的最小实现，只支持记忆存储用到的命令
+
+    WATCH/MULTI/EXEC: 每次写命令增加键的版本号，EXEC时被WATCH的键版本变化则放弃事务并返回空数组。
+    """
+
+    WRITE_COMMANDS = {"RPUSH", "LTRIM", "HSET", "HSETNX", "HINCRBY", "HDEL", "DEL", "ZADD", "ZREM", "SADD"}
+
+    # 回复写入缓冲区后整体发送，避免小包与延迟确认叠加造成的40ms等待
+    wbufsize = 65536
+    disable_nagle_algorithm = True
+
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        assert line.startswith(b"*"), line
+        args = []
+        for _ in range(int(line[1:])):
+            size = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(size + 2)[:-2].decode("utf-8"))
+        return args
+
+    def write(self, value):
+        if value is None:
+            self.wfile.write(b"$-1\r\n")
+        elif isinstance(value, Exception):
+            self.wfile.write(f"-ERR {value}\r\n".encode())
+        elif isinstance(value, bool):
+            self.wfile.write(f":{int(value)}\r\n".encode())
+        elif isinstance(value, int):
+            self.wfile.write(f":{value}\r\n".encode())
+        elif isinstance(value, list):
+            self.wfile.write(f"*{len(value)}\r\n".encode())
+            for item in value:
+                self.write(item)
+        elif value in ("OK", "PONG", "QUEUED"):
+            self.wfile.write(f"+{value}\r\n".encode())
+        else:
+            data = str(value).encode("utf-8")
+            self.wfile.write(b"$%d\r\n%s\r\n" % (len(data), data))
+
+    def handle(self):
+        watched, queued = {}, None
+        while True:
+            args = self.read_command()
+            if args is None:
+                return
+            command = args[0].upper()
+            with self.server.lock:
+                versions = self.server.versions
+                if command == "WATCH":
+                    watched.update({key: versions.get(key, 0) for key in args[1:]})
+                    self.write("OK")
+                elif command in ("UNWATCH", "DISCARD"):
+                    watched, queued = {}, None
+                    self.write("OK")
+                elif command == "MULTI":
+                    queued = []
+                    self.write("OK")
+                elif command == "EXEC":
+                    if any(versions.get(key, 0) != version for key, version in watched.items()):
+                        self.wfile.write(b"*-1\r\n")
+                    else:
+                        self.write([self.run(*queued_args) for queued_args in queued])
+                    watched, queued = {}, None
+                elif queued is not None:
+                    queued.append((command, args[1:]))
+                    self.write("QUEUED")
+                else:
+                    self.write(self.run(command, args[1:]))
+            self.wfile.flush()
+            # 每条命令之后让出执行权，使不同连接的命令像真实服务端一样交错执行
+            time.sleep(0)
+
+    def run(self, command, args):
+        if command in self.WRITE_COMMANDS:
+            for key in (args if command == "DEL" else args[:1]):
+                self.server.versions[key] = self.server.versions.get(key, 0) + 1
+        try:
+            return self.execute(command, args)
+        except Exception as e:
+            return e
+
+    def execute(self, command, args):
+        data = self.server.data
+        if command == "PING":
+            return "PONG"
+        if command in ("CLIENT", "SELECT"):
+            return "OK"
+        if command == "RPUSH":
+            values = data.setdefault(args[0], [])
+            values.extend(args[1:])
+            return len(values)
+        if command in ("LRANGE", "LTRIM"):
+            values = data.get(args[0], [])
+            start, stop = int(args[1]), int(args[2])
+            start = max(start + len(values), 0) if start < 0 else start
+            stop = stop + len(values) if stop < 0 else stop
+            selected = values[start:stop + 1] if stop >= 0 else []
+            if command == "LRANGE":
+                return selected
+            data[args[0]] = selected
+            return "OK"
+        if command == "LINDEX":
+            values = data.get(args[0], [])
+            index = int(args[1])
+            return values[index] if -len(values) <= index < len(values) else None
+        if command == "LLEN":
+            return len(data.get(args[0], []))
+        if command in ("HSET", "HSETNX"):
+            fields = data.setdefault(args[0], {})
+            pairs = list(zip(args[1::2], args[2::2]))
+            added = 0
+            for field, value in pairs:
+                if command == "HSETNX" and field in fields:
+                    continue
+                added += field not in fields
+                fields[field] = value
+            return added
+        if command == "HINCRBY":
+            fields = data.setdefault(args[0], {})
+            fields[args[1]] = str(int(fields.get(args[1], 0)) + int(args[2]))
+            return int(fields[args[1]])
+        if command == "HLEN":
+            return len(data.get(args[0], {}))
+        if command == "HDEL":
+            fields = data.get(args[0], {})
+            return sum(fields.pop(field, None) is not None for field in args[1:])
+        if command == "HGET":
+            return data.get(args[0], {}).get(args[1])
+        if command == "HMGET":
+            return [data.get(args[0], {}).get(field) for field in args[1:]]
+        if command == "HEXISTS":
+            return args[1] in data.get(args[0], {})
+        if command == "HGETALL":
+            return [item for pair in data.get(args[0], {}).items() for item in pair]
+        if command == "DEL":
+            return sum(data.pop(key, None) is not None for key in args)
+        if command == "ZADD":
+            scores = data.setdefault(args[0], {})
+            added = sum(member not in scores for member in args[2::2])
+            scores.update({member: float(score) for score, member in zip(args[1::2], args[2::2])})
+            return added
+        if command == "ZREM":
+            scores = data.get(args[0], {})
+            return sum(scores.pop(member, None) is not None for member in args[1:])
+        if command == "ZRANGE":
+            members = sorted(data.get(args[0], {}).items(), key=lambda item: item[1])
+            stop = int(args[2])
+            return [member for member, _ in members[int(args[1]):stop + 1 if stop >= 0 else len(members) + stop + 1]]
+        if command == "ZRANGEBYSCORE":
+            def bound(text):
+                exclusive = text.startswith("(")
+                return float(text.lstrip("(")), exclusive
+            low, low_exclusive = bound(args[1])
+            high, high_exclusive = bound(args[2])
+            return [
+                member for member, score in sorted(data.get(args[0], {}).items(), key=lambda item: item[1])
+                if (score > low if low_exclusive else score >= low) and (score < high if high_exclusive else score <= high)
+            ]
+        if command == "SADD":
+            members = data.setdefault(args[0], set())
+            added = len(set(args[1:]) - members)
+            members.update(args[1:])
+            return added
+        if command == "SCARD":
+            return len(data.get(args[0], set()))
+        raise ValueError(f"unknown command '{command}'")
+
+class FakeRedisServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FakeRedisHandler)
+        self.data = {}
+        self.versions = {}
+        self.lock = threading.Lock()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def url(self) -> str:
+        return f"redis://127.0.0.1:{self.server_address[1]}/0"
+
+def recount(service) -> dict:
+    """遍历所有会话重新统计，用于核对增量计数器"""
+    totals = {"sessions": 0, "users": set(), "messages": 0, "languages": {}}
+    for session_id in service.get_active_sessions():
+        messages = service.store.get_messages(session_id)
+        session = service.store.get_session(session_id)
+        totals["sessions"] += 1
+        if session["user_id"]:
+            totals["users"].add(session["user_id"])
+        totals["messages"] += len(messages)
+        languages = {}
+        for record in messages:
+            if record.language:
+                languages[record.language] = languages.get(record.language, 0) + 1
+                totals["languages"][record.language] = totals["languages"].get(record.language, 0) + 1
+        statistics = service.get_conversation_statistics(session_id)
+        assert statistics["total_messages"] == len(messages) and statistics["languages"] == languages
+        assert statistics["user_messages"] == sum(record.role == "user" for record in messages)
+        assert statistics["assistant_messages"] == sum(record.role == "assistant" for record in messages)
+        assert statistics["last_message"] == (messages[-1].content if messages else None)
+    stats = service.get_memory_stats()
+    assert stats["total_conversations"] == totals["sessions"]
+    assert stats["total_users"] == len(totals["users"])
+    assert stats["total_messages"] == totals["messages"]
+    assert stats["messages_by_language"] == totals["languages"]
+    return stats
+
+def check_counters(store):
+    """随机追加、裁剪、删除与过期后，增量计数器与重新统计的结果一致"""
+    original_max_length = settings.MAX_HISTORY_LENGTH
+    settings.MAX_HISTORY_LENGTH = 5
+    rng = random.Random(0)
+    try:
+        service = MemoryService(store=store)
+        for step in range(300):
+            session_id = f"c{rng.randrange(12)}"
+            action = rng.random()
+            if action < 0.85:
+                service.add_message(session_id, rng.choice(["u1", "u2", "u3", None]), rng.choice(["user", "assistant"]),
+                                    f"消息 {step}", rng.choice(["zh", "en", None]))
+            elif action < 0.95:
+                service.clear_conversation(session_id)
+            else:
+                store.expire_sessions(time.time() - rng.random() * 0.01)
+            if step % 50 == 0:
+                recount(service)
+        recount(service)
+        service.cleanup_interval = -1
+        service.cleanup_expired_conversations()
+        stats = recount(service)
+        assert stats["total_messages"] == 0 and stats["messages_by_language"] == {} and stats["total_users"] == 0
+    finally:
+        settings.MAX_HISTORY_LENGTH = original_max_length
+
+def check_backend(store):
+    """各后端共用的行为检查"""
+    original_max_length = settings.MAX_HISTORY_LENGTH
+    settings.MAX_HISTORY_LENGTH = 10
+    try:
+        service = MemoryService(store=store)
+        for i in range(12):
+            assert service.add_message("s1", "u1", "user" if i % 2 == 0 else "assistant",
+                                       f"消息 {i}", "zh" if i < 6 else "en")
+        service.add_message("s2", "u2", "user", "hello", "en")
+        service.add_message("s3", None, "user", "你好")
+        assert not service.add_message("s3", None, "user", "bonjour", "fr")
+
+        # 只保留最新的10条消息，顺序不变
+        history = service.get_conversation_history("s1")
+        assert [msg.content for msg in history] == [f"消息 {i}" for i in range(2, 12)]
+        assert [msg.content for msg in service.get_conversation_history("s1", limit=3)] == ["消息 9", "消息 10", "消息 11"]
+        assert history[-1].language.value == "en" and history[0].language.value == "zh"
+        assert service.get_conversation_history("missing") == []
+
+        statistics = service.get_conversation_statistics("s1")
+        assert statistics["total_messages"] == 10 and statistics["user_id"] == "u1"
+        assert statistics["languages"] == {"zh": 4, "en": 6}
+        assert service.get_conversation_statistics("missing") == {}
+        exported = json.loads(service.export_conversation("s1"))
+        assert len(exported["messages"]) == 10 and exported["messages"][0]["language"] == "zh"
+
+        assert service.update_user_preferences("u1", {"language": "zh", "tags": ["数码"]})
+        assert service.update_user_preferences("u1", {"budget": 300})
+        assert service.get_user_preferences("u1") == {"language": "zh", "tags": ["数码"], "budget": 300}
+        assert service.get_user_preferences("nobody") == {}
+
+        stats = recount(service)
+        assert (stats["total_conversations"], stats["total_users"], stats["total_messages"], stats["user_preferences"]) == (3, 2, 12, 1)
+        assert stats["messages_by_language"] == {"zh": 4, "en": 7}
+        assert sorted(service.get_active_sessions()) == ["s1", "s2", "s3"]
+
+        # 滚动摘要：不覆盖更新的摘要，不为不存在的会话写入，删除会话时一并删除
+        # 超出长度被丢弃的消息 0、1 在追加时已压缩进摘要
+        until = store.get_messages("s1")[5].timestamp
+        assert store.get_summary("s1")["summary"] == "用户: 消息 0\n助手: 消息 1"
+        store.set_summary("s1", "用户咨询了消息0到5", until)
+        store.set_summary("s1", "较旧的摘要", until - 1)
+        store.set_summary("missing", "不存在的会话", until)
+        assert store.get_summary("s1") == {"summary": "用户咨询了消息0到5", "summarized_until": until}
+        assert store.get_summary("missing") is None and store.get_session("missing") is None
+        store.set_summary("s2", "待删除", until)
+
+        assert service.clear_conversation("s2")
+        recount(service)
+        assert service.get_conversation_history("s2") == [] and service.get_conversation("s2") is None
+        service.add_message("s2", "u2", "user", "重新开始", "zh")
+        assert store.get_summary("s2") is None
+        assert service.clear_conversation("s2")
+        # 追加时返回实际丢弃的消息，未写满时为空
+        dropped = store.append_message("s1", "u1", MessageRecord("user", "消息 12", time.time()), 10)
+        assert [msg.content for msg in dropped] == ["消息 2"] and dropped[0].language == "zh"
+        assert store.append_message("s3", None, MessageRecord("user", "再见", time.time()), 10) == []
+        assert service.cleanup_expired_conversations() == 0
+        # 过期时间为负数时所有会话都已过期
+        service.cleanup_interval = -1
+        assert service.cleanup_expired_conversations() == 2
+        stats = service.get_memory_stats()
+        assert stats["total_conversations"] == 0 and stats["expired_sessions"] == 2
+    finally:
+        settings.MAX_HISTORY_LENGTH = original_max_length
+
+def test_in_memory_store():
+    """测试进程内存储"""
+    check_backend(InMemoryStore())
+    check_counters(InMemoryStore())
+    print("✅ 进程内存储")
+
+def test_in_memory_ring_buffer():
+    """测试进程内存储的环形缓冲区：写满后原地丢弃最旧的消息，pydantic模型只在读取历史时构建"""
+    original_max_length = settings.MAX_HISTORY_LENGTH
+    settings.MAX_HISTORY_LENGTH = 4
+    try:
+        store = InMemoryStore()
+        service = MemoryService(store=store)
+        service.add_message("ring", "u1", "user", "消息 0", "zh")
+        buffer = store.sessions["ring"].messages
+        for i in range(1, 7):
+            service.add_message("ring", "u1", "user", f"消息 {i}", "zh")
+        # 同一个缓冲区对象，没有复制列表
+        assert store.sessions["ring"].messages is buffer and buffer.maxlen == 4
+        assert all(type(record) is MessageRecord for record in buffer)
+        assert not hasattr(buffer[0], "__dict__")
+
+        history = service.get_conversation_history("ring")
+        assert all(isinstance(msg, Message) for msg in history)
+        assert [msg.content for msg in history] == ["消息 3", "消息 4", "消息 5", "消息 6"]
+        assert [record.content for record in store.get_messages("ring", limit=2)] == ["消息 5", "消息 6"]
+
+        # 历史长度配置变化时重建缓冲区
+        settings.MAX_HISTORY_LENGTH = 2
+        service.add_message("ring", "u1", "assistant", "消息 7", "zh")
+        assert [msg.content for msg in service.get_conversation_history("ring")] == ["消息 6", "消息 7"]
+    finally:
+        settings.MAX_HISTORY_LENGTH = original_max_length
+    print("✅ 环形缓冲区")
+
+def test_in_memory_expiry_and_lru():
+    """测试进程内存储的过期堆与内存上限LRU淘汰"""
+    store = InMemoryStore(max_bytes=0)
+    for i in range(1000):
+        store.append_message(f"s{i}", "u1", MessageRecord("user", "你好", float(i)), 10)
+    # 早期会话之后又有更新：到期时按新的时间重新入堆，不被清理
+    store.append_message("s1", "u1", MessageRecord("user", "还在吗", 5000.0), 10)
+    assert store.expire_sessions(100.0) == 99
+    assert "s1" in store.sessions and "s0" not in store.sessions and "s100" in store.sessions
+    assert len(store._expiry) == 901
+    # 删除后重新创建的会话只保留新的堆条目
+    store.delete_session("s500")
+    store.append_message("s500", "u1", MessageRecord("user", "重新开始", 6000.0), 10)
+    assert store.expire_sessions(1000.0) == 899
+    assert sorted(store.sessions) == ["s1", "s500"] and store.expirations == 998
+    assert store.expire_sessions(1000.0) == 0
+
+    # 内存上限：超出时淘汰最久未使用的整个会话，读取也会刷新使用顺序
+    per_session = InMemoryStore(max_bytes=0)
+    per_session.append_message("probe", "u1", MessageRecord("user", "x" * 100, 0.0), 10)
+    limit = per_session.memory_bytes * 3 + 10
+    store = InMemoryStore(max_bytes=limit)
+    for session_id in ("a", "b", "c"):
+        store.append_message(session_id, "u1", MessageRecord("user", "x" * 100, 0.0), 10)
+    store.get_messages("a")
+    store.append_message("d", "u1", MessageRecord("user", "x" * 100, 0.0), 10)
+    assert list(store.sessions) == ["c", "a", "d"] and store.evictions == 1
+    assert store.memory_bytes <= limit
+
+    stats = recount(MemoryService(store=store))
+    assert stats["total_messages"] == 3 and stats["evicted_sessions"] == 1 and stats["memory_bytes"] == store.memory_bytes
+    assert stats["max_memory_bytes"] == limit
+
+    # 环形缓冲区写满后内存占用不再增长，删除会话后释放
+    store = InMemoryStore(max_bytes=0)
+    for _ in range(10):
+        store.append_message("full", "u1", MessageRecord("user", "x" * 100, 0.0), 10)
+    full_size = store.memory_bytes
+    store.append_message("full", "u1", MessageRecord("user", "x" * 100, 0.0), 10)
+    assert store.memory_bytes == full_size
+    store.delete_session("full")
+    assert store.memory_bytes == 0
+    print("✅ 过期堆与LRU淘汰")
+
+def test_background_eviction_task():
+    """测试启动事件中创建的后台清理任务"""
+    from app import main
+
+    original_service, original_interval = main.memory_service, settings.MEMORY_EVICTION_INTERVAL
+    service = MemoryService(store=InMemoryStore())
+    service.add_message("old", "u1", "user", "你好", "zh")
+    service.cleanup_interval = -1
+    main.memory_service = service
+    settings.MEMORY_EVICTION_INTERVAL = 0.01
+
+    async def run():
+        task = asyncio.create_task(main.evict_expired_conversations())
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            if service.store.expirations:
+                break
+        task.cancel()
+
+    try:
+        asyncio.run(run())
+        assert service.get_active_sessions() == []
+        assert service.get_memory_stats()["expired_sessions"] == 1
+    finally:
+        main.memory_service = original_service
+        settings.MEMORY_EVICTION_INTERVAL = original_interval
+    print("✅ 后台清理任务")
+
+def test_async_reads_off_event_loop():
+    """测试阻塞式存储的异步读取接口在线程池中执行，不占用事件循环"""
+    class BlockingStore(InMemoryStore):
+        blocking = True
+
+        def __init__(self):
+            super().__init__()
+            self.threads = set()
+
+        def get_messages(self, session_id, limit=None):
+            self.threads.add(threading.get_ident())
+            return super().get_messages(session_id, limit)
+
+        def get_summary(self, session_id):
+            self.threads.add(threading.get_ident())
+            return super().get_summary(session_id)
+
+    store = BlockingStore()
+    service = MemoryService(store=store)
+
+    async def run():
+        await service.aadd_message("async", "u1", "user", "物流要多久？", "zh")
+        assert await service.aget_context_for_session("async") == "用户: 物流要多久？"
+        assert [msg.content for msg in await service.aget_conversation_history("async")] == ["物流要多久？"]
+        assert (await service.aget_conversation_summary("async"))["conversation_length"] == 1
+        assert (await service.aget_memory_stats())["total_messages"] == 1
+        assert await service.aclear_conversation("async")
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(run())
+    assert store.threads and loop_thread not in store.threads
+    print("✅ 异步读取在线程池中执行")
+
+def test_sqlite_store():
+    """测试SQLite存储，以及多个连接（多worker）共享与重启后保留"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = str(Path(directory) / "memory.db")
+        store = SQLiteMemoryStore(path)
+        check_backend(store)
+        check_counters(SQLiteMemoryStore(str(Path(directory) / "counters.db")))
+
+        other_worker = MemoryService(store=SQLiteMemoryStore(path))
+        MemoryService(store=store).add_message("shared", "u1", "user", "第一个worker写入", "zh")
+        assert [msg.content for msg in other_worker.get_conversation_history("shared")] == ["第一个worker写入"]
+        other_worker.update_user_preferences("u1", {"language": "en"})
+        other_worker.store.close()
+        store.close()
+
+        reopened = MemoryService(store=SQLiteMemoryStore(path))
+        assert reopened.get_conversation("shared").user_id == "u1"
+        assert reopened.get_user_preferences("u1") == {"language": "en", "tags": ["数码"], "budget": 300}
+        # 旧版本创建的数据库没有计数器表：打开时由已有的消息重建
+        connection = reopened.store._conn
+        connection.execute("DROP TABLE counters")
+        connection.execute("DROP TABLE session_counters")
+        connection.execute("DROP TABLE user_sessions")
+        connection.commit()
+        reopened.store.close()
+        rebuilt = MemoryService(store=SQLiteMemoryStore(path))
+        stats = recount(rebuilt)
+        assert stats["total_messages"] > 0 and stats["user_preferences"] == 1
+        rebuilt.store.close()
+
+        # 多个worker同时打开新数据库：计数器只初始化一次
+        concurrent_path = str(Path(directory) / "concurrent.db")
+        barrier = threading.Barrier(6)
+        opened, errors = [], []
+
+        def open_store():
+            barrier.wait()
+            try:
+                opened.append(SQLiteMemoryStore(concurrent_path))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=open_store) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert not errors and len(opened) == 6
+        assert opened[0]._conn.execute("SELECT COUNT(*) FROM counters WHERE name = 'sessions'").fetchone()[0] == 1
+        for concurrent_store in opened:
+            concurrent_store.close()
+    print("✅ SQLite存储（WAL，多连接共享，重启后保留）")
+
+def test_redis_store():
+    """测试Redis存储（本地Redis协议模拟服务器）"""
+    server = FakeRedisServer()
+    try:
+        store = RedisMemoryStore(url=server.url, prefix="test:")
+        check_backend(store)
+        check_counters(RedisMemoryStore(url=server.url, prefix="counters:"))
+        # 消息以列表保存，追加只写入一条记录
+        MemoryService(store=store).add_message("s4", "u4", "user", "hello", "en")
+        assert server.data["test:messages:s4"] == [json.dumps(store.get_messages("s4")[0].to_dict(), ensure_ascii=False)]
+        store.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+    print("✅ Redis存储")
+
+def test_redis_concurrent_appends():
+    """测试多个worker并发追加同一会话时，丢弃消息的计数调整不重复、不遗漏"""
+    server = FakeRedisServer()
+    try:
+        stores = [RedisMemoryStore(url=server.url, prefix="race:") for _ in range(6)]
+        barrier = threading.Barrier(len(stores))
+
+        def worker(n, store):
+            barrier.wait()
+            for i in range(40):
+                record = MessageRecord("user" if i % 2 == 0 else "assistant", f"{n}-{i}", time.time(),
+                                       "zh" if n % 2 == 0 else "en")
+                store.append_message(f"r{i % 2}", f"u{n}", record, 5)
+
+        threads = [threading.Thread(target=worker, args=(n, store)) for n, store in enumerate(stores)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats = recount(MemoryService(store=stores[0]))
+        assert stats["total_conversations"] == 2 and stats["total_messages"] == 10
+        for store in stores:
+            store.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+    print("✅ Redis并发追加")
+
+def test_create_memory_store_fallback():
+    """测试后端不可用时回退到进程内存储"""
+    original_url = settings.REDIS_URL
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    settings.REDIS_URL = f"redis://127.0.0.1:{port}/0"
+    try:
+        assert isinstance(create_memory_store("redis"), InMemoryStore)
+        assert isinstance(create_memory_store("unknown"), InMemoryStore)
+        assert isinstance(create_memory_store("memory"), InMemoryStore)
+    finally:
+        settings.REDIS_URL = original_url
+    print("✅ 后端不可用时回退")
+
+if __name__ == "__main__":
+    test_in_memory_store()
+    test_in_memory_ring_buffer()
+    test_in_memory_expiry_and_lru()
+    test_background_eviction_task()
+    test_async_reads_off_event_loop()
+    test_sqlite_store()
+    test_redis_store()
+    test_redis_concurrent_appends()
+    test_create_memory_store_fallback()
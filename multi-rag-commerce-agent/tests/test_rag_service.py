@@ -0,0 +1,858 @@
+#!/usr/bin/env python3
+"""
+RAG服务测试脚本
+使用确定性的哈希向量后端和临时ChromaDB目录离线测试入库与检索
+"""
+
+import os
+import sys
+import time
+import tempfile
+import threading
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.models.knowledge import SearchRequest
+from app.services.rag_service import RAGService
+from app.services.embedding_service import HashingEmbeddingBackend, CachedEmbeddingBackend
+from app.services.embedding_cache import EmbeddingCache
+from app.services.vector_store import ChromaVectorStore, NumpyVectorStore
+from app.services.ivfpq_store import IVFPQVectorStore
+from app.services.reranker import Reranker, LexicalOverlapReranker
+from app.services.keyword_index import BM25Index, tokenize, reciprocal_rank_fusion
+from app.utils.cache import TTLCache
+from app.services.ingestion import iter_file_items
+
+class CountingBackend(HashingEmbeddingBackend):
+    """记录实际计算向量次数的哈希后端"""
+
+    def __init__(self, dimension: int = 256):
+        super().__init__(dimension=dimension)
+        self.embedded_texts = 0
+
+    def _embed(self, texts):
+        self.embedded_texts += len(texts)
+        return super()._embed(texts)
+
+def load_sample_items() -> list:
+    """加载示例FAQ和商品数据"""
+    data_dir = project_root / "data"
+    return list(iter_file_items([data_dir / "faq.json", data_dir / "products.json"]))
+
+def create_test_service(persist_directory: str) -> RAGService:
+    """创建使用哈希向量后端的RAG服务"""
+    return RAGService(
+        embedding_backend=HashingEmbeddingBackend(dimension=256),
+        persist_directory=persist_directory,
+        collection_name="test_knowledge"
+    )
+
+def test_hashing_embedding_backend():
+    """测试哈希向量后端的确定性与批处理"""
+    backend = HashingEmbeddingBackend(dimension=64)
+    texts = [f"退货政策 {i}" for i in range(10)]
+
+    batched = backend.embed_documents(texts, batch_size=3)
+    single = [backend.embed_query(text) for text in texts]
+
+    assert len(batched) == len(texts)
+    assert all(len(vector) == 64 for vector in batched)
+    assert batched == single
+    print("✅ 哈希向量后端输出确定且与批大小无关")
+
+def test_add_and_search_with_backend_embeddings():
+    """测试入库与检索使用服务自己计算的向量"""
+    with tempfile.TemporaryDirectory() as persist_directory:
+        service = create_test_service(persist_directory)
+        items = load_sample_items()
+
+        assert service.add_knowledge(items)
+        stored = service.vector_store.collection.get(limit=1, include=["embeddings"])
+        assert len(stored["embeddings"][0]) == 256
+
+        test_queries = [
+            ("退货政策是什么？", "faq_002", None),
+            ("Smart Watch Pro heart rate", "product_003", "en"),
+        ]
+        for query, expected_source, language in test_queries:
+            response = service.search(SearchRequest(query=query, top_k=3, language=language))
+            sources = [result.source for result in response.results]
+            status = "✅" if expected_source in sources else "❌"
+            print(f"{status} 查询: {query} -> {sources}")
+
+            assert expected_source in sources
+            assert all(0.0 <= result.score <= 1.0 for result in response.results)
+
+        info = service.get_collection_info()
+        print(f"知识库信息: {info}")
+        assert info["embedding_model"] == "hashing-256"
+
+def test_embedding_cache_skips_unchanged_chunks():
+    """测试重复入库时只计算变化的分块"""
+    with tempfile.TemporaryDirectory() as persist_directory:
+        counting_backend = CountingBackend()
+        cache = EmbeddingCache(db_path=os.path.join(persist_directory, "cache", "embeddings.db"))
+        service = RAGService(
+            embedding_backend=CachedEmbeddingBackend(counting_backend, cache),
+            persist_directory=persist_directory,
+            collection_name="test_knowledge"
+        )
+        items = load_sample_items()
+
+        assert service.add_knowledge(items)
+        first_run = counting_backend.embedded_texts
+        print(f"首次入库计算向量: {first_run}")
+
+        # 修改一条内容后重新入库
+        items[0].content += " 新增说明。"
+        assert service.clear_knowledge()
+        assert service.add_knowledge(items)
+        second_run = counting_backend.embedded_texts - first_run
+        print(f"重新入库计算向量: {second_run}")
+
+        assert first_run > 0
+        assert second_run == 1
+
+        stats = service.get_collection_info()["embedding_cache"]
+        print(f"缓存统计: {stats}")
+        assert stats["hits"] == first_run - 1
+        assert stats["misses"] == first_run + 1
+        cache.close()
+
+        # 重新打开缓存文件，持久化的向量仍然可用
+        reopened = EmbeddingCache(db_path=cache.db_path)
+        assert reopened.get_stats()["entries"] == first_run + 1
+        reopened.close()
+
+def test_embedding_cache_eviction():
+    """测试缓存容量上限与淘汰"""
+    with tempfile.TemporaryDirectory() as cache_directory:
+        cache = EmbeddingCache(db_path=os.path.join(cache_directory, "embeddings.db"), max_entries=5)
+        backend = CachedEmbeddingBackend(CountingBackend(dimension=8), cache)
+
+        backend.embed_documents([f"文本{i}" for i in range(8)])
+        stats = cache.get_stats()
+        print(f"缓存统计: {stats}")
+
+        assert stats["entries"] == 5
+        assert stats["evictions"] == 3
+        cache.close()
+
+def test_ttl_cache():
+    """测试LRU淘汰与TTL过期"""
+    cache = TTLCache(max_size=2, ttl=0.05)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)  # 淘汰最久未使用的 b
+
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    time.sleep(0.06)
+    assert cache.get("a") is None
+
+    stats = cache.get_stats()
+    print(f"缓存统计: {stats}")
+    assert stats["evictions"] == 1
+    assert stats["expirations"] == 1
+
+def test_search_cache_and_invalidation():
+    """测试检索结果缓存命中与知识库变化后的自动失效"""
+    with tempfile.TemporaryDirectory() as persist_directory:
+        counting_backend = CountingBackend()
+        service = RAGService(
+            embedding_backend=counting_backend,
+            persist_directory=persist_directory,
+            collection_name="test_knowledge"
+        )
+        items = load_sample_items()
+        assert service.add_knowledge(items[:5])
+
+        # 不同写法的相同问题命中同一缓存条目
+        first = service.search(SearchRequest(query="退货政策是什么？", top_k=3))
+        embedded_before = counting_backend.embedded_texts
+        second = service.search(SearchRequest(query="  退货政策是什么? ", top_k=3))
+        assert counting_backend.embedded_texts == embedded_before
+        assert [r.source for r in first.results] == [r.source for r in second.results]
+        assert second.query == "  退货政策是什么? "
+
+        # 过滤条件或top_k不同则不共用缓存
+        service.search(SearchRequest(query="退货政策是什么？", top_k=2))
+        assert service.search_cache.get_stats()["size"] == 2
+
+        # 新增知识后缓存失效，新内容可以被检索到
+        assert service.add_knowledge(items[5:])
+        assert service.search_cache.get_stats()["size"] == 0
+        response = service.search(SearchRequest(query="Smart Watch Pro heart rate", top_k=3))
+        assert "product_003" in [r.source for r in response.results]
+
+        # 清空知识库后不会返回旧结果
+        assert service.clear_knowledge()
+        assert service.search(SearchRequest(query="退货政策是什么？", top_k=3)).results == []
+
+        info = service.get_collection_info()
+        print(f"检索缓存统计: {info['search_cache']}")
+        print(f"查询向量缓存统计: {info['query_embedding_cache']}")
+        assert info["search_cache"]["hits"] == 1
+        assert info["query_embedding_cache"]["hits"] >= 2
+
+def test_sync_knowledge():
+    """测试按内容哈希的增量同步：新增、更新（分块变少）、删除与未变化"""
+    with tempfile.TemporaryDirectory() as persist_directory:
+        counting_backend = CountingBackend()
+        service = RAGService(
+            embedding_backend=counting_backend,
+            persist_directory=persist_directory,
+            collection_name="test_knowledge"
+        )
+        items = load_sample_items()
+        long_item = items[0].model_copy(update={"id": "faq_long", "content": "很长的说明。" * 500})
+        items.append(long_item)
+
+        summary = service.sync_knowledge(items)
+        print(f"首次同步: {summary}")
+        assert summary["added"] == len(items) and summary["chunks_deleted"] == 0
+        long_chunks = sum(doc_id.startswith("faq_long_chunk_") for doc_id in service.vector_store.get()["ids"])
+        total_chunks = service.vector_store.count()
+        assert total_chunks > len(items)
+
+        # 再次同步：没有变化，不重新计算向量，缓存不失效
+        embedded_before = counting_backend.embedded_texts
+        version_before = service.knowledge_version
+        summary = service.sync_knowledge(items)
+        assert summary["unchanged"] == len(items) and summary["chunks_written"] == 0
+        assert counting_backend.embedded_texts == embedded_before
+        assert service.knowledge_version == version_before
+
+        # 更新一条（分块变少）、删除一条
+        items[-1] = long_item.model_copy(update={"content": "简短的说明。"})
+        removed = items.pop(1)
+        summary = service.sync_knowledge(items)
+        print(f"增量同步: {summary}")
+        assert (summary["added"], summary["updated"], summary["deleted"]) == (0, 1, 1)
+        assert summary["chunks_written"] == 1
+        assert counting_backend.embedded_texts == embedded_before + 1
+
+        stored_ids = set(service.vector_store.get()["ids"])
+        assert "faq_long_chunk_0" in stored_ids and "faq_long_chunk_1" not in stored_ids
+        assert not any(doc_id.startswith(f"{removed.id}_chunk_") for doc_id in stored_ids)
+        assert service.vector_store.count() == len(service.keyword_index) == len(stored_ids)
+        assert len(stored_ids) < total_chunks
+        assert long_chunks > 1
+
+def test_bm25_index_and_rrf():
+    """测试中日韩分词、过滤后打分与倒数排名融合"""
+    assert tokenize("智能手表 Pro X-200") == ["智能", "能手", "手表", "pro", "x-200"]
+    assert tokenize("表") == ["表"]
+
+    index = BM25Index()
+    index.add(
+        ["a", "b", "c"],
+        ["智能手表支持心率监测", "无线耳机主动降噪", "Smart Watch Pro heart rate"],
+        [
+            {"source_id": "a", "category": "product", "language": "zh"},
+            {"source_id": "b", "category": "product", "language": "zh"},
+            {"source_id": "c", "category": "product", "language": "en"},
+        ]
+    )
+    assert [hit["id"] for hit in index.search("手表心率")] == ["a"]
+    assert index.search("手表心率", language="en") == []
+    assert [hit["id"] for hit in index.search("smart watch", category="product")] == ["c"]
+
+    # 覆盖与删除
+    index.add(["a"], ["蓝牙音箱"], [{"source_id": "a", "category": "product", "language": "zh"}])
+    assert index.search("手表") == []
+    index.remove(["a"])
+    assert len(index) == 2 and index.search("音箱") == []
+
+    fused = reciprocal_rank_fusion([["x", "y"], ["y", "z"]], k=60)
+    assert [doc_id for doc_id, _ in fused] == ["y", "x", "z"]
+    print("✅ BM25索引与RRF融合正确")
+
+def test_hybrid_search_exact_names():
+    """测试混合检索对精确商品名的召回，以及重启后重建关键词索引"""
+    with tempfile.TemporaryDirectory() as persist_directory:
+        service = create_test_service(persist_directory)
+        assert service.add_knowledge(load_sample_items())
+
+        response = service.search(SearchRequest(query="Smart Watch Pro", top_k=3))
+        sources = [result.source for result in response.results]
+        print(f"混合检索: Smart Watch Pro -> {sources}")
+        assert sources[0] == "product_003"
+        assert "bm25_score" in response.results[0].metadata
+        assert all(0.0 <= result.score <= 1.0 for result in response.results)
+
+        # 过滤条件同时作用于两路检索
+        response = service.search(SearchRequest(query="Smart Watch Pro", top_k=3, language="zh"))
+        assert all(result.metadata["language"] == "zh" for result in response.results)
+
+        # 新建服务实例时从持久化的集合重建关键词索引
+        reopened = create_test_service(persist_directory)
+        assert len(reopened.keyword_index) == len(service.keyword_index) > 0
+
+        assert service.clear_knowledge()
+        assert len(service.keyword_index) == 0
+
+def test_vector_store_backends():
+    """测试两种向量存储的写入、覆盖、过滤、删除与持久化行为一致"""
+    backend = HashingEmbeddingBackend(dimension=64)
+    texts = ["智能手表支持心率监测", "无线耳机主动降噪", "Smart Watch Pro heart rate", "Return policy 30 days"]
+    metadatas = [
+        {"source_id": "p1", "category": "product", "language": "zh"},
+        {"source_id": "p2", "category": "product", "language": "zh"},
+        {"source_id": "p3", "category": "product", "language": "en"},
+        {"source_id": "f1", "category": "policy", "language": "en"},
+    ]
+    ids = [f"{metadata['source_id']}_chunk_0" for metadata in metadatas]
+
+    with tempfile.TemporaryDirectory() as directory:
+        stores = {
+            "chroma": lambda: ChromaVectorStore(os.path.join(directory, "chroma"), "test_store"),
+            "numpy": lambda: NumpyVectorStore(os.path.join(directory, "numpy")),
+        }
+        for name, open_store in stores.items():
+            store = open_store()
+            store.add(ids, texts, backend.embed_documents(texts), metadatas)
+            store.add(ids[:1], texts[:1], backend.embed_documents(texts[:1]), metadatas[:1])
+            assert store.count() == 4
+
+            results = store.query(backend.embed_queries(["smart watch", "心率"]), n_results=2)
+            assert results["ids"][0][0] == "p3_chunk_0"
+            assert results["ids"][1][0] == "p1_chunk_0"
+            assert abs(results["distances"][0][0] - (1 - sum(
+                a * b for a, b in zip(backend.embed_query("smart watch"), backend.embed_query(texts[2]))
+            ))) < 1e-4
+
+            # 多字段过滤与 $in 过滤
+            results = store.query(backend.embed_queries(["smart watch"]), n_results=5,
+                                  where={"category": "product", "language": "en"})
+            assert results["ids"] == [["p3_chunk_0"]]
+            results = store.query(backend.embed_queries(["smart watch"]), n_results=5,
+                                  where={"language": {"$in": ["zh"]}})
+            assert sorted(results["ids"][0]) == ["p1_chunk_0", "p2_chunk_0"]
+
+            store.delete(["p2_chunk_0"])
+            assert store.count() == 3
+            assert store.get(where={"language": "zh"})["ids"] == ["p1_chunk_0"]
+
+            # 落盘后重新打开数据仍在
+            store.flush()
+            reopened = open_store()
+            assert reopened.count() == 3
+            assert sorted(reopened.get()["ids"]) == ["f1_chunk_0", "p1_chunk_0", "p3_chunk_0"]
+            reopened.clear()
+            assert reopened.count() == 0
+            print(f"✅ {name} 向量存储行为正确")
+
+def test_numpy_vector_store_search():
+    """测试RAG服务使用numpy向量存储时的入库与检索"""
+    with tempfile.TemporaryDirectory() as persist_directory:
+        service = RAGService(
+            embedding_backend=HashingEmbeddingBackend(dimension=256),
+            persist_directory=persist_directory,
+            collection_name="test_knowledge",
+            vector_store=NumpyVectorStore(os.path.join(persist_directory, "numpy"))
+        )
+        assert service.add_knowledge(load_sample_items())
+
+        response = service.search(SearchRequest(query="退货政策是什么？", top_k=3, category="policy", language="zh"))
+        sources = [result.source for result in response.results]
+        print(f"numpy检索: {sources}")
+        assert sources == ["faq_002"]
+        assert service.get_collection_info()["vector_store"] == "numpy"
+
+def test_ivfpq_vector_store():
+    """测试IVF-PQ索引的训练、增量写入、过滤与持久化"""
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((8, 32)).astype(np.float32)
+    vectors = centers[np.arange(600) % 8] + 0.3 * rng.standard_normal((600, 32)).astype(np.float32)
+    ids = [f"doc_{i}" for i in range(600)]
+    metadatas = [{"category": "product", "language": "zh" if i % 2 else "en"} for i in range(600)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = IVFPQVectorStore(directory, nlist=8, nprobe=8, m=8, train_threshold=400)
+        store.add(ids[:300], ids[:300], vectors[:300].tolist(), metadatas[:300])
+        assert not store.get_stats()["trained"]
+
+        # 达到阈值后训练，之后的写入增量编码
+        store.add(ids[300:500], ids[300:500], vectors[300:500].tolist(), metadatas[300:500])
+        assert store.get_stats()["trained"]
+        store.add(ids[500:], ids[500:], vectors[500:].tolist(), metadatas[500:])
+
+        # 扫描全部列表并精确重排时，查询自身应排在第一
+        results = store.query(vectors[[10, 550]].tolist(), n_results=3)
+        assert [row[0] for row in results["ids"]] == ["doc_10", "doc_550"]
+        assert results["distances"][0][0] < 1e-5
+
+        results = store.query(vectors[[10]].tolist(), n_results=5, where={"language": "zh"})
+        assert all(metadata["language"] == "zh" for metadata in results["metadatas"][0])
+
+        stats = store.get_stats()
+        print(f"IVF-PQ统计: {stats}")
+        assert stats["code_bytes"] == 600 * 8
+
+        # 只探测一个列表时，严格或中等的过滤条件仍返回 top_k 个结果
+        for i in range(0, 600, 75):
+            metadatas[i]["category"] = "faq"
+        store.add(ids, ids, vectors.tolist(), metadatas)
+        store.nprobe = 1
+        for where, expected in (({"language": "zh"}, 300), ({"category": "faq"}, 8)):
+            assert len(store.get(where=where)["ids"]) == expected
+            results = store.query(vectors[[0, 1, 2]].tolist(), n_results=10, where=where)
+            assert [len(row) for row in results["ids"]] == [min(10, expected)] * 3
+            assert all(
+                all(metadata[field] == value for field, value in where.items())
+                for row in results["metadatas"] for metadata in row
+            )
+        store.nprobe = 8
+
+        store.flush()
+        reopened = IVFPQVectorStore(directory, nprobe=2)
+        assert reopened.get_stats()["trained"] and reopened.count() == 600
+        assert reopened.query(vectors[[550]].tolist(), n_results=1)["ids"] == [["doc_550"]]
+        print("✅ IVF-PQ索引训练、增量写入与持久化正确")
+
+def test_ivfpq_training_outside_lock():
+    """测试IVF-PQ训练期间检索不被阻塞，训练后的写入增量追加到倒排列表"""
+    import numpy as np
+    from app.services import ivfpq_store
+
+    rng = np.random.default_rng(1)
+    vectors = rng.standard_normal((700, 16)).astype(np.float32)
+    ids = [f"doc_{i}" for i in range(700)]
+    metadatas = [{"category": "product", "language": "zh"}] * 700
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = IVFPQVectorStore(directory, nlist=4, nprobe=4, m=4, train_threshold=300)
+        store.add(ids[:299], ids[:299], vectors[:299].tolist(), metadatas[:299])
+
+        # 训练过程中从另一个线程检索与写入
+        original_kmeans = ivfpq_store.kmeans
+        during_training = []
+
+        def slow_kmeans(*args, **kwargs):
+            if not during_training:
+                def query():
+                    during_training.append(store.query(vectors[[5]].tolist(), n_results=1)["ids"])
+                    store.add(ids[300:310], ids[300:310], vectors[300:310].tolist(), metadatas[300:310])
+                thread = threading.Thread(target=query)
+                thread.start()
+                thread.join(timeout=5)
+                assert not thread.is_alive()
+            return original_kmeans(*args, **kwargs)
+
+        ivfpq_store.kmeans = slow_kmeans
+        try:
+            store.add(ids[299:300], ids[299:300], vectors[299:300].tolist(), metadatas[299:300])
+        finally:
+            ivfpq_store.kmeans = original_kmeans
+        assert during_training == [[["doc_5"]]]
+        assert store.get_stats()["trained"] and store.count() == 310
+        # 训练期间写入的行已用新码本编码
+        assert (store._list_ids[:310] >= 0).all()
+
+        def assert_lists_complete():
+            lists = store._get_inverted_lists()
+            rows = np.concatenate(lists)
+            assert sorted(rows.tolist()) == list(range(store._size))
+            for list_id, inverted_list in enumerate(lists):
+                assert (store._list_ids[inverted_list] == list_id).all()
+
+        assert_lists_complete()
+        built = store._inverted_lists
+        store.add(ids[310:], ids[310:], vectors[310:].tolist(), metadatas[310:])
+        # 覆盖写入的行移动到新的列表
+        store.add(ids[:20], ids[:20], vectors[400:420].tolist(), metadatas[:20])
+        assert store._inverted_lists is built
+        assert_lists_complete()
+        results = store.query(vectors[[400, 650]].tolist(), n_results=2)
+        assert {results["ids"][0][0], results["ids"][0][1]} == {"doc_0", "doc_400"}
+        assert results["ids"][1][0] == "doc_650"
+        print("✅ IVF-PQ在锁外训练并增量更新倒排列表")
+
+def test_metadata_filters():
+    """测试价格范围、品牌与特性包含过滤（chroma 与 numpy 两种后端，检索前过滤）"""
+    items = load_sample_items()
+    with tempfile.TemporaryDirectory() as persist_directory:
+        for name, vector_store in (
+            ("chroma", None),
+            ("numpy", NumpyVectorStore(os.path.join(persist_directory, "numpy")))
+        ):
+            service = RAGService(
+                embedding_backend=HashingEmbeddingBackend(dimension=256),
+                persist_directory=persist_directory,
+                collection_name="test_filters",
+                vector_store=vector_store
+            )
+            assert service.add_knowledge(items)
+
+            def sources(**filters):
+                response = service.search(SearchRequest(query="充电 battery", top_k=10, **filters))
+                return sorted({result.source for result in response.results})
+
+            assert sources(brand="TechBrand") == ["product_001", "product_003"]
+            assert sources(min_price=100, max_price=200) == ["product_002", "product_004"]
+            assert sources(max_price=89.99) == ["product_005", "product_006"]
+            assert sources(features=["amoled屏幕"]) == ["product_001"]
+            assert sources(features=["Fast Charging", "Bluetooth 5.0"]) == ["product_004"]
+            assert sources(language="en", brand="PowerTech", min_price=50) == ["product_006"]
+            assert sources(brand="NoSuchBrand") == []
+
+            response = service.search(SearchRequest(query="降噪耳机", top_k=3, brand="AudioTech"))
+            assert response.results[0].metadata["price"] == 159.99
+            print(f"✅ {name} 元数据过滤正确")
+
+def test_numpy_metadata_indexes():
+    """测试numpy向量存储的排序数组与倒排对在覆盖写入、删除与重新打开后保持一致"""
+    with tempfile.TemporaryDirectory() as directory:
+        store = NumpyVectorStore(directory)
+        ids = [f"p{i}" for i in range(6)]
+        metadatas = [
+            {"category": "product", "language": "zh", "price": float(i * 10), "brand": f"b{i % 2}",
+             "features": "防水|蓝牙" if i % 3 == 0 else "蓝牙"}
+            for i in range(6)
+        ]
+        metadatas[5] = {"category": "faq", "language": "zh"}
+        store.add(ids, ids, [[1.0, float(i)] for i in range(6)], metadatas)
+
+        def matching(where):
+            return sorted(store.get(where=where)["ids"])
+
+        assert matching({"price": {"$gte": 10, "$lt": 30}}) == ["p1", "p2"]
+        assert matching({"price": {"$gt": 30}}) == ["p4"]
+        assert matching({"price": 20}) == ["p2"]
+        assert matching({"features": {"$contains": "防水"}}) == ["p0", "p3"]
+        assert matching({"features": {"$contains": ["防水", "蓝牙"]}, "brand": "b1"}) == ["p3"]
+
+        # 覆盖写入后旧的价格与特性不再命中，删除的行不再命中
+        store.add(["p3"], ["p3"], [[1.0, 3.0]], [{"category": "product", "language": "zh", "price": 99.0, "brand": "b1"}])
+        store.delete(["p0"])
+        assert matching({"features": {"$contains": "防水"}}) == []
+        assert matching({"price": {"$gte": 90}}) == ["p3"]
+
+        store.close()
+        reopened = NumpyVectorStore(directory)
+        assert sorted(reopened.get(where={"price": {"$lte": 20}})["ids"]) == ["p1", "p2"]
+        assert sorted(reopened.get(where={"features": {"$contains": "蓝牙"}})["ids"]) == ["p1", "p2", "p4"]
+        results = reopened.query([[1.0, 4.0]], n_results=3, where={"brand": "b0", "price": {"$lte": 40}})
+        assert results["ids"] == [["p4", "p2"]]
+        print("✅ numpy元数据索引正确")
+
+def test_chroma_features_filter():
+    """测试ChromaDB的特性包含条件在向量打分前过滤：条件很严格时仍返回 top_k 条，覆盖写入后旧特性不再命中"""
+    with tempfile.TemporaryDirectory() as directory:
+        store = ChromaVectorStore(directory, "test_features")
+        # 400条不含特性的文档离查询更近，只有10条含“防水”
+        ids = [f"d{i}" for i in range(410)]
+        metadatas = [{"category": "product", "features": "防水|蓝牙" if i >= 400 else "蓝牙"} for i in range(410)]
+        store.add(ids, ids, [[1.0, i / 1000.0] for i in range(410)], metadatas)
+
+        results = store.query([[1.0, 0.0]], n_results=5, where={"features": {"$contains": "防水"}})
+        assert results["ids"] == [["d400", "d401", "d402", "d403", "d404"]]
+        assert results["metadatas"][0][0] == {"category": "product", "features": "防水|蓝牙"}
+        where = {"features": {"$contains": ["防水", "蓝牙"]}, "category": "product"}
+        assert len(store.get(where=where)["ids"]) == 10
+
+        store.add(["d400"], ["d400"], [[1.0, 0.4]], [{"category": "product", "features": "蓝牙"}])
+        assert "d400" not in store.get(where={"features": {"$contains": "防水"}})["ids"]
+
+        # 旧版本写入的集合没有布尔键，打开时补写
+        legacy = store.client.get_or_create_collection("test_legacy", metadata={"hnsw:space": "cosine"},
+                                                       embedding_function=None)
+        legacy.add(ids=["old0", "old1"], documents=["old0", "old1"], embeddings=[[0.0, 1.0], [1.0, 0.0]],
+                   metadatas=[{"category": "product", "features": "防水"}, {"category": "product", "features": "蓝牙"}])
+        reopened = ChromaVectorStore(directory, "test_legacy")
+        assert reopened.get(where={"features": {"$contains": "防水"}})["ids"] == ["old0"]
+    print("✅ ChromaDB特性过滤在打分前执行")
+
+def test_numpy_store_persists_on_flush():
+    """测试numpy向量存储分批写入时不重写列文件，flush 时原子地落盘"""
+    with tempfile.TemporaryDirectory() as directory:
+        store = NumpyVectorStore(directory)
+        metadatas = [{"category": "product", "language": "zh"}] * 10
+        store.add([f"d{i}" for i in range(10)], ["文档"] * 10, [[1.0, float(i)] for i in range(10)], metadatas)
+        store.flush()
+        columns_mtime = os.stat(os.path.join(directory, "columns.npz")).st_mtime_ns
+
+        for batch in range(1, 20):
+            ids = [f"d{batch * 10 + i}" for i in range(10)]
+            store.add(ids, ids, [[1.0, float(batch * 10 + i)] for i in range(10)], metadatas)
+        store.delete(["d0"])
+        assert os.stat(os.path.join(directory, "columns.npz")).st_mtime_ns == columns_mtime
+        # 未落盘时重新打开只能看到上次落盘的数据
+        assert NumpyVectorStore(directory).count() == 10
+
+        store.flush()
+        assert not [name for name in os.listdir(directory) if name.endswith(".tmp")]
+        reopened = NumpyVectorStore(directory)
+        assert reopened.count() == 199 and "d0" not in reopened.get()["ids"]
+        assert reopened.get(ids=["d150"])["documents"] == ["d150"]
+        print("✅ numpy向量存储在flush时落盘")
+
+class CountingNumpyStore(NumpyVectorStore):
+    """记录查询调用的numpy向量存储"""
+
+    def __init__(self, directory):
+        super().__init__(directory)
+        self.calls = []
+
+    def query(self, query_embeddings, n_results, where=None):
+        self.calls.append((len(query_embeddings), where))
+        return super().query(query_embeddings, n_results, where)
+
+def test_multi_query_mixed_language():
+    """测试中英混合问题拆分为各语言子查询分别检索，并与完整问题的结果融合"""
+    from app.config import settings
+
+    with tempfile.TemporaryDirectory() as persist_directory:
+        store = CountingNumpyStore(os.path.join(persist_directory, "numpy"))
+        service = RAGService(
+            embedding_backend=HashingEmbeddingBackend(dimension=256),
+            persist_directory=persist_directory,
+            collection_name="test_multi_query",
+            vector_store=store
+        )
+        assert service.add_knowledge(load_sample_items())
+        query = "智能手表有什么功能？What features does the smart watch have?"
+
+        # 默认开启：完整问题与两个子查询各一次查询，子查询的语言过滤在检索时生效
+        assert settings.MULTI_QUERY_RETRIEVAL
+        response = service.search(SearchRequest(query=query, top_k=4))
+        sources = [result.source for result in response.results]
+        print(f"多查询检索: {sources}")
+        assert sorted(store.calls, key=str) == [(1, None), (1, {"language": "en"}), (1, {"language": "zh"})]
+        assert "product_001" in sources and "product_003" in sources
+        assert {language for result in response.results for language in result.metadata["subquery_languages"]} == {"en", "zh"}
+
+        # 与普通查询同一批检索时，完整的查询合并为一次批量查询
+        store.calls.clear()
+        responses = service.search_batch([
+            SearchRequest(query="退货政策是什么？", top_k=4),
+            SearchRequest(query="充电宝容量多大？How big is the power bank?", top_k=4)
+        ])
+        assert len(store.calls) == 3 and store.calls[0] == (2, None)
+        assert {"product_005", "product_006"} <= {result.source for result in responses[1].results}
+
+        # 指定语言过滤时不拆分
+        store.calls.clear()
+        service.search(SearchRequest(query=query, top_k=4, language="zh"))
+        assert store.calls == [(1, {"language": "zh"})]
+
+        settings.MULTI_QUERY_RETRIEVAL = False
+        try:
+            store.calls.clear()
+            service.search_cache.clear()
+            service.search(SearchRequest(query=query, top_k=4))
+            assert store.calls == [(1, None)]
+        finally:
+            settings.MULTI_QUERY_RETRIEVAL = True
+        print("✅ 混合语言多查询检索正确")
+
+class PreferSourceReranker(Reranker):
+    """把指定来源排到最前的重排序器"""
+
+    def __init__(self, preferred: str):
+        self.preferred = preferred
+        self.calls = 0
+
+    def score(self, query, documents):
+        self.calls += 1
+        return [1.0 if self.preferred in document else 0.0 for document in documents]
+
+class SlowReranker(PreferSourceReranker):
+    """每次打分耗时 delay 秒的重排序器"""
+
+    def __init__(self, preferred: str, delay: float):
+        super().__init__(preferred)
+        self.delay = delay
+
+    def score(self, query, documents):
+        time.sleep(self.delay)
+        return super().score(query, documents)
+
+def test_rerank_stage():
+    """测试重排序阶段：召回更多候选后重排并截断、延迟预算超出时跳过"""
+    with tempfile.TemporaryDirectory() as persist_directory:
+        reranker = PreferSourceReranker("Germany")
+        service = RAGService(
+            embedding_backend=HashingEmbeddingBackend(dimension=256),
+            persist_directory=persist_directory,
+            collection_name="test_rerank",
+            reranker=reranker
+        )
+        assert service.add_knowledge(load_sample_items())
+
+        plain = service.search(SearchRequest(query="What is the return policy?", top_k=2, rerank=False))
+        assert len(plain.results) == 2 and "rerank_score" not in plain.results[0].metadata
+
+        reranked = service.search(SearchRequest(query="What is the return policy?", top_k=2, rerank=True))
+        assert len(reranked.results) == 2
+        assert reranked.results[0].source == "faq_012"
+        assert reranked.results[0].metadata["rerank_score"] == 1.0
+        assert service.rerank_stats["reranked"] == 1
+
+        # 预算为0时跳过重排序，且结果不缓存（再次请求仍会尝试重排序）
+        for _ in range(2):
+            skipped = service.search(SearchRequest(query="Shipping time", top_k=2, rerank=True, rerank_budget_ms=0))
+            assert len(skipped.results) == 2 and "rerank_score" not in skipped.results[0].metadata
+        assert service.rerank_stats["skipped_budget"] == 2 and reranker.calls == 1
+        assert service.get_collection_info()["rerank"]["reranked"] == 1
+
+        # 多个线程同时重排序时计数不丢失；与上下文组装统计共用一把锁
+        candidates = plain.results
+        threads = [
+            threading.Thread(target=lambda: [service._rerank("q", candidates, 1, time.time(), 1e9) for _ in range(200)])
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert service.rerank_stats["reranked"] == 801
+        assert service.context_assembler._lock is service._stats_lock
+
+        # 批量检索中每个请求的延迟预算分别计算：前面的请求（同组或前一组）重排序较慢时，后面的请求仍然重排序
+        service._reranker = SlowReranker("Germany", delay=0.15)
+        responses = service.search_batch([
+            SearchRequest(query="Payment methods", top_k=2, rerank=True, rerank_budget_ms=100),
+            SearchRequest(query="Order tracking", top_k=2, rerank=True, rerank_budget_ms=100),
+            SearchRequest(query="Warranty period", top_k=3, rerank=True, rerank_budget_ms=100)
+        ])
+        assert all("rerank_score" in response.results[0].metadata for response in responses)
+        assert service.rerank_stats["skipped_budget"] == 2
+
+    # 默认的词项重叠重排序器
+    scores = LexicalOverlapReranker().score("智能手表 心率", ["智能手表支持心率监测", "充电宝", ""])
+    assert scores[0] == 1.0 and scores[1] == 0.0 and scores[2] == 0.0
+    print("✅ 重排序阶段正确")
+
+def test_blue_green_reload():
+    """测试版本化集合的重建、校验、切换、回滚与跨实例刷新"""
+    items = load_sample_items()
+    with tempfile.TemporaryDirectory() as persist_directory:
+        service = create_test_service(persist_directory)
+        assert service.add_knowledge(items[:5])
+        query = SearchRequest(query="退货政策是什么？", top_k=3)
+
+        # 重建期间检索持续返回结果
+        stats_holder = {}
+        reload_thread = threading.Thread(
+            target=lambda: stats_holder.update(service.reload_knowledge(items, progress_interval=0, batch_size=4))
+        )
+        reload_thread.start()
+        searches = 0
+        while reload_thread.is_alive() or searches == 0:
+            assert service.search(query).results
+            searches += 1
+        reload_thread.join()
+        stats = stats_holder
+        print(f"重建统计: 版本 {stats['version']}, {stats['document_count']} 个文档, 期间检索 {searches} 次")
+        assert "error" not in stats
+        assert service.active_collection == "test_knowledge_v1"
+        assert stats["versions"] == ["test_knowledge", "test_knowledge_v1"]
+        assert service.vector_store.count() == stats["chunks_written"] == len(service.keyword_index)
+
+        # 只保留最近两个版本
+        stats = service.reload_knowledge(items, progress_interval=0)
+        assert stats["versions"] == ["test_knowledge_v1", "test_knowledge_v2"]
+        assert stats["dropped_versions"] == ["test_knowledge"]
+
+        # 校验失败时不切换
+        version_before = service.knowledge_version
+        stats = service.reload_knowledge([], progress_interval=0)
+        assert "error" in stats and service.active_collection == "test_knowledge_v2"
+        assert service.knowledge_version == version_before
+
+        # 另一个实例（如服务进程）从别名打开当前版本，并在别名切换后刷新
+        other = create_test_service(persist_directory)
+        assert other.active_collection == "test_knowledge_v2"
+        assert not other.refresh_active_version()
+
+        # 回滚到上一版本
+        assert service.rollback_knowledge()
+        assert service.active_collection == "test_knowledge_v1"
+        assert service.search(query).results
+        assert not service.rollback_knowledge()
+        assert other.refresh_active_version()
+        assert other.active_collection == "test_knowledge_v1"
+        assert other.search(query).results
+
+        # 回滚后重建：仍在使用的 v1 不被删除，删除被回滚掉的 v2，再回滚回到 v1
+        stats = service.reload_knowledge(items, progress_interval=0)
+        assert stats["versions"] == ["test_knowledge_v1", "test_knowledge_v4"]
+        assert stats["dropped_versions"] == ["test_knowledge_v2"]
+        assert other.search(query).results
+        assert service.rollback_knowledge()
+        assert service.active_collection == "test_knowledge_v1" and service.search(query).results
+        print("✅ 蓝绿切换、回滚与跨实例刷新正确")
+
+def open_handles(directory: str) -> list:
+    """本进程打开的、位于 directory 下的文件描述符与内存映射"""
+    handles = []
+    for fd in os.listdir("/proc/self/fd"):
+        try:
+            handles.append(os.readlink(f"/proc/self/fd/{fd}"))
+        except OSError:
+            continue
+    with open("/proc/self/maps") as f:
+        handles.extend(line.split()[-1] for line in f if len(line.split()) >= 6)
+    return [handle for handle in handles if handle.startswith(directory + os.sep)]
+
+def test_reload_releases_previous_store():
+    """测试切换版本后，旧版本的向量存储在进行中的检索结束后关闭，释放文件句柄与内存映射"""
+    items = load_sample_items()
+    with tempfile.TemporaryDirectory() as persist_directory:
+        service = RAGService(
+            embedding_backend=HashingEmbeddingBackend(dimension=256),
+            persist_directory=persist_directory,
+            collection_name="test_release",
+            vector_store_factory=lambda name: NumpyVectorStore(os.path.join(persist_directory, "numpy", name))
+        )
+        assert service.add_knowledge(items[:5])
+        first_directory = os.path.join(persist_directory, "numpy", "test_release")
+        assert open_handles(first_directory)
+
+        # 模拟切换时仍在进行的检索：检索结束前不关闭旧版本
+        with service._use_active() as (vector_store, _, _):
+            assert "error" not in service.reload_knowledge(items, progress_interval=0)
+            assert vector_store.count() > 0
+            assert open_handles(first_directory)
+        assert not open_handles(first_directory)
+
+        # 没有进行中的检索时切换后立即关闭；回滚打开的版本同样在再次切换时关闭
+        second_directory = os.path.join(persist_directory, "numpy", "test_release_v1")
+        assert "error" not in service.reload_knowledge(items, progress_interval=0)
+        assert not open_handles(second_directory)
+        assert service.rollback_knowledge() and open_handles(second_directory)
+        assert "error" not in service.reload_knowledge(items, progress_interval=0)
+        assert not open_handles(second_directory)
+        assert service.search(SearchRequest(query="退货政策是什么？", top_k=3)).results
+    print("✅ 切换版本后释放旧版本的存储")
+
+if __name__ == "__main__":
+    test_hashing_embedding_backend()
+    test_add_and_search_with_backend_embeddings()
+    test_embedding_cache_skips_unchanged_chunks()
+    test_embedding_cache_eviction()
+    test_ttl_cache()
+    test_search_cache_and_invalidation()
+    test_sync_knowledge()
+    test_bm25_index_and_rrf()
+    test_hybrid_search_exact_names()
+    test_vector_store_backends()
+    test_numpy_vector_store_search()
+    test_ivfpq_vector_store()
+    test_ivfpq_training_outside_lock()
+    test_metadata_filters()
+    test_numpy_metadata_indexes()
+    test_chroma_features_filter()
+    test_numpy_store_persists_on_flush()
+    test_multi_query_mixed_language()
+    test_rerank_stage()
+    test_blue_green_reload()
+    test_reload_releases_previous_store()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+流式聊天测试脚本
+使用假的流式LLM验证SSE事件格式、首个token时间与流结束后的记忆写入
+"""
+
+import sys
+import json
+import time
+import asyncio
+from pathlib import Path
+
+import httpx
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from langchain.schema import AIMessage
+from langchain_core.messages import AIMessageChunk
+from app.main import app
+from app.models.chat import ChatRequest
+from app.services.agent_service import agent_service
+from app.services.rag_service import rag_service
+from app.services.memory_service import memory_service
+
+TOKENS = ["智能手表", "支持", "心率监测", "和运动追踪。"]
+TOKEN_DELAY = 0.05
+
+class FakeStreamingLLM:
+    """逐个产出token的假LLM"""
+
+    async def ainvoke(self, messages):
+        return AIMessage(content="business")
+
+    async def astream(self, messages):
+        for token in TOKENS:
+            await asyncio.sleep(TOKEN_DELAY)
+            yield AIMessageChunk(content=token)
+
+def fake_context(query: str, top_k: int = 5) -> str:
+    """固定的检索结果"""
+    return "内容: 智能手表 Pro 支持心率监测、运动追踪。\n来源: product_001"
+
+def parse_sse(body: str) -> list:
+    """解析SSE响应体"""
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+def _patch():
+    originals = (agent_service.llm, rag_service.get_relevant_context)
+    agent_service.llm = FakeStreamingLLM()
+    rag_service.get_relevant_context = fake_context
+    return originals
+
+def _restore(originals):
+    agent_service.llm, rag_service.get_relevant_context = originals
+
+def test_astream_chat_yields_tokens_before_completion():
+    """测试首个token在生成结束前就已产出"""
+    originals = _patch()
+    session_id = "stream_agent_session"
+    memory_service.clear_conversation(session_id)
+
+    async def collect():
+        start_time = time.perf_counter()
+        received = []
+        async for event in agent_service.astream_chat(ChatRequest(
+            message="智能手表有什么功能？", session_id=session_id, user_id="stream_user"
+        )):
+            received.append((event, time.perf_counter() - start_time))
+        return received
+
+    try:
+        received = asyncio.run(collect())
+    finally:
+        _restore(originals)
+
+    token_events = [(event, at) for event, at in received if event["event"] == "token"]
+    done_event, done_at = received[-1]
+    print(f"首个token: {token_events[0][1] * 1000:.1f}ms, 完成: {done_at * 1000:.1f}ms")
+
+    assert [event["data"]["content"] for event, _ in token_events] == TOKENS
+    assert token_events[0][1] < done_at - TOKEN_DELAY * (len(TOKENS) - 2)
+    assert done_event["event"] == "done"
+    assert done_event["data"]["sources"] == ["product_001"]
+    assert "first_token_ms" in done_event["data"]["metadata"]["timings"]
+
+    # 流结束后写入完整的助手回复
+    history = memory_service.get_conversation_history(session_id)
+    assert history[-1].role == "assistant"
+    assert history[-1].content == "".join(TOKENS)
+
+def test_chat_stream_endpoint():
+    """测试 /api/v1/chat/stream 的SSE输出"""
+    originals = _patch()
+    session_id = "stream_api_session"
+    memory_service.clear_conversation(session_id)
+
+    async def request():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/api/v1/chat/stream", json={
+                "message": "智能手表有什么功能？",
+                "user_id": "stream_user",
+                "session_id": session_id
+            })
+
+    try:
+        response = asyncio.run(request())
+    finally:
+        _restore(originals)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = parse_sse(response.text)
+    for event, data in events:
+        print(f"{event}: {data}")
+
+    assert [data["content"] for event, data in events if event == "token"] == TOKENS
+    assert events[-1][0] == "done"
+    assert events[-1][1]["session_id"] == session_id
+
+    # 用户消息与助手回复各写入一次
+    history = memory_service.get_conversation_history(session_id)
+    assert [msg.role for msg in history] == ["user", "assistant"]
+
+if __name__ == "__main__":
+    test_astream_chat_yields_tokens_before_completion()
+    test_chat_stream_endpoint()